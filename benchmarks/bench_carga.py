@@ -0,0 +1,299 @@
+"""
+Prueba de carga HTTP de las APIs con EE, FIRMS y Supabase simulados.
+
+    python benchmarks/bench_carga.py [--apps main,fire_api] [--transporte asgi|socket] [--usuarios 50]
+                                     [--duracion 20] [--ee-latencia-ms 300] [--salida carga.json]
+                                     [--baseline carga_anterior.json]
+
+Cada app se prepara una vez (capa de sequedad / procesamiento de incendios) y se
+carga con `usuarios` clientes concurrentes que eligen endpoints según los pesos
+de CARGAS, en dos escenarios: "reposo" y "trabajo_pesado" (con /actualizar-sequedad
+o /process-fires corriendo a la vez). Informa peticiones/s y p50/p95/p99 por
+endpoint y guarda el resultado en JSON; con --baseline muestra la diferencia.
+
+"asgi" llama a la app en proceso (httpx.ASGITransport, sin red); "socket" la
+levanta con uvicorn en un subproceso (harness.py api) y mide por HTTP local.
+Requiere las dependencias de desarrollo: pip install -r requirements-dev.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(BENCH)
+sys.path.insert(0, BENCH)
+sys.path.insert(0, RAIZ)
+
+# Mezcla de un dashboard: endpoint → peso relativo
+CARGAS = {
+    "main": {
+        "/": 1,
+        "/ready": 1,
+        "/sequedad-cache": 6,
+        "/cache-status": 2,
+        "/ndvi": 3,
+        "/ndvi?desde=2024-03-01&hasta=2024-06-30": 2,
+        "/series?lat=-1.5&lon=-78.5&from=2024-01-01&to=2024-12-31": 2,
+        "/raster/sequedad/6/18/32.png": 3,
+        "/raster/sequedad/punto?lat=-1.5&lon=-78.5": 2,
+        "/jobs": 1
+    },
+    "fire_api": {
+        "/": 1,
+        "/fires-cache": 4,
+        "/fires-status": 3,
+        "/fires/stats": 3,
+        "/fires/stats?nivel=parroquia&por=dia": 1,
+        "/fires/geojson?bbox=-81,-5,-75,1.5&zoom=8": 2,
+        "/fires/tiles/6/18/32.mvt": 3,
+        "/jobs": 1
+    }
+}
+
+# Trabajo pesado de cada app: se dispara para preparar las caches y en el escenario "trabajo_pesado"
+TRABAJOS = {"main": "/actualizar-sequedad", "fire_api": "/process-fires"}
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def entorno_aislado(directorio):
+    """Caches y almacenes en un directorio temporal; sin disparadores automáticos ni checkpoints"""
+    return {
+        "CACHE_DB_PATH": os.path.join(directorio, "cache.sqlite3"),
+        "FIRE_STORE_DIR": os.path.join(directorio, "fires"),
+        "FIRE_STATS_PATH": os.path.join(directorio, "fires", "resumen.json"),
+        "FIRE_CHECKPOINTS": "0",
+        "FIRE_TRIGGER": "cron",
+        "FIRE_CRON": "",
+        "ISC_CRON": "",
+        "RASTER_CACHE_DIR": os.path.join(directorio, "raster"),
+        "TILE_CACHE_DIR": os.path.join(directorio, "tiles"),
+    }
+
+
+def url_job(respuesta):
+    """status_url del job encolado (/process-fires devuelve además la lista por región)"""
+    datos = respuesta.json()
+    return datos.get("status_url") or datos["jobs"][0]["status_url"]
+
+
+async def esperar_job(cliente, url, limite=600):
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite:
+        estado = (await cliente.get(url)).json()
+        if estado["estado"] not in ("pending", "running"):
+            return estado
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"El job {url} no terminó en {limite} s")
+
+
+async def usuario(cliente, carga, fin, semilla, muestras):
+    aleatorio = random.Random(semilla)
+    endpoints = list(carga)
+    pesos = [carga[e] for e in endpoints]
+    while time.perf_counter() < fin:
+        endpoint = aleatorio.choices(endpoints, pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            status = (await cliente.get(endpoint)).status_code
+        except Exception:
+            status = 0
+        muestras.append((endpoint, time.perf_counter() - inicio, status))
+
+
+def resumir(muestras, duracion):
+    resultado = {}
+    for endpoint in sorted({m[0] for m in muestras}):
+        latencias = np.array([m[1] for m in muestras if m[0] == endpoint]) * 1000
+        estados = [m[2] for m in muestras if m[0] == endpoint]
+        p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+        resultado[endpoint] = {
+            "peticiones": len(latencias),
+            "rps": round(len(latencias) / duracion, 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "errores": sum(1 for s in estados if s == 0 or s >= 500)
+        }
+    todas = np.array([m[1] for m in muestras]) * 1000
+    resultado["TOTAL"] = {
+        "peticiones": len(todas),
+        "rps": round(len(todas) / duracion, 2),
+        "p50_ms": round(float(np.percentile(todas, 50)), 2),
+        "p95_ms": round(float(np.percentile(todas, 95)), 2),
+        "p99_ms": round(float(np.percentile(todas, 99)), 2),
+        "errores": sum(1 for m in muestras if m[2] == 0 or m[2] >= 500)
+    }
+    return resultado
+
+
+async def escenario(cliente, app, nombre, args):
+    trabajo = None
+    if nombre == "trabajo_pesado":
+        trabajo = url_job(await cliente.post(TRABAJOS[app]))
+
+    muestras = []
+    inicio = time.perf_counter()
+    fin = inicio + args.duracion
+    await asyncio.gather(*[
+        usuario(cliente, CARGAS[app], fin, args.semilla * 1000 + i, muestras) for i in range(args.usuarios)
+    ])
+    duracion = time.perf_counter() - inicio
+
+    resultado = resumir(muestras, duracion)
+    if trabajo:
+        estado = (await cliente.get(trabajo)).json()
+        # Si el trabajo terminó antes que la carga, parte del escenario fue en reposo
+        resultado["TOTAL"]["trabajo_activo_al_final"] = estado["estado"] in ("pending", "running")
+        resultado["TOTAL"]["trabajo_duracion_s"] = estado.get("duracion_s")
+        await esperar_job(cliente, trabajo)
+    return resultado
+
+
+async def medir_app(app, args, cliente):
+    """Prepara las caches con el trabajo pesado y ejecuta ambos escenarios"""
+    estado = await esperar_job(cliente, url_job(await cliente.post(TRABAJOS[app])))
+    print(f"   preparación {app}: {estado['estado']} en {estado.get('duracion_s')} s")
+    if app == "main":
+        await cliente.get("/ndvi")
+
+    resultados = {}
+    for nombre in ("reposo", "trabajo_pesado"):
+        resultados[nombre] = await escenario(cliente, app, nombre, args)
+        total = resultados[nombre]["TOTAL"]
+        print(f"   {nombre:>15}: {total['rps']:8.1f} req/s | p50 {total['p50_ms']:7.1f} ms | "
+              f"p95 {total['p95_ms']:7.1f} ms | p99 {total['p99_ms']:7.1f} ms | errores {total['errores']}")
+    return resultados
+
+
+async def medir_asgi(app, args):
+    import importlib
+
+    import httpx
+
+    modulo = importlib.import_module(app)
+    await modulo.app.router.startup()
+    try:
+        transporte = httpx.ASGITransport(app=modulo.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=120) as cliente:
+            return await medir_app(app, args, cliente)
+    finally:
+        await modulo.app.router.shutdown()
+
+
+async def medir_socket(app, args, entorno):
+    import httpx
+
+    puerto = puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH, "harness.py"), "api", "--app", app, "--puerto", str(puerto),
+         "--fixtures", args.fixtures, "--ee-latencia-ms", str(args.ee_latencia_ms),
+         "--latencia-ms", str(args.latencia_ms)],
+        cwd=RAIZ, env={**os.environ, **entorno}, stdout=subprocess.DEVNULL
+    )
+    try:
+        limites = httpx.Limits(max_connections=args.usuarios, max_keepalive_connections=args.usuarios)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{puerto}", timeout=120, limits=limites) as cliente:
+            for _ in range(600):
+                try:
+                    if (await cliente.get("/")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            return await medir_app(app, args, cliente)
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+
+
+def comparar(actual, baseline):
+    print("\nComparación con la baseline (p95 y req/s; negativo en p95 = mejor):")
+    for campo in ("transporte", "usuarios", "ee_latencia_ms", "upstream_latencia_ms", "cpu"):
+        if actual.get(campo) != baseline.get(campo):
+            print(f"   ⚠️ {campo} distinto ({baseline.get(campo)} → {actual.get(campo)}): no es comparable")
+    for app, escenarios in actual["resultados"].items():
+        for nombre, endpoints in escenarios.items():
+            previos = baseline.get("resultados", {}).get(app, {}).get(nombre, {})
+            for endpoint, datos in endpoints.items():
+                anterior = previos.get(endpoint)
+                if not anterior or not anterior["p95_ms"] or not anterior["rps"]:
+                    continue
+                dp95 = (datos["p95_ms"] - anterior["p95_ms"]) / anterior["p95_ms"] * 100
+                drps = (datos["rps"] - anterior["rps"]) / anterior["rps"] * 100
+                print(f"   {app:>8} {nombre:>15} {endpoint[:48]:<48} p95 {dp95:+7.1f}% | req/s {drps:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--apps', default='main,fire_api')
+    parser.add_argument('--transporte', choices=['asgi', 'socket'], default='asgi')
+    parser.add_argument('--usuarios', type=int, default=50)
+    parser.add_argument('--duracion', type=float, default=20.0)
+    parser.add_argument('--ee-latencia-ms', type=float, default=300)
+    parser.add_argument('--latencia-ms', type=float, default=50, help='Latencia de FIRMS/Supabase simulados')
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'bench_carga_fixtures'))
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', default='bench_carga.json')
+    parser.add_argument('--baseline', help='Resultado anterior con el que comparar')
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="bench_carga_")
+    entorno = entorno_aislado(directorio)
+    os.environ.update(entorno)
+    os.chdir(RAIZ)
+
+    # Opciones que esperan las funciones del arnés
+    args.jitter_ms, args.tasa_error, args.error, args.dpa = 0, 0.0, "503", None
+    args.detecciones, args.focos, args.hasta = 3000, 60, "2025-09-30"
+
+    import harness
+    if not os.path.exists(os.path.join(args.fixtures, "dpa", "parroquias.shp")):
+        harness.generar_sintetico(args)
+
+    if args.transporte == "asgi":
+        # Ambas apps en este proceso comparten los servidores y el EE simulado
+        harness.preparar_api(args)
+
+    resultados = {}
+    for app in args.apps.split(','):
+        print(f"🏋️ {app} ({args.transporte}, {args.usuarios} usuarios, {args.duracion:.0f} s por escenario)")
+        if args.transporte == "asgi":
+            resultados[app] = asyncio.run(medir_asgi(app, args))
+        else:
+            resultados[app] = asyncio.run(medir_socket(app, args, entorno))
+
+    salida = {
+        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "transporte": args.transporte,
+        "usuarios": args.usuarios,
+        "duracion_s": args.duracion,
+        "ee_latencia_ms": args.ee_latencia_ms,
+        "upstream_latencia_ms": args.latencia_ms,
+        "cpu": os.cpu_count(),
+        "resultados": resultados
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(salida, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados en {args.salida}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            comparar(salida, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
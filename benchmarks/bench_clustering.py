@@ -0,0 +1,117 @@
+"""
+Benchmark del agrupamiento de detecciones en eventos (fire_clustering).
+
+    python benchmarks/bench_clustering.py [--detecciones 2000,50000,200000] [--procesos 4] [--tesela-km 100]
+
+Verifica primero que el modo secuencial reproduce exactamente el bucle original de
+assign_event_ids (transcrito abajo con pandas) y después que la versión teselada
+en procesos da los mismos evento_id que una sola tesela, en ambos modos.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fire_clustering  # noqa: E402
+
+# Bbox de Ecuador en EPSG:32717 (aprox.)
+MIN_X, MAX_X = -400_000, 1_200_000
+MIN_Y, MAX_Y = 9_440_000, 10_190_000
+
+
+def detecciones_sinteticas(n, semilla=0):
+    """Focos que crecen durante varios días y ruido disperso, ordenados por fecha"""
+    rng = np.random.default_rng(semilla)
+    focos = rng.uniform([MIN_X, MIN_Y], [MAX_X, MAX_Y], size=(max(n // 40, 1), 2))
+    foco = rng.integers(0, len(focos), n)
+    x = focos[foco, 0] + rng.normal(0, 900, n)
+    y = focos[foco, 1] + rng.normal(0, 900, n)
+    ruido = rng.random(n) < 0.1
+    x[ruido] = rng.uniform(MIN_X, MAX_X, ruido.sum())
+    y[ruido] = rng.uniform(MIN_Y, MAX_Y, ruido.sum())
+    fechas = pd.Timestamp('2025-08-01') + pd.to_timedelta(rng.integers(0, 30, n), unit='D')
+    df = pd.DataFrame({"x": x, "y": y, "ACQ_DATE": fechas}).sort_values('ACQ_DATE').reset_index(drop=True)
+    return df
+
+
+def original(df, distancia, lag):
+    """Bucle de assign_event_ids antes de fire_clustering (distancia euclídea entre puntos)"""
+    incendios = df.copy()
+    incendios['evento_id'] = None
+    evento_id = 1
+    for i in range(len(incendios)):
+        if pd.isna(incendios.loc[i, 'evento_id']):
+            incendios.loc[i, 'evento_id'] = evento_id
+            puntos_evento = [i]
+            while True:
+                nuevos_puntos = []
+                for punto_idx in puntos_evento:
+                    punto_base = incendios.iloc[punto_idx]
+                    sin_clasificar = incendios[incendios['evento_id'].isna()]
+                    if sin_clasificar.empty:
+                        continue
+                    diferencia_tiempo = (sin_clasificar['ACQ_DATE'] - punto_base['ACQ_DATE']).dt.days
+                    candidatos = sin_clasificar[(diferencia_tiempo >= 0) & (diferencia_tiempo <= lag)]
+                    if candidatos.empty:
+                        continue
+                    distancias = np.hypot(candidatos['x'] - punto_base['x'], candidatos['y'] - punto_base['y'])
+                    for idx in candidatos[distancias <= distancia].index:
+                        incendios.loc[idx, 'evento_id'] = evento_id
+                        nuevos_puntos.append(idx)
+                if not nuevos_puntos:
+                    break
+                puntos_evento = nuevos_puntos
+            evento_id += 1
+    return incendios['evento_id'].to_numpy(dtype=np.int64)
+
+
+def cronometrar(func):
+    inicio = time.perf_counter()
+    resultado = func()
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--detecciones', default='2000,50000,200000')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--tesela-km', type=float, default=100)
+    parser.add_argument('--distancia', type=float, default=1000)
+    parser.add_argument('--lag', type=int, default=3)
+    parser.add_argument('--paridad-original', type=int, default=3000,
+                        help='Tamaño máximo en el que se ejecuta también el bucle original')
+    args = parser.parse_args()
+
+    for n in [int(v) for v in args.detecciones.split(',')]:
+        df = detecciones_sinteticas(n)
+        x, y = df['x'].to_numpy(), df['y'].to_numpy()
+        t = df['ACQ_DATE'].to_numpy().astype('datetime64[ns]').view('int64')
+
+        for modo in fire_clustering.MODOS_CLUSTERING:
+            unico, t_unico = cronometrar(lambda: fire_clustering.asignar_eventos(
+                x, y, t, args.distancia, args.lag, modo=modo, procesos=1))
+            # Ejecutor explícito: fuerza el teselado aunque n < CLUSTERING_TESELADO_MIN
+            with ProcessPoolExecutor(max_workers=args.procesos) as ejecutor:
+                teselado, t_teselado = cronometrar(lambda: fire_clustering.asignar_eventos(
+                    x, y, t, args.distancia, args.lag, modo=modo, procesos=args.procesos,
+                    tesela=args.tesela_km * 1000, ejecutor=ejecutor))
+            if not np.array_equal(unico, teselado):
+                raise SystemExit(f"❌ {modo}, n={n}: el resultado teselado difiere de una sola tesela")
+
+            linea = (f"{modo:>11} n={n:>7} | eventos {unico.max():>6} | una tesela {t_unico:7.2f} s | "
+                     f"teselado x{args.procesos} {t_teselado:7.2f} s")
+            if modo == "secuencial" and n <= args.paridad_original:
+                referencia, t_original = cronometrar(lambda: original(df, args.distancia, args.lag))
+                if not np.array_equal(referencia, unico):
+                    raise SystemExit(f"❌ n={n}: el modo secuencial difiere del bucle original")
+                linea += f" | original {t_original:7.2f} s (idéntico)"
+            print(linea)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark del motor NumPy del ISC/FDI sobre rasters sintéticos del tamaño de Ecuador.
+
+    python benchmarks/bench_fdi.py [--escalas 1000,500,250] [--filas-por-bloque 512]
+
+Solo mide tiempos; la paridad con las expresiones de Earth Engine está en
+tests/test_fdi_numpy.py.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fdi_numpy  # noqa: E402
+
+# Extensión aproximada de Ecuador continental + Galápagos en metros
+ANCHO_M = 1_870_000
+ALTO_M = 745_000
+
+
+def entradas_sinteticas(filas, columnas, semilla=0):
+    rng = np.random.default_rng(semilla)
+    t = rng.uniform(275, 305, (filas, columnas))
+    ndvi_min = rng.uniform(-0.1, 0.3, (filas, columnas))
+    ndvi_max = ndvi_min + rng.uniform(0.2, 0.7, (filas, columnas))
+    entradas = {
+        'temperature_2m': t,
+        'dewpoint_temperature_2m': t - rng.uniform(0, 25, (filas, columnas)),
+        'duracion': rng.uniform(0, 24, (filas, columnas)),
+        'ndvi': rng.uniform(ndvi_min, ndvi_max),
+        'ndvi_min': ndvi_min,
+        'ndvi_max': ndvi_max
+    }
+    # Un 20% de píxeles enmascarados (mar, fuera de la ROI)
+    mascara = rng.random((filas, columnas)) < 0.2
+    for banda in entradas.values():
+        banda[mascara] = np.nan
+    return entradas
+
+
+def medir(escala, filas_por_bloque, directorio):
+    filas, columnas = ALTO_M // escala, ANCHO_M // escala
+    entradas = entradas_sinteticas(filas, columnas)
+    mpix = filas * columnas / 1e6
+
+    inicio = time.perf_counter()
+    fdi_numpy.calcular_fdi(**entradas)
+    t_memoria = time.perf_counter() - inicio
+
+    fdi_numpy.guardar_entradas(directorio, entradas)
+    del entradas
+    mapeadas = fdi_numpy.cargar_entradas(directorio)
+    inicio = time.perf_counter()
+    fdi_numpy.calcular_fdi_por_bloques(
+        mapeadas,
+        salida_fdi=os.path.join(directorio, 'fdi.npy'),
+        salida_clases=os.path.join(directorio, 'clases.npy'),
+        filas_por_bloque=filas_por_bloque
+    )
+    t_bloques = time.perf_counter() - inicio
+
+    print(f"{escala:>5} m  {filas:>5}x{columnas:<5} {mpix:7.2f} Mpx | "
+          f"memoria {t_memoria:6.2f} s ({mpix / t_memoria:6.1f} Mpx/s) | "
+          f"bloques+memmap {t_bloques:6.2f} s ({mpix / t_bloques:6.1f} Mpx/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--escalas', default='1000,500,250')
+    parser.add_argument('--filas-por-bloque', type=int, default=512)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for escala in map(int, args.escalas.split(',')):
+            medir(escala, args.filas_por_bloque, directorio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark de arranque en frío de las APIs.
+
+    python benchmarks/bench_startup.py [--apps main,fire_api] [--repeticiones 3] [--espera-idle 5]
+
+Lanza cada app con uvicorn en un puerto libre y mide el tiempo hasta la primera
+respuesta de `/` (time-to-first-response), el tiempo hasta `/ready` si la app lo
+expone, la RSS en reposo y qué stacks pesados quedaron cargados tras el arranque.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULOS_PESADOS = ['geopandas', 'scipy', 'shapely', 'pandas', 'rasterio', 'tqdm']
+
+# Script que arranca uvicorn y, al recibir una línea por stdin, informa los módulos cargados
+LANZADOR = """
+import sys, threading, uvicorn
+modulos = {modulos!r}
+def informar():
+    sys.stdin.readline()
+    print('MODULOS ' + ','.join(m for m in modulos if m in sys.modules), flush=True)
+threading.Thread(target=informar, daemon=True).start()
+uvicorn.run('{app}:app', host='127.0.0.1', port={puerto}, log_level='warning')
+"""
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """VmRSS de /proc (Linux); psutil si está disponible en otras plataformas"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except FileNotFoundError:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 1024 / 1024
+
+
+def esperar(url, limite, estados=(200,)):
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite:
+        try:
+            if requests.get(url, timeout=1).status_code in estados:
+                return time.perf_counter()
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def medir(app, espera_idle, limite_ready):
+    puerto = puerto_libre()
+    base = f"http://127.0.0.1:{puerto}"
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, '-c', LANZADOR.format(modulos=MODULOS_PESADOS, app=app, puerto=puerto)],
+        cwd=RAIZ, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        primera = esperar(f"{base}/", 60)
+        if primera is None:
+            raise RuntimeError(f"{app} no respondió en 60 s")
+        ready = esperar(f"{base}/ready", limite_ready) if limite_ready else None
+
+        time.sleep(espera_idle)
+        rss = rss_mb(proceso.pid)
+        proceso.stdin.write("\n")
+        proceso.stdin.flush()
+        # Los prints de arranque de la app comparten stdout con el informe
+        linea = proceso.stdout.readline()
+        while linea and not linea.startswith('MODULOS'):
+            linea = proceso.stdout.readline()
+        cargados = linea.strip().split(' ', 1)[1].split(',') if ' ' in linea.strip() else []
+
+        return {
+            "ttfr_s": primera - inicio,
+            "ready_s": ready - inicio if ready else None,
+            "rss_mb": rss,
+            "cargados": [m for m in cargados if m]
+        }
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--apps', default='main,fire_api')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--espera-idle', type=float, default=5.0)
+    parser.add_argument('--limite-ready', type=float, default=30.0,
+                        help='Segundos máximos esperando /ready (0 para no medirlo)')
+    args = parser.parse_args()
+
+    for app in args.apps.split(','):
+        resultados = [medir(app, args.espera_idle, args.limite_ready) for _ in range(args.repeticiones)]
+        ttfr = [r["ttfr_s"] for r in resultados]
+        ready = [r["ready_s"] for r in resultados if r["ready_s"] is not None]
+        rss = [r["rss_mb"] for r in resultados]
+
+        print(f"{app:>10} | primera respuesta mediana {statistics.median(ttfr):5.2f} s (min {min(ttfr):.2f}) | "
+              f"ready {f'{statistics.median(ready):5.2f} s' if ready else '   n/d '} | "
+              f"RSS idle {statistics.median(rss):6.1f} MB | "
+              f"stacks cargados: {', '.join(resultados[-1]['cargados']) or 'ninguno'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""
+Sustituto mínimo del cliente de Earth Engine para pruebas de carga sin red.
+
+    import ee_stub; ee_stub.instalar(latencia_ms=300)
+    import main   # `import ee` ya resuelve al stub
+
+Cualquier cadena de llamadas (ee.ImageCollection(...).select(...).filterDate(...))
+construye un nodo perezoso; getInfo(), getMapId() y ee.data.computePixels()
+devuelven respuestas con la forma de las reales, deterministas para el mismo
+grafo, tras dormir la latencia configurada (simula el viaje a EE).
+"""
+import sys
+import threading
+import time
+import types
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+latencia_s = 0.0
+llamadas = {"getInfo": 0, "getMapId": 0, "computePixels": 0}
+_lock = threading.Lock()
+
+
+def _contar(tipo):
+    with _lock:
+        llamadas[tipo] += 1
+    if latencia_s:
+        time.sleep(latencia_s)
+
+
+class Nodo:
+    """Expresión EE perezosa: origen + lista de operaciones (nombre, args, kwargs)"""
+
+    def __init__(self, origen, args=(), kwargs=None, ops=()):
+        self.origen = origen
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.ops = ops
+
+    def __getattr__(self, nombre):
+        if nombre.startswith("__"):
+            raise AttributeError(nombre)
+
+        def operacion(*args, **kwargs):
+            return Nodo(self.origen, self.args, self.kwargs, self.ops + ((nombre, args, kwargs),))
+        return operacion
+
+    def __repr__(self):
+        ops = "".join(f".{n}({len(a)})" for n, a, _ in self.ops)
+        return f"ee.{self.origen}{self.args!r}{ops}"
+
+    def _semilla(self):
+        return zlib.crc32(repr(self).encode("utf-8"))
+
+    def _op(self, nombre):
+        for op in reversed(self.ops):
+            if op[0] == nombre:
+                return op
+        return None
+
+    def getInfo(self):
+        # Como el cliente real: ComputedObject.getInfo → ee.data.computeValue
+        return sys.modules["ee"].data.computeValue(self)
+
+    def _info(self):
+        aleatorio = np.random.default_rng(self._semilla())
+        ultima = self.ops[-1][0] if self.ops else None
+
+        if self.origen == "Dictionary" and not self.ops:
+            return {k: v._info() if isinstance(v, Nodo) else v for k, v in self.args[0].items()}
+        if ultima == "getRegion":
+            return self._region(aleatorio)
+        if ultima in ("reduceRegions", "sampleRegions"):
+            return self._features(aleatorio, ultima)
+        if ultima == "reduceColumns" and self._op("sampleRegions"):
+            return self._columnas(aleatorio)
+        if ultima == "size":
+            return int(aleatorio.integers(10, 40))
+        if ultima == "get":
+            return int(datetime(2024, 12, 18, tzinfo=timezone.utc).timestamp() * 1000)
+        if ultima == "format":
+            return "2024-12-18"
+        if ultima == "getNumber":
+            return float(np.round(aleatorio.uniform(5, 60), 3))
+        if ultima == "reduceRegion":
+            return {"min": float(aleatorio.uniform(0, 1)), "max": float(aleatorio.uniform(1, 2))}
+        return {"type": self.origen, "bands": []}
+
+    def _region(self, aleatorio):
+        """Filas de getRegion: una por imagen de la ventana (cada 16 días) en el punto"""
+        banda = self._op("select")[1][0] if self._op("select") else "b1"
+        filtro = self._op("filterDate")
+        desde, hasta = (datetime(2024, 1, 1), datetime(2024, 12, 31))
+        if filtro:
+            desde, hasta = (_fecha(v) for v in filtro[1])
+        _, (punto, escala), _ = self._op("getRegion")
+        lon, lat = punto.args[0]
+
+        filas = [["id", "longitude", "latitude", "time", banda]]
+        dia = desde
+        while dia < hasta:
+            t = int(dia.replace(tzinfo=timezone.utc).timestamp() * 1000)
+            filas.append([dia.strftime("%Y_%m_%d"), lon, lat, t, float(np.round(aleatorio.uniform(0, 9000), 2))])
+            dia += timedelta(days=16)
+        return filas
+
+    def _features(self, aleatorio, operacion):
+        """reduceRegions: histograma por clase; sampleRegions: valor por banda renombrada"""
+        kwargs = self._op(operacion)[2]
+        coleccion = kwargs.get("collection")
+        entrada = coleccion.args[0] if coleccion is not None and coleccion.args else []
+        bandas = _renombres(self) or ["b1"]
+
+        features = []
+        for feature in entrada:
+            propiedades = dict(feature.args[1]) if len(feature.args) > 1 else {}
+            if operacion == "reduceRegions":
+                propiedades["groups"] = [
+                    {"clase": clase, "sum": float(np.round(aleatorio.uniform(0, 500), 2))} for clase in range(1, 7)
+                ]
+            else:
+                for banda in bandas:
+                    propiedades[banda] = float(np.round(aleatorio.uniform(0, 100), 3))
+            features.append({"type": "Feature", "geometry": None, "properties": propiedades})
+        return {"type": "FeatureCollection", "features": features}
+
+    def _columnas(self, aleatorio):
+        """sampleRegions(...).reduceColumns(toList(2), ["i", banda]) sobre ee.List.sequence(0, n - 1)"""
+        coleccion = self._op("sampleRegions")[2]["collection"]
+        secuencia = coleccion.args[0]
+        n = int(secuencia.args[1]) + 1 if secuencia.origen == "List.sequence" else len(secuencia)
+        return {"list": [[i, float(np.round(aleatorio.uniform(0, 100), 3))] for i in range(n)]}
+
+    def getMapId(self, vis_params=None):
+        return sys.modules["ee"].data.getMapId({"image": self, "visParams": vis_params})
+
+    def _map_id(self):
+        mapid = f"projects/stub/maps/{self._semilla():08x}"
+        return {
+            "mapid": mapid,
+            "token": "",
+            "tile_fetcher": types.SimpleNamespace(
+                url_format=f"https://earthengine.googleapis.com/v1/{mapid}/tiles/{{z}}/{{x}}/{{y}}"
+            )
+        }
+
+
+def _fecha(valor):
+    if isinstance(valor, Nodo):
+        valor = valor.args[0]
+    if isinstance(valor, (int, float)):
+        return datetime.fromtimestamp(valor / 1000, tz=timezone.utc).replace(tzinfo=None)
+    return datetime.strptime(str(valor)[:10], "%Y-%m-%d")
+
+
+def _renombres(nodo):
+    """Nombres de banda de los rename() del grafo (incluidos los de nodos anidados)"""
+    nombres = []
+    pendientes = [nodo]
+    while pendientes:
+        actual = pendientes.pop()
+        valores = list(actual.args) + list(actual.kwargs.values())
+        for nombre, args, kwargs in actual.ops:
+            if nombre == "rename" and args and isinstance(args[0], str):
+                nombres.append(args[0])
+            valores += list(args) + list(kwargs.values())
+        for valor in valores:
+            if isinstance(valor, Nodo):
+                pendientes.append(valor)
+            elif isinstance(valor, (list, tuple)):
+                pendientes.extend(v for v in valor if isinstance(v, Nodo))
+    return list(dict.fromkeys(nombres))
+
+
+class Constructor:
+    """ee.Image, ee.Geometry...: invocable y con constructores estáticos (ee.Image.constant)"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __call__(self, *args, **kwargs):
+        return Nodo(self.nombre, args, kwargs)
+
+    def __getattr__(self, atributo):
+        if atributo.startswith("__"):
+            raise AttributeError(atributo)
+        return Constructor(f"{self.nombre}.{atributo}")
+
+
+def _compute_value(nodo):
+    _contar("getInfo")
+    return nodo._info()
+
+
+def _get_map_id(peticion):
+    _contar("getMapId")
+    return peticion["image"]._map_id()
+
+
+def _compute_pixels(peticion):
+    _contar("computePixels")
+    dimensiones = peticion["grid"]["dimensions"]
+    aleatorio = np.random.default_rng(zlib.crc32(repr(sorted(peticion["grid"]["affineTransform"].items())).encode()))
+    pixeles = np.zeros((dimensiones["height"], dimensiones["width"]), dtype=[("b1", "<f4")])
+    pixeles["b1"] = aleatorio.integers(1, 7, size=pixeles.shape)
+    return pixeles
+
+
+def crear_modulo():
+    ee = types.ModuleType("ee")
+    ee.__stub__ = True
+    for nombre in ["Image", "ImageCollection", "Feature", "FeatureCollection", "Geometry", "Filter",
+                   "Reducer", "Date", "Dictionary", "Number", "List", "String"]:
+        setattr(ee, nombre, Constructor(nombre))
+    ee.ServiceAccountCredentials = lambda email=None, key_data=None: object()
+    ee.Initialize = lambda *args, **kwargs: None
+    ee.EEException = type("EEException", (Exception,), {})
+    ee.data = types.SimpleNamespace(computeValue=_compute_value, getMapId=_get_map_id, computePixels=_compute_pixels)
+    return ee
+
+
+def instalar(latencia_ms=0):
+    """Registra el stub como módulo `ee` (antes de importar main)"""
+    global latencia_s
+    latencia_s = latencia_ms / 1000
+    sys.modules["ee"] = crear_modulo()
+    return sys.modules["ee"]
@@ -0,0 +1,234 @@
+"""
+Arnés de grabación/reproducción para probar las rutas reales sin red.
+
+    python benchmarks/harness.py sintetico   --fixtures fixtures/ [--detecciones 3000] [--hasta 2025-09-30]
+    python benchmarks/harness.py record      --fixtures fixtures/
+    python benchmarks/harness.py process-all --fixtures fixtures/ [--latencia-ms 200] [--tasa-error 0.1] [--perfil out.prof]
+    python benchmarks/harness.py serve       --fixtures fixtures/ [--latencia-ms 200]
+    python benchmarks/harness.py api         --fixtures fixtures/ [--app main] [--ee-latencia-ms 300]
+
+`record` ejecuta process_all una vez contra FIRMS y Supabase reales a través de
+los servidores locales, que guardan cada GET como fixture (las subidas nunca se
+reenvían). `sintetico` genera fixtures equivalentes sin red: detecciones
+agrupadas en focos y una capa DPA de cuadrícula. El resto reproduce desde disco
+con la latencia y los errores pedidos; `api` además sustituye Earth Engine por
+el stub de ee_stub.py para cargar las APIs con cualquier herramienta HTTP.
+"""
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from replay_server import ServidorReplay  # noqa: E402
+
+FIRMS_REAL = "https://firms.modaps.eosdis.nasa.gov/api/area/csv"
+SUPABASE_REAL = "https://neixcsnkwtgdxkucfcnb.supabase.co"
+COLUMNAS_FIRMS = ["latitude", "longitude", "bright_ti4", "scan", "track", "acq_date", "acq_time", "satellite",
+                  "instrument", "confidence", "version", "bright_ti5", "frp", "daynight"]
+
+
+def procesador():
+    from fire_processor import FireProcessor
+    return FireProcessor()
+
+
+def servidores(args, modo="replay"):
+    """(firms, supabase) escuchando en puertos libres y con los secretos fuera de las claves"""
+    fp = procesador()
+    comunes = dict(modo=modo, latencia_ms=args.latencia_ms, jitter_ms=args.jitter_ms,
+                   tasa_error=args.tasa_error, error=args.error, semilla=args.semilla)
+    firms = ServidorReplay(os.path.join(args.fixtures, "firms"), FIRMS_REAL if modo == "record" else None,
+                           secretos=[fp.map_key], **comunes).iniciar()
+    supabase = ServidorReplay(os.path.join(args.fixtures, "supabase"), SUPABASE_REAL if modo == "record" else None,
+                              **comunes).iniciar()
+    return firms, supabase
+
+
+def apuntar_entorno(firms, supabase):
+    """Variables que leen FireProcessor y FirmsPoller: todo el tráfico va a los servidores locales"""
+    os.environ["FIRMS_API_URL"] = firms.url
+    os.environ["SUPABASE_URL"] = supabase.url
+    return {"FIRMS_API_URL": firms.url, "SUPABASE_URL": supabase.url}
+
+
+def capa_dpa(args):
+    """Capa DPA usable: la del repo si está completa, si no la cuadrícula sintética"""
+    sintetica = os.path.join(args.fixtures, "dpa", "parroquias.shp")
+    if args.dpa:
+        return args.dpa
+    if not os.path.exists(procesador().provinces_path) and os.path.exists(sintetica):
+        return sintetica
+    return None
+
+
+def generar_sintetico(args):
+    import geopandas as gpd
+    import pandas as pd
+    from shapely.geometry import box
+
+    fp = procesador()
+    rng = np.random.default_rng(args.semilla)
+    hasta = pd.Timestamp(args.hasta)
+    minx, miny, maxx, maxy = fp.area_coords
+
+    # Focos que duran varios días; cada foco crece a ~300 m por detección
+    focos = rng.uniform([minx + 14, miny], [maxx, maxy], size=(args.focos, 2))
+    por_fuente = args.detecciones // len(fp.sources)
+    servidor = ServidorReplay(os.path.join(args.fixtures, "firms"), secretos=[fp.map_key])
+    area = ",".join(map(str, fp.area_coords))
+
+    for fuente in fp.sources:
+        foco = rng.integers(0, len(focos), por_fuente)
+        filas = pd.DataFrame({
+            "latitude": np.round(focos[foco, 1] + rng.normal(0, 0.003, por_fuente), 5),
+            "longitude": np.round(focos[foco, 0] + rng.normal(0, 0.003, por_fuente), 5),
+            "bright_ti4": np.round(rng.uniform(300, 367, por_fuente), 2),
+            "scan": 0.39, "track": 0.36,
+            "acq_date": (hasta - pd.to_timedelta(rng.integers(0, fp.day_range, por_fuente), unit="D")).strftime("%Y-%m-%d"),
+            "acq_time": rng.integers(0, 2400, por_fuente),
+            "satellite": fuente.split("_")[1][0], "instrument": "VIIRS", "confidence": "n", "version": "2.0NRT",
+            "bright_ti5": np.round(rng.uniform(280, 310, por_fuente), 2),
+            "frp": np.round(rng.gamma(2, 4, por_fuente), 2),
+            "daynight": rng.choice(["D", "N"], por_fuente)
+        })[COLUMNAS_FIRMS]
+        csv = filas.to_csv(index=False).encode("utf-8")
+        cabeceras = {"Content-Type": "text/csv", "ETag": f'"{fuente}-{args.semilla}"'}
+        servidor.grabar(servidor.clave("GET", f"/{fp.map_key}/{fuente}/{area}/{fp.day_range}/{args.hasta}"),
+                        200, cabeceras, csv)
+        # Sondeo del FirmsPoller (último día, sin fecha)
+        ultimo = filas[filas["acq_date"] == filas["acq_date"].max()].to_csv(index=False).encode("utf-8")
+        servidor.grabar(servidor.clave("GET", f"/{fp.map_key}/{fuente}/{area}/1"), 200, cabeceras, ultimo)
+
+    supabase = ServidorReplay(os.path.join(args.fixtures, "supabase"))
+    supabase.grabar(supabase.clave("GET", "/rest/v1/incendios_grandes?select=evento_id"),
+                    200, {"Content-Type": "application/json"}, b"[]")
+
+    # Cuadrícula de 0.25° con la jerarquía DPA (provincia > cantón > parroquia)
+    celdas = []
+    for i, x in enumerate(np.arange(minx, maxx, 0.25)):
+        for j, y in enumerate(np.arange(miny, maxy, 0.25)):
+            provincia, canton = f"{i // 8 + 1:02d}", f"{i // 8 + 1:02d}{j // 8 + 1:02d}"
+            celdas.append({
+                "DPA_PROVIN": provincia, "DPA_DESPRO": f"PROVINCIA {provincia}",
+                "DPA_CANTON": canton, "DPA_DESCAN": f"CANTON {canton}",
+                "DPA_PARROQ": f"{canton}{len(celdas) % 100:02d}", "DPA_DESPAR": f"PARROQUIA {len(celdas)}",
+                "geometry": box(x, y, x + 0.25, y + 0.25)
+            })
+    os.makedirs(os.path.join(args.fixtures, "dpa"), exist_ok=True)
+    gpd.GeoDataFrame(celdas, crs="EPSG:4326").to_file(os.path.join(args.fixtures, "dpa", "parroquias.shp"))
+
+    print(f"✅ Fixtures sintéticos en {args.fixtures}: {por_fuente * len(fp.sources)} detecciones "
+          f"en {args.focos} focos hasta {args.hasta}, {len(celdas)} parroquias")
+
+
+def ejecutar_process_all(args, modo="replay"):
+    firms, supabase = servidores(args, modo)
+    apuntar_entorno(firms, supabase)
+    fp = procesador()
+    dpa = capa_dpa(args)
+    if dpa:
+        fp.provinces_path = dpa
+
+    etapas = []
+    fp.progress_hook = lambda etapa, contadores: etapas.append((time.perf_counter(), etapa))
+
+    perfil = cProfile.Profile() if args.perfil else None
+    inicio = time.perf_counter()
+    if perfil:
+        perfil.enable()
+    resultado = fp.process_all()
+    if perfil:
+        perfil.disable()
+    total = time.perf_counter() - inicio
+
+    print(f"\n⏱️ process_all: {total:.2f} s — {json.dumps(resultado, default=str)}")
+    cambios = [(t, e) for k, (t, e) in enumerate(etapas) if k == 0 or etapas[k - 1][1] != e]
+    for (t, etapa), siguiente in zip(cambios, [t for t, _ in cambios[1:]] + [inicio + total]):
+        print(f"   {etapa:>16}: {siguiente - t:7.2f} s")
+    print(f"   FIRMS: {firms.stats}\n   Supabase: {supabase.stats}")
+
+    if perfil:
+        perfil.dump_stats(args.perfil)
+        pstats.Stats(perfil).sort_stats("cumulative").print_stats(20)
+    firms.detener()
+    supabase.detener()
+
+
+def servir(args):
+    firms, supabase = servidores(args)
+    for nombre, valor in apuntar_entorno(firms, supabase).items():
+        print(f"export {nombre}={valor}")
+    print("Ctrl+C para detener")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        firms.detener()
+        supabase.detener()
+
+
+def preparar_api(args):
+    """Servidores locales, EE simulado y capa DPA usable; antes de importar main o fire_api"""
+    import ee_stub
+
+    firms, supabase = servidores(args)
+    apuntar_entorno(firms, supabase)
+    ee_stub.instalar(args.ee_latencia_ms)
+    os.environ.setdefault("GOOGLE_CREDENTIALS", json.dumps({"client_email": "stub@harness.local"}))
+
+    dpa = capa_dpa(args)
+    if dpa:
+        import regiones
+        regiones.REGIONES[regiones.REGION_DEFECTO]["limites"] = dpa
+    return firms, supabase
+
+
+def servir_api(args):
+    import uvicorn
+
+    preparar_api(args)
+    print(f"🧪 {args.app} con EE simulado (latencia {args.ee_latencia_ms} ms) en http://127.0.0.1:{args.puerto}")
+    uvicorn.run(f"{args.app}:app", host="127.0.0.1", port=args.puerto, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("comando", choices=["sintetico", "record", "process-all", "serve", "api"])
+    parser.add_argument("--fixtures", default="fixtures")
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    parser.add_argument("--error", default="503", help="Código HTTP inyectado o 'timeout'")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--perfil", help="Guarda el perfil cProfile de process_all en este archivo")
+    parser.add_argument("--dpa", help="Capa DPA a usar en lugar de la del repo")
+    parser.add_argument("--detecciones", type=int, default=3000)
+    parser.add_argument("--focos", type=int, default=60)
+    # Dentro de la ventana que acepta assign_event_ids; la fecha de la URL no entra en la clave
+    parser.add_argument("--hasta", default="2025-09-30")
+    parser.add_argument("--app", default="main", choices=["main", "fire_api"])
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--ee-latencia-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    if args.comando == "sintetico":
+        generar_sintetico(args)
+    elif args.comando == "record":
+        ejecutar_process_all(args, modo="record")
+    elif args.comando == "process-all":
+        ejecutar_process_all(args)
+    elif args.comando == "serve":
+        servir(args)
+    else:
+        servir_api(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Servidor HTTP local que graba y reproduce respuestas de FIRMS y Supabase.
+
+En modo "record" reenvía los GET al servicio real y guarda cada respuesta como
+fixture; en modo "replay" las sirve desde disco. Los POST (subidas a Supabase)
+nunca se reenvían: se responden 201 y se cuentan. En ambos modos se puede
+inyectar latencia (fija + jitter) y errores (código HTTP o timeout) con una tasa.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+# Las fechas de la URL cambian cada día (FIRMS pide "hace 10 días"): no forman parte de la clave
+PATRON_FECHA = re.compile(r"\d{4}-\d{2}-\d{2}")
+CABECERAS_GUARDADAS = ["Content-Type", "ETag", "Last-Modified"]
+
+
+class ServidorReplay:
+    def __init__(self, fixtures, upstream=None, modo="replay", latencia_ms=0, jitter_ms=0,
+                 tasa_error=0.0, error="503", secretos=(), semilla=0, puerto=0):
+        self.fixtures = fixtures
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.modo = modo
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.tasa_error = tasa_error
+        self.error = error
+        self.secretos = [s for s in secretos if s]
+        self.random = random.Random(semilla)
+        self.stats = {"peticiones": 0, "servidas": 0, "grabadas": 0, "sin_fixture": 0, "errores_inyectados": 0,
+                      "posts": 0, "filas_post": 0}
+        self._lock = threading.Lock()
+        os.makedirs(fixtures, exist_ok=True)
+        self.indice = self._leer_indice()
+
+        if modo == "record" and not self.upstream:
+            raise ValueError("El modo record necesita la URL del servicio real (upstream)")
+
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                servidor._atender(self, "GET")
+
+            def do_POST(self):
+                servidor._atender(self, "POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", puerto), Manejador)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _ruta_indice(self):
+        return os.path.join(self.fixtures, "index.json")
+
+    def _leer_indice(self):
+        try:
+            with open(self._ruta_indice(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def clave(self, metodo, ruta):
+        """Método + ruta normalizada: sin secretos, sin fechas y con la query ordenada"""
+        partes = urlsplit(ruta)
+        camino = partes.path
+        for secreto in self.secretos:
+            camino = camino.replace(secreto, "{key}")
+        camino = PATRON_FECHA.sub("{fecha}", camino)
+        query = urlencode(sorted(parse_qsl(partes.query)))
+        return f"{metodo} {camino}" + (f"?{query}" if query else "")
+
+    def grabar(self, clave, status, headers, cuerpo):
+        nombre = hashlib.sha1(clave.encode("utf-8")).hexdigest()[:16] + ".body"
+        with open(os.path.join(self.fixtures, nombre), "wb") as f:
+            f.write(cuerpo)
+        with self._lock:
+            self.indice[clave] = {
+                "status": status,
+                "headers": {h: headers[h] for h in CABECERAS_GUARDADAS if h in headers},
+                "archivo": nombre
+            }
+            temporal = self._ruta_indice() + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(self.indice, f, indent=2, ensure_ascii=False)
+            os.replace(temporal, self._ruta_indice())
+            self.stats["grabadas"] += 1
+
+    def _responder(self, manejador, status, headers, cuerpo):
+        manejador.send_response(status)
+        for nombre, valor in headers.items():
+            manejador.send_header(nombre, valor)
+        manejador.send_header("Content-Length", str(len(cuerpo)))
+        manejador.end_headers()
+        manejador.wfile.write(cuerpo)
+
+    def _atender(self, manejador, metodo):
+        with self._lock:
+            self.stats["peticiones"] += 1
+            inyectar = self.random.random() < self.tasa_error
+            espera = (self.latencia_ms + self.random.uniform(0, self.jitter_ms)) / 1000
+
+        time.sleep(espera)
+        if inyectar:
+            with self._lock:
+                self.stats["errores_inyectados"] += 1
+            if self.error == "timeout":
+                # Más que cualquier timeout del cliente: la conexión queda colgada
+                time.sleep(120)
+                return
+            return self._responder(manejador, int(self.error), {"Content-Type": "text/plain"}, b"error inyectado")
+
+        if metodo == "POST":
+            longitud = int(manejador.headers.get("Content-Length", 0))
+            cuerpo = manejador.rfile.read(longitud)
+            try:
+                filas = len(json.loads(cuerpo))
+            except ValueError:
+                filas = 0
+            with self._lock:
+                self.stats["posts"] += 1
+                self.stats["filas_post"] += filas
+            return self._responder(manejador, 201, {}, b"")
+
+        clave = self.clave(metodo, manejador.path)
+        if self.modo == "record":
+            cabeceras = {h: v for h, v in manejador.headers.items() if h.lower() in ("apikey", "authorization")}
+            respuesta = requests.get(self.upstream + manejador.path, headers=cabeceras, timeout=120)
+            self.grabar(clave, respuesta.status_code, respuesta.headers, respuesta.content)
+
+        entrada = self.indice.get(clave)
+        if entrada is None:
+            with self._lock:
+                self.stats["sin_fixture"] += 1
+            return self._responder(manejador, 404, {"Content-Type": "text/plain"}, f"Sin fixture: {clave}".encode())
+
+        with open(os.path.join(self.fixtures, entrada["archivo"]), "rb") as f:
+            cuerpo = f.read()
+
+        # Validadores condicionales como los de un servidor real
+        etag = entrada["headers"].get("ETag")
+        if etag and manejador.headers.get("If-None-Match") == etag:
+            return self._responder(manejador, 304, {"ETag": etag}, b"")
+
+        with self._lock:
+            self.stats["servidas"] += 1
+        self._responder(manejador, entrada["status"], entrada["headers"], cuerpo)
+
+    def iniciar(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,263 @@
+import sqlite3
+import json
+import os
+import socket
+import time
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def _a_json(valor):
+    """Escalares/arrays de NumPy (stats de process_all) como números; el resto como texto"""
+    if hasattr(valor, 'tolist') and hasattr(valor, 'dtype'):
+        return valor.tolist()
+    return str(valor)
+
+
+class CacheStore:
+    """Cache persistente en SQLite (WAL) compartido entre procesos, con locks por lease"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('CACHE_DB_PATH', os.path.join('cache', 'cache.sqlite3'))
+        directorio = os.path.dirname(self.path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            # WAL: lectores concurrentes de varios workers sin bloquear al escritor
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS locks (
+                    nombre TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    clave TEXT PRIMARY KEY,
+                    producto TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    timestamp REAL NOT NULL,
+                    expires_at REAL
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def clave(producto, params=None):
+        """Clave estable: producto + parámetros normalizados"""
+        return f"{producto}:{json.dumps(params or {}, sort_keys=True, default=str)}"
+
+    def guardar(self, producto, valor, params=None, ttl=None, timestamp=None):
+        """Guarda un resultado; ttl en segundos (None = no expira)"""
+        timestamp = timestamp or time.time()
+        expires_at = timestamp + ttl if ttl else None
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (clave, producto, params, valor, timestamp, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.clave(producto, params),
+                    producto,
+                    json.dumps(params or {}, sort_keys=True, default=str),
+                    json.dumps(valor, default=_a_json),
+                    timestamp,
+                    expires_at
+                )
+            )
+        return {"valor": valor, "timestamp": timestamp, "expires_at": expires_at}
+
+    def obtener(self, producto, params=None, incluir_expirados=False):
+        """Devuelve {"valor", "timestamp", "expires_at"} o None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT valor, timestamp, expires_at FROM cache WHERE clave = ?",
+                (self.clave(producto, params),)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        valor, timestamp, expires_at = row
+        if not incluir_expirados and expires_at and expires_at <= time.time():
+            return None
+
+        return {"valor": json.loads(valor), "timestamp": timestamp, "expires_at": expires_at}
+
+    def version(self, producto, params=None):
+        """Timestamp de la entrada (sin deserializarla); None si no existe"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT timestamp FROM cache WHERE clave = ?",
+                (self.clave(producto, params),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def por_expirar(self, margen):
+        """Entradas cuyo token expira dentro de `margen` segundos"""
+        limite = time.time() + margen
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT producto, params, expires_at FROM cache "
+                "WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (limite,)
+            ).fetchall()
+        return [
+            {"producto": producto, "params": json.loads(params), "expires_at": expires_at}
+            for producto, params, expires_at in rows
+        ]
+
+    def eliminar(self, producto, params=None):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE clave = ?", (self.clave(producto, params),))
+
+    def sincronizar(self, cache, producto, campo):
+        """Actualiza un cache en memoria si otro proceso escribió una versión más reciente"""
+        version = self.version(producto)
+        if version and version != cache.get("timestamp"):
+            entrada = self.obtener(producto, incluir_expirados=True)
+            if entrada:
+                cache[campo] = entrada["valor"]
+                cache["timestamp"] = entrada["timestamp"]
+
+        # "processing" refleja el lease compartido, no solo el trabajo de este proceso
+        cache["processing"] = self.lock_activo(producto) is not None
+        return cache
+
+    # --- Locks entre procesos ---
+
+    @staticmethod
+    def nuevo_owner():
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def adquirir_lock(self, nombre, owner, ttl):
+        """Toma el lease si está libre, expirado o ya es nuestro. Devuelve True/False"""
+        ahora = time.time()
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO locks (nombre, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(nombre) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE locks.expires_at < ? OR locks.owner = excluded.owner",
+                (nombre, owner, ahora + ttl, ahora)
+            )
+            return cursor.rowcount > 0
+
+    def renovar_lock(self, nombre, owner, ttl):
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE locks SET expires_at = ? WHERE nombre = ? AND owner = ?",
+                (time.time() + ttl, nombre, owner)
+            )
+            return cursor.rowcount > 0
+
+    def liberar_lock(self, nombre, owner):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM locks WHERE nombre = ? AND owner = ?", (nombre, owner))
+
+    def lock_activo(self, nombre):
+        """Owner y expiración del lease vigente, o None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT owner, expires_at FROM locks WHERE nombre = ? AND expires_at >= ?",
+                (nombre, time.time())
+            ).fetchone()
+        return {"owner": row[0], "expires_at": row[1]} if row else None
+
+    @contextmanager
+    def lease(self, nombre, ttl=600):
+        """Lease renovado en segundo plano; si el proceso muere, expira tras `ttl` segundos"""
+        owner = self.nuevo_owner()
+        if not self.adquirir_lock(nombre, owner, ttl):
+            yield False
+            return
+
+        detener = threading.Event()
+
+        def heartbeat():
+            while not detener.wait(ttl / 3):
+                self.renovar_lock(nombre, owner, ttl)
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            yield True
+        finally:
+            detener.set()
+            self.liberar_lock(nombre, owner)
+
+
+class LRUCache:
+    """Cache en memoria acotado (LRU), thread-safe, con TTL opcional por entrada"""
+
+    def __init__(self, maxsize=10000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or (entrada[0] and entrada[0] <= time.time()):
+                if entrada is not None:
+                    del self._datos[clave]
+                self.misses += 1
+                return default
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return entrada[1]
+
+    def set(self, clave, valor, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            self._datos[clave] = (time.time() + ttl if ttl else None, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def get_varios(self, claves, default=None):
+        """get() de muchas claves con un solo lock"""
+        ahora = time.time()
+        resultado = []
+        with self._lock:
+            for clave in claves:
+                entrada = self._datos.get(clave)
+                if entrada is None or (entrada[0] and entrada[0] <= ahora):
+                    if entrada is not None:
+                        del self._datos[clave]
+                    self.misses += 1
+                    resultado.append(default)
+                    continue
+                self._datos.move_to_end(clave)
+                self.hits += 1
+                resultado.append(entrada[1])
+        return resultado
+
+    def set_varios(self, pares, ttl=None):
+        """set() de muchos (clave, valor) con un solo lock"""
+        ttl = ttl if ttl is not None else self.ttl
+        expira = time.time() + ttl if ttl else None
+        with self._lock:
+            for clave, valor in pares:
+                self._datos[clave] = (expira, valor)
+                self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def __len__(self):
+        return len(self._datos)
+
+    def estado(self):
+        return {"size": len(self._datos), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+cache_store = CacheStore()
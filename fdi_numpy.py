@@ -0,0 +1,155 @@
+"""
+Cadena ISC/FDI en NumPy, con la misma semántica que las expresiones de Earth Engine
+de main.py (calcular_sequedad / calcular_indice_sequedad).
+
+Entradas por píxel:
+    temperature_2m, dewpoint_temperature_2m  ERA5-Land en Kelvin
+    duracion                                  suma IMERG / 2 (48 imágenes)
+    ndvi, ndvi_min, ndvi_max                  NDVI MODIS ya escalado (×0.0001)
+
+Los píxeles enmascarados se representan con NaN; igual que ee.Image(0).where(...),
+su clase final es 0.
+"""
+import os
+
+import numpy as np
+
+UMBRALES_CLASES = [50, 60, 70, 80, 91]
+ETIQUETAS_CLASES = [
+    'Muy baja (<50)',
+    'Baja (50-60)',
+    'Media (60-70)',
+    'Alta (70-80)',
+    'Muy alta (80-91)',
+    'Extrema (>91)'
+]
+BANDAS_ENTRADA = ['temperature_2m', 'dewpoint_temperature_2m', 'duracion', 'ndvi', 'ndvi_min', 'ndvi_max']
+
+# Valores fijos de /actualizar-sequedad
+H100_MIN = 10.0
+H100_MAX = 50.0
+
+
+def presion_vapor(temp_c):
+    return 6.1078 * np.exp(17.27 * temp_c / (temp_c + 237.3))
+
+
+def humedad_relativa(temperature_2m, dewpoint_2m):
+    """HR (%) a partir de temperatura y punto de rocío en Kelvin"""
+    return presion_vapor(dewpoint_2m - 273.15) / presion_vapor(temperature_2m - 273.15) * 100
+
+
+def emc(relahumi, temperature_2m):
+    """Contenido de humedad de equilibrio, tres tramos de HR.
+
+    Como en la expresión de EE, la temperatura entra en Kelvin (banda sin convertir).
+    """
+    rh = relahumi
+    t = temperature_2m
+    return np.where(
+        rh < 10,
+        0.032229 + 0.281073 * rh - 0.000578 * rh * t,
+        np.where(
+            rh < 50,
+            2.22749 + 0.160107 * rh - 0.014784 * t,
+            21.0606 + 0.005565 * rh ** 2 - 0.00035 * rh * t - 0.483199 * rh
+        )
+    )
+
+
+def h100(emc_valor, duracion):
+    return ((24 - duracion) * emc_valor + duracion * (0.5 * duracion + 41)) / 24
+
+
+def lrmax(ndvi_max):
+    return 0.30 + 0.30 * ((ndvi_max + 0.19) / (0.95 + 0.19))
+
+
+def rg(ndvi, ndvi_min, ndvi_max):
+    """Verdor relativo (%)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (ndvi - ndvi_min) / (ndvi_max - ndvi_min) * 100
+
+
+def lr(rg_valor, lrmax_valor):
+    return rg_valor * lrmax_valor / 100
+
+
+def mr(h100_valor, h100_min=H100_MIN, h100_max=H100_MAX):
+    return (h100_valor - h100_min) / (h100_max - h100_min)
+
+
+def fdi(lr_valor, mr_valor):
+    return (1 - lr_valor) * (1 - mr_valor) * 100
+
+
+def clasificar(fdi_valor):
+    """Seis clases 1..6 con umbrales 50/60/70/80/91; NaN → 0"""
+    clases = np.searchsorted(UMBRALES_CLASES, fdi_valor, side='right').astype(np.uint8) + 1
+    clases[np.isnan(fdi_valor)] = 0
+    return clases
+
+
+def calcular_fdi(temperature_2m, dewpoint_temperature_2m, duracion, ndvi, ndvi_min, ndvi_max,
+                 h100_min=H100_MIN, h100_max=H100_MAX, dtype=np.float64):
+    """Cadena completa sobre arrays; devuelve (fdi, clases)"""
+    t = np.asarray(temperature_2m, dtype=dtype)
+    td = np.asarray(dewpoint_temperature_2m, dtype=dtype)
+    d = np.asarray(duracion, dtype=dtype)
+    nmax = np.asarray(ndvi_max, dtype=dtype)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        h100_valor = h100(emc(humedad_relativa(t, td), t), d)
+        lr_valor = lr(rg(np.asarray(ndvi, dtype=dtype), np.asarray(ndvi_min, dtype=dtype), nmax), lrmax(nmax))
+        fdi_valor = fdi(lr_valor, mr(h100_valor, h100_min, h100_max))
+
+    return fdi_valor, clasificar(fdi_valor)
+
+
+def calcular_fdi_por_bloques(entradas, salida_fdi=None, salida_clases=None, filas_por_bloque=512,
+                             h100_min=H100_MIN, h100_max=H100_MAX, dtype=np.float32):
+    """Procesa rasters grandes por bloques de filas.
+
+    `entradas` es un dict banda → array 2D (p. ej. np.memmap de cargar_entradas).
+    Las salidas se escriben en .npy memory-mapped si se dan rutas; si no, en memoria.
+    """
+    faltantes = [b for b in BANDAS_ENTRADA if b not in entradas]
+    if faltantes:
+        raise ValueError(f"Faltan bandas de entrada: {faltantes}")
+
+    forma = entradas['temperature_2m'].shape
+    fdi_out = _crear_salida(salida_fdi, forma, dtype)
+    clases_out = _crear_salida(salida_clases, forma, np.uint8)
+
+    for inicio in range(0, forma[0], filas_por_bloque):
+        fin = min(inicio + filas_por_bloque, forma[0])
+        bloque = {banda: entradas[banda][inicio:fin] for banda in BANDAS_ENTRADA}
+        fdi_bloque, clases_bloque = calcular_fdi(**bloque, h100_min=h100_min, h100_max=h100_max, dtype=dtype)
+        fdi_out[inicio:fin] = fdi_bloque
+        clases_out[inicio:fin] = clases_bloque
+
+    for salida in (fdi_out, clases_out):
+        if isinstance(salida, np.memmap):
+            salida.flush()
+
+    return fdi_out, clases_out
+
+
+def _crear_salida(ruta, forma, dtype):
+    if ruta is None:
+        return np.empty(forma, dtype=dtype)
+    return np.lib.format.open_memmap(ruta, mode='w+', dtype=dtype, shape=forma)
+
+
+def cargar_entradas(directorio):
+    """Abre {banda}.npy de un directorio como memmap de solo lectura"""
+    return {
+        banda: np.load(os.path.join(directorio, f"{banda}.npy"), mmap_mode='r')
+        for banda in BANDAS_ENTRADA
+    }
+
+
+def guardar_entradas(directorio, entradas):
+    os.makedirs(directorio, exist_ok=True)
+    for banda in BANDAS_ENTRADA:
+        np.save(os.path.join(directorio, f"{banda}.npy"), np.asarray(entradas[banda]))
@@ -1,7 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fire_processor import FireProcessor
 from scheduler import scheduler_instance
+from cache_store import cache_store
+from jobs import job_manager, eventos_job
+from fire_store import poligonos_region
+from fire_jobs import procesar_incendios
+from fire_stats import resumen_region
+from firms_poller import FirmsPoller
+from parametros import normalizar_bbox
+from regiones import REGIONES, REGION_DEFECTO, obtener_region, regiones_activas, clave_region, capas_limites
+from respuestas import respuesta_json
+from metricas import MiddlewareMetricas, edad_caches, caches_lru, consultas_cache, respuesta_metricas
+import asyncio
+import os
 import time
 from datetime import datetime
 
@@ -14,6 +27,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MiddlewareMetricas)
 
 fire_cache = {
     "data": None,
@@ -21,68 +35,248 @@ fire_cache = {
     "processing": False
 }
 
+# Cache en memoria por región (la región por defecto es fire_cache)
+caches_region = {REGION_DEFECTO: fire_cache}
+
+def cache_region(region):
+    return caches_region.setdefault(region, {"data": None, "timestamp": None, "processing": False})
+
+# Gauges de /metrics: antigüedad del cache y aciertos de la cache de tiles, por región
+edad_caches(lambda: {clave_region("incendios", r): (cache, "data") for r, cache in list(caches_region.items())})
+caches_lru(lambda: {clave_region("tiles_incendios", r): poligonos_region(r).tiles for r in list(caches_region)})
+
+def nombre_region(region):
+    """Región normalizada; ValueError si no está registrada"""
+    region = (region or REGION_DEFECTO).lower()
+    obtener_region(region)
+    return region
+
+# Polígonos procesados servidos localmente por región (MVT y GeoJSON por bbox)
+FIRE_TILE_MAX_AGE = int(os.getenv('FIRE_TILE_MAX_AGE', 15 * 60))
+
+# Disparo del procesamiento: "firms" (por disponibilidad de datos) o "cron" (horario fijo),
+# para cada región de FIRE_REGIONES; cada región es un job propio y pueden correr a la vez
+FIRE_TRIGGER = os.getenv('FIRE_TRIGGER', 'firms')
+firms_pollers = {}
+
+def encolar_region(region):
+    return job_manager.submit("incendios", ejecutar_incendios, {"region": region})
+
 @app.on_event("startup")
 async def startup_event():
-    scheduler_instance.start_in_background()
-    print("Fire scheduler started")
+    for region in regiones_activas():
+        incendios = cache_store.obtener(clave_region("incendios", region))
+        if incendios:
+            cache = cache_region(region)
+            cache["data"] = incendios["valor"]
+            cache["timestamp"] = incendios["timestamp"]
+            print(f"♻️ Cache de incendios ({region}) restaurado desde disco")
+
+        if FIRE_TRIGGER == "firms":
+            firms_pollers[region] = FirmsPoller(
+                FireProcessor(region=region), lambda region=region: encolar_region(region)
+            )
+            firms_pollers[region].start_in_background()
+        else:
+            scheduler_instance.registrar(
+                clave_region("incendios", region),
+                os.getenv('FIRE_CRON', '0 6,18 * * *'),
+                ejecutar_incendios,
+                politica=os.getenv('FIRE_OVERLAP_POLICY', 'skip'),
+                contar_filas=lambda result: result.get("stats", {}).get("total_poligonos"),
+                tipo="incendios",
+                params={"region": region}
+            )
+
+    if FIRE_TRIGGER != "firms":
+        scheduler_instance.start_in_background()
+        print("Fire scheduler started")
 
 @app.get("/")
 async def root():
     return {"message": "API Procesamiento de Incendios", "status": "ok"}
 
+def ejecutar_incendios(job):
+    """Trabajo: procesa incendios de la región del job y deja el resultado en su cache"""
+    region = job.params.get("region", REGION_DEFECTO)
+    return procesar_incendios(job, region, cache_region(region))
+
 @app.post("/process-fires")
-async def process_fires():
-    if fire_cache["processing"]:
-        return {
-            "success": False,
-            "message": "Ya se está procesando incendios. Espera unos minutos.",
-            "processing": True
-        }
-    
-    fire_cache["processing"] = True
-    
+async def process_fires(regiones: str = None):
+    """Encola un job por región ("ecuador,peru" o "todas"; por defecto FIRE_REGIONES)"""
     try:
-        processor = FireProcessor()
-        result = processor.process_all()
-        
-        fire_cache["data"] = result
-        fire_cache["timestamp"] = time.time()
-        fire_cache["processing"] = False
-        
-        return result
-        
-    except Exception as e:
-        fire_cache["processing"] = False
-        return {"success": False, "error": str(e)}
+        if regiones == "todas":
+            nombres = list(REGIONES)
+        elif regiones:
+            nombres = [nombre_region(r.strip()) for r in regiones.split(",") if r.strip()]
+        else:
+            nombres = regiones_activas()
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    jobs = []
+    for region in nombres:
+        job, nuevo = encolar_region(region)
+        jobs.append({
+            "region": region,
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events",
+            "deduplicated": not nuevo
+        })
+    
+    return JSONResponse(status_code=202, content={
+        "success": True,
+        **(jobs[0] if len(jobs) == 1 else {}),
+        "jobs": jobs,
+        "message": "Procesamiento de incendios encolado. Consulta status_url para ver el avance."
+    })
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas de Prometheus de este worker"""
+    return respuesta_metricas()
+
+@app.get("/regiones")
+async def list_regiones():
+    """Regiones registradas (bbox, CRS, capa de límites, umbrales) y capas de límites en memoria"""
+    return {
+        "regiones": REGIONES,
+        "activas": regiones_activas(),
+        "limites_cargados": capas_limites.estado()
+    }
+
+@app.get("/jobs")
+async def list_jobs():
+    return {"jobs": job_manager.listar()}
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    """Progreso del job en vivo (Server-Sent Events): etapas y contadores hasta que termine"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Job no encontrado"})
+    return StreamingResponse(eventos_job(job), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Job no encontrado"})
+    return job.to_dict()
+
+@app.get("/scheduler")
+async def scheduler_status():
+    """Tareas programadas, próxima ejecución e historial (duración, filas, resultado)"""
+    return scheduler_instance.estado()
+
+@app.get("/firms-status")
+async def firms_status(region: str = None):
+    """Marcas de agua por fuente, novedades pendientes y contadores del sondeo de FIRMS"""
+    poller = firms_pollers.get((region or REGION_DEFECTO).lower())
+    if poller is None:
+        return {"activo": False, "trigger": FIRE_TRIGGER}
+    return {"trigger": FIRE_TRIGGER, **poller.estado()}
 
 @app.get("/fires-cache")
-async def get_fires_cache():
+async def get_fires_cache(request: Request, region: str = None):
+    try:
+        region = nombre_region(region)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    fire_cache = cache_region(region)
+    cache_store.sincronizar(fire_cache, clave_region("incendios", region), "data")
     if fire_cache["data"] and fire_cache["timestamp"]:
         age_minutes = (time.time() - fire_cache["timestamp"]) / 60
-        return {
+        consultas_cache.inc(clave_region("incendios", region), "hit")
+        return respuesta_json(request, {
             "success": True,
             "from_cache": True,
             "cache_age_minutes": round(age_minutes, 1),
             **fire_cache["data"]
-        }
+        }, version=("fires-cache", region, fire_cache["timestamp"]), modificado=fire_cache["timestamp"])
     else:
+        consultas_cache.inc(clave_region("incendios", region), "miss")
         return {
             "success": False,
             "message": "No hay cache de incendios disponible",
             "suggestion": "Ejecuta /process-fires primero"
         }
 
+@app.get("/fires/tiles/{z}/{x}/{y}.mvt")
+async def get_fire_tile(z: int, x: int, y: int, request: Request, region: str = None):
+    """Polígonos de incendios como vector tile; la cache se invalida con cada ejecución"""
+    try:
+        region = nombre_region(region)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    poligonos_incendios = poligonos_region(region)
+    version = poligonos_incendios.version()
+    if version is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "No hay polígonos. Ejecuta /process-fires primero"})
+
+    headers = {
+        "ETag": f'"fires-{region}-{version}-{z}-{x}-{y}"',
+        "Cache-Control": f"public, max-age={FIRE_TILE_MAX_AGE}"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    contenido = await asyncio.to_thread(poligonos_incendios.tile_mvt, z, x, y)
+    return Response(content=contenido, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+@app.get("/fires/geojson")
+async def get_fires_geojson(request: Request, bbox: str, zoom: int = None, desde: str = None, hasta: str = None, region: str = None):
+    """Polígonos que intersectan el bbox (minlon,minlat,maxlon,maxlat), simplificados según zoom"""
+    try:
+        coords = normalizar_bbox(bbox)
+        region = nombre_region(region)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    poligonos_incendios = poligonos_region(region)
+    version = poligonos_incendios.version()
+    if version is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "No hay polígonos. Ejecuta /process-fires primero"})
+
+    contenido = await asyncio.to_thread(poligonos_incendios.geojson, coords, zoom, desde, hasta)
+    return respuesta_json(request, contenido, version=("fires-geojson", region, version, coords, zoom, desde, hasta), modificado=version)
+
+@app.get("/fires/stats")
+async def get_fires_stats(request: Request, nivel: str = "provincia", desde: str = None, hasta: str = None, zona: str = None, por: str = "zona", region: str = None):
+    """Eventos, hectáreas y duración máxima por provincia/cantón/parroquia o por día (rollups precalculados)"""
+    try:
+        region = nombre_region(region)
+        resumen = resumen_region(region)
+        contenido = {"success": True, "nivel": nivel, "region": region, **resumen.consultar(nivel, desde, hasta, zona, por)}
+        version = resumen.version()
+        return respuesta_json(request, contenido, version=("fires-stats", region, version, nivel, desde, hasta, zona, por), modificado=version)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
 @app.get("/fires-status")
-async def fires_status():
+async def fires_status(request: Request, region: str = None):
+    try:
+        region = nombre_region(region)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    fire_cache = cache_region(region)
+    cache_store.sincronizar(fire_cache, clave_region("incendios", region), "data")
     if fire_cache["timestamp"]:
         age_minutes = (time.time() - fire_cache["timestamp"]) / 60
-        return {
+        return respuesta_json(request, {
             "cache_available": bool(fire_cache["data"]),
             "cache_age_minutes": round(age_minutes, 1),
             "processing": fire_cache["processing"],
             "last_update": datetime.fromtimestamp(fire_cache["timestamp"]).strftime("%Y-%m-%d %H:%M:%S") if fire_cache["timestamp"] else None,
             "stats": fire_cache["data"].get("stats") if fire_cache["data"] else None
-        }
+        }, version=("fires-status", region, fire_cache["timestamp"], fire_cache["processing"]), modificado=fire_cache["timestamp"])
     else:
         return {
             "cache_available": False,
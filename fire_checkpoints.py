@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+# Cambiar al modificar la lógica de una etapa: invalida todos los checkpoints anteriores
+VERSION_ETAPAS = 1
+
+
+class CheckpointsEtapas:
+    """Resultados de las etapas de FireProcessor direccionados por contenido.
+
+    La clave de cada etapa es el hash de la clave de su entrada (la etapa anterior,
+    o el contenido descargado para la primera) más sus parámetros: si nada cambió,
+    la etapa se salta y se carga su salida. GeoParquet si hay pyarrow, si no pickle.
+    Se purgan por antigüedad y, por encima del tamaño máximo, los de uso más antiguo.
+    """
+
+    def __init__(self, directorio=None, max_edad=None, max_bytes=None):
+        self.directorio = directorio or os.getenv('FIRE_CHECKPOINT_DIR', os.path.join('cache', 'fires', 'checkpoints'))
+        self.max_edad = max_edad or int(os.getenv('FIRE_CHECKPOINT_MAX_AGE', 7 * 24 * 3600))
+        self.max_bytes = max_bytes or int(os.getenv('FIRE_CHECKPOINT_MAX_MB', 500)) * 1024 * 1024
+        self.extension = ".parquet" if pyarrow is not None else ".pkl"
+        os.makedirs(self.directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {"aciertos": 0, "fallos": 0, "guardados": 0, "purgados": 0}
+
+    @staticmethod
+    def huella(datos):
+        """Hash del contenido de un (Geo)DataFrame: columnas, valores e índice, geometría en WKB"""
+        import pandas as pd
+
+        h = hashlib.sha256()
+        h.update(json.dumps([str(c) for c in datos.columns]).encode('utf-8'))
+        atributos = datos.drop(columns=[c for c in datos.columns if c == 'geometry'])
+        h.update(pd.util.hash_pandas_object(atributos.astype(str), index=True).values.tobytes())
+        if 'geometry' in datos.columns:
+            for wkb in datos.geometry.to_wkb():
+                h.update(wkb or b'')
+            h.update(str(datos.crs).encode('utf-8'))
+        return h.hexdigest()
+
+    @staticmethod
+    def clave(etapa, entrada, params):
+        contenido = json.dumps(
+            {"etapa": etapa, "entrada": entrada, "params": params, "version": VERSION_ETAPAS},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def ruta(self, clave):
+        return os.path.join(self.directorio, clave + self.extension)
+
+    def cargar(self, clave):
+        ruta = self.ruta(clave)
+        try:
+            if self.extension == ".parquet":
+                import geopandas as gpd
+                import pandas as pd
+                import pyarrow.parquet as pq
+
+                # Las salidas sin geometría (p. ej. vacías) se guardan como Parquet plano
+                if b'geo' in (pq.read_schema(ruta).metadata or {}):
+                    datos = gpd.read_parquet(ruta)
+                else:
+                    datos = pd.read_parquet(ruta)
+            else:
+                import pandas as pd
+                datos = pd.read_pickle(ruta)
+        except FileNotFoundError:
+            self.stats["fallos"] += 1
+            return None
+        except Exception as e:
+            print(f"⚠️ Checkpoint ilegible {clave[:12]}, se recalcula: {e}")
+            self.stats["fallos"] += 1
+            return None
+
+        # La hora de modificación marca el último uso (orden de purga por tamaño)
+        os.utime(ruta)
+        self.stats["aciertos"] += 1
+        return datos
+
+    def guardar(self, clave, datos):
+        ruta = self.ruta(clave)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if self.extension == ".parquet":
+                datos.to_parquet(temporal)
+            else:
+                datos.to_pickle(temporal)
+            os.replace(temporal, ruta)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar el checkpoint {clave[:12]}: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return
+        self.stats["guardados"] += 1
+        self.purgar()
+
+    def _archivos(self):
+        archivos = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith(self.extension):
+                ruta = os.path.join(self.directorio, nombre)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                archivos.append((info.st_mtime, info.st_size, ruta))
+        return sorted(archivos)
+
+    def purgar(self):
+        """Borra los checkpoints sin usar en max_edad y, si aún sobra, los menos usados recientemente"""
+        with self._lock:
+            ahora = time.time()
+            archivos = self._archivos()
+            total = sum(tamano for _, tamano, _ in archivos)
+            for usado, tamano, ruta in archivos:
+                if ahora - usado <= self.max_edad and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                total -= tamano
+                self.stats["purgados"] += 1
+
+    def estado(self):
+        archivos = self._archivos()
+        return {
+            "directorio": self.directorio,
+            "formato": "geoparquet" if self.extension == ".parquet" else "pickle",
+            "checkpoints": len(archivos),
+            "mb": round(sum(tamano for _, tamano, _ in archivos) / 1024 / 1024, 2),
+            **self.stats
+        }
+
+
+checkpoints_etapas = CheckpointsEtapas()
@@ -0,0 +1,229 @@
+"""
+Agrupamiento espacio-temporal de detecciones FIRMS en eventos.
+
+Dos detecciones están conectadas si distan como mucho `distancia` (m, CRS métrico)
+y sus fechas difieren entre 0 y `lag` días. Modos:
+
+    secuencial   la semántica original de FireProcessor.assign_event_ids: semillas en
+                 orden de fecha y expansión solo hacia fechas posteriores (depende del orden)
+    componentes  cada componente conexa es un evento (no depende del orden)
+
+Para conjuntos grandes el plano se parte en teselas con un halo >= distancia: cada
+tesela se agrupa por separado (en procesos) y las componentes se unen globalmente.
+Como ninguna arista cruza componentes, el modo secuencial se ejecuta después por
+componente y se numera por la posición global de cada semilla: el resultado es
+idéntico al de una sola tesela.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+NS_DIA = 86_400 * 10**9
+MODOS_CLUSTERING = ("secuencial", "componentes")
+
+CLUSTERING_MODO = os.getenv('CLUSTERING_MODO', 'secuencial')
+CLUSTERING_TESELA_M = float(os.getenv('CLUSTERING_TESELA_M', 100_000))
+CLUSTERING_PROCESOS = int(os.getenv('CLUSTERING_PROCESOS', 1))
+# Por debajo de este número de detecciones no compensa teselar
+CLUSTERING_TESELADO_MIN = int(os.getenv('CLUSTERING_TESELADO_MIN', 20_000))
+
+
+def _conectados(x, y, t, a, b, distancia, lag):
+    """Máscara de pares (a, b) conectados: distancia euclídea y diferencia de días como en pandas"""
+    dx = x[a] - x[b]
+    dy = y[a] - y[b]
+    dias_ab = (t[b] - t[a]) // NS_DIA
+    dias_ba = (t[a] - t[b]) // NS_DIA
+    return (np.sqrt(dx * dx + dy * dy) <= distancia) & (
+        ((dias_ab >= 0) & (dias_ab <= lag)) | ((dias_ba >= 0) & (dias_ba <= lag))
+    )
+
+
+def componentes_tesela(x, y, t, indices, distancia, lag):
+    """Componentes conexas (de más de un punto) de una tesela, en índices globales"""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    from scipy.spatial import cKDTree
+
+    if len(x) < 2:
+        return []
+    # Radio con holgura: el filtro exacto se aplica después
+    pares = cKDTree(np.column_stack([x, y])).query_pairs(distancia * (1 + 1e-9), output_type='ndarray')
+    a, b = pares[:, 0], pares[:, 1]
+    validos = _conectados(x, y, t, a, b, distancia, lag)
+    a, b = a[validos], b[validos]
+    if len(a) == 0:
+        return []
+
+    grafo = coo_matrix((np.ones(len(a), dtype=np.int8), (a, b)), shape=(len(x), len(x)))
+    _, etiquetas = connected_components(grafo, directed=False)
+    orden = np.argsort(etiquetas, kind='stable')
+    cortes = np.flatnonzero(np.diff(etiquetas[orden])) + 1
+    return [indices[grupo] for grupo in np.split(orden, cortes) if len(grupo) > 1]
+
+
+def secuencial(x, y, t, distancia, lag):
+    """Agrupamiento voraz original con KD-tree: semilla (índice local) de cada punto.
+
+    Los puntos deben venir en el orden de assign_event_ids (por fecha). Cada semilla
+    expande por niveles hacia puntos sin asignar con fecha igual o posterior.
+    """
+    from scipy.spatial import cKDTree
+
+    n = len(x)
+    xy = np.column_stack([x, y])
+    arbol = cKDTree(xy)
+    semilla = np.full(n, -1, dtype=np.int64)
+    radio = distancia * (1 + 1e-9)
+
+    for i in range(n):
+        if semilla[i] >= 0:
+            continue
+        semilla[i] = i
+        frontera = [i]
+        while frontera:
+            nuevos = []
+            for p in frontera:
+                vecinos = np.array(sorted(arbol.query_ball_point(xy[p], radio)), dtype=np.int64)
+                vecinos = vecinos[semilla[vecinos] < 0]
+                if len(vecinos) == 0:
+                    continue
+                dias = (t[vecinos] - t[p]) // NS_DIA
+                dx = x[vecinos] - x[p]
+                dy = y[vecinos] - y[p]
+                vecinos = vecinos[(dias >= 0) & (dias <= lag) & (np.sqrt(dx * dx + dy * dy) <= distancia)]
+                semilla[vecinos] = i
+                nuevos.extend(vecinos.tolist())
+            frontera = nuevos
+    return semilla
+
+
+def _secuencial_lote(x, y, t, indices, distancia, lag):
+    """Modo secuencial sobre un lote de componentes completas; semillas en índices globales"""
+    return indices, indices[secuencial(x, y, t, distancia, lag)]
+
+
+def teselas(x, y, tamano, halo):
+    """Índices de cada tesela (núcleo tamano x tamano ampliado con halo), en orden determinista.
+
+    Los puntos se reparten una sola vez en celdas de `tamano`; con halo <= tamano, una
+    tesela con su halo solo puede contener puntos de su celda y de las 8 vecinas.
+    """
+    if halo > tamano:
+        raise ValueError(f"El halo ({halo}) no puede superar el tamaño de tesela ({tamano})")
+    x0, y0 = x.min(), y.min()
+    columna = np.floor((x - x0) / tamano).astype(np.int64)
+    fila = np.floor((y - y0) / tamano).astype(np.int64)
+
+    orden = np.lexsort((fila, columna))
+    celdas, inicios = np.unique(np.column_stack([columna[orden], fila[orden]]), axis=0, return_index=True)
+    trozos = np.split(orden, inicios[1:])
+    por_celda = {(int(c), int(f)): trozo for (c, f), trozo in zip(celdas, trozos)}
+
+    resultado = []
+    for c, f in por_celda:
+        candidatos = np.sort(np.concatenate([
+            por_celda[(c + dc, f + df)]
+            for dc in (-1, 0, 1) for df in (-1, 0, 1) if (c + dc, f + df) in por_celda
+        ]))
+        minx = x0 + c * tamano - halo
+        miny = y0 + f * tamano - halo
+        xc, yc = x[candidatos], y[candidatos]
+        dentro = (xc >= minx) & (xc <= minx + tamano + 2 * halo) & (yc >= miny) & (yc <= miny + tamano + 2 * halo)
+        resultado.append(candidatos[dentro])
+    return resultado
+
+
+def _etiquetar(grupos, n):
+    """Unión global de las componentes de todas las teselas; etiqueta = menor índice del grupo"""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    if grupos:
+        a = np.concatenate([np.full(len(g) - 1, g[0]) for g in grupos])
+        b = np.concatenate([g[1:] for g in grupos])
+    else:
+        a = b = np.array([], dtype=np.int64)
+    grafo = coo_matrix((np.ones(len(a), dtype=np.int8), (a, b)), shape=(n, n))
+    _, etiquetas = connected_components(grafo, directed=False)
+    primero = np.full(etiquetas.max() + 1, n, dtype=np.int64)
+    np.minimum.at(primero, etiquetas, np.arange(n))
+    return primero[etiquetas]
+
+
+def _numerar(raices):
+    """Eventos 1..k en el orden en que aparece su primer punto (como el contador original)"""
+    _, primeros, inverso = np.unique(raices, return_index=True, return_inverse=True)
+    rango = np.empty(len(primeros), dtype=np.int64)
+    rango[np.argsort(primeros, kind='stable')] = np.arange(1, len(primeros) + 1)
+    return rango[inverso.reshape(-1)]
+
+
+def asignar_eventos(x, y, t, distancia, lag, modo=None, tesela=None, procesos=None, ejecutor=None, progreso=None):
+    """evento_id (1..k) por detección, con x/y en metros y t en ns (datetime64[ns] como int64).
+
+    `ejecutor` permite repartir las teselas en cualquier Executor (p. ej. uno que
+    encole en varios nodos); por defecto ProcessPoolExecutor si procesos > 1.
+    """
+    modo = modo or CLUSTERING_MODO
+    if modo not in MODOS_CLUSTERING:
+        raise ValueError(f"Modo de clustering desconocido: {modo} ({', '.join(MODOS_CLUSTERING)})")
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    t = np.asarray(t, dtype=np.int64)
+    n = len(x)
+    if n == 0:
+        return np.array([], dtype=np.int64)
+
+    procesos = procesos or CLUSTERING_PROCESOS
+    tesela = tesela or CLUSTERING_TESELA_M
+    teselar = ejecutor is not None or (procesos > 1 and n >= CLUSTERING_TESELADO_MIN)
+
+    if not teselar:
+        if modo == "secuencial":
+            return _numerar(secuencial(x, y, t, distancia, lag))
+        return _numerar(_etiquetar(componentes_tesela(x, y, t, np.arange(n), distancia, lag), n))
+
+    propio = ejecutor is None
+    ejecutor = ejecutor or ProcessPoolExecutor(max_workers=procesos)
+    try:
+        # Halo con un margen mínimo frente al redondeo en los bordes
+        partes = teselas(x, y, max(tesela, 2 * distancia), distancia * 1.001)
+        futuros = [ejecutor.submit(componentes_tesela, x[i], y[i], t[i], i, distancia, lag) for i in partes]
+        grupos = []
+        for k, futuro in enumerate(futuros):
+            grupos.extend(futuro.result())
+            if progreso:
+                progreso(teselas_agrupadas=k + 1, teselas_total=len(futuros))
+        raices = _etiquetar(grupos, n)
+
+        if modo == "componentes":
+            return _numerar(raices)
+
+        # Lotes de componentes completas, de tamaño parecido, en orden global
+        orden = np.argsort(raices, kind='stable')
+        cortes = np.flatnonzero(np.diff(raices[orden])) + 1
+        componentes = np.split(orden, cortes)
+        objetivo = max(n // (procesos * 4), 1)
+        lotes, actual, tamano_actual = [], [], 0
+        for componente in componentes:
+            actual.append(componente)
+            tamano_actual += len(componente)
+            if tamano_actual >= objetivo:
+                lotes.append(np.sort(np.concatenate(actual)))
+                actual, tamano_actual = [], 0
+        if actual:
+            lotes.append(np.sort(np.concatenate(actual)))
+
+        semillas = np.empty(n, dtype=np.int64)
+        futuros = [ejecutor.submit(_secuencial_lote, x[i], y[i], t[i], i, distancia, lag) for i in lotes]
+        for k, futuro in enumerate(futuros):
+            indices, semilla = futuro.result()
+            semillas[indices] = semilla
+            if progreso:
+                progreso(lotes_secuenciales=k + 1, lotes_total=len(futuros))
+        return _numerar(semillas)
+    finally:
+        if propio:
+            ejecutor.shutdown()
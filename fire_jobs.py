@@ -0,0 +1,43 @@
+import os
+
+from cache_store import cache_store
+from fire_store import poligonos_region
+from regiones import clave_region
+
+# Lease entre workers para el procesamiento (se renueva mientras corre)
+PROCESSING_LEASE_TTL = int(os.getenv('PROCESSING_LEASE_TTL', 10 * 60))
+
+
+def procesar_incendios(job, region, cache=None):
+    """Trabajo compartido por main y fire_api: procesa la región bajo su lease y publica el resultado.
+
+    Guarda el resultado y las detecciones en cache_store, actualiza el almacén de
+    polígonos de la región y, si se pasa, el cache en memoria de la app que lo llama.
+    """
+    with cache_store.lease(clave_region("incendios", region), ttl=PROCESSING_LEASE_TTL) as adquirido:
+        if not adquirido:
+            return {"skipped": True, "message": f"Otro worker ya está procesando incendios ({region})"}
+
+        # geopandas/scipy/shapely se cargan solo cuando se usa el pipeline de incendios
+        from fire_processor import FireProcessor
+
+        if cache is not None:
+            cache["processing"] = True
+        try:
+            processor = FireProcessor(progress_hook=job.progress_hook, region=region)
+            result = processor.process_all()
+            if not result.get("success"):
+                raise RuntimeError(result.get("error", "Error procesando incendios"))
+
+            entrada = cache_store.guardar(clave_region("incendios", region), result)
+            if processor.ultimas_detecciones:
+                cache_store.guardar(clave_region("detecciones", region), processor.ultimas_detecciones)
+            if processor.ultimos_eventos is not None:
+                poligonos_region(region).actualizar(processor.ultimos_eventos, min_ha=processor.min_ha)
+            if cache is not None:
+                cache["data"] = result
+                cache["timestamp"] = entrada["timestamp"]
+            return result
+        finally:
+            if cache is not None:
+                cache["processing"] = False
@@ -0,0 +1,148 @@
+import bisect
+import json
+import os
+import threading
+
+from regiones import REGION_DEFECTO, directorio_region
+
+# Nivel → columna de nombre en los eventos de FireProcessor (los códigos DPA no viajan a Supabase)
+NIVELES_RESUMEN = {
+    "provincia": ["dpa_despro"],
+    "canton": ["dpa_despro", "dpa_descan"],
+    "parroquia": ["dpa_despro", "dpa_descan", "dpa_despar"]
+}
+
+
+class ResumenIncendios:
+    """Rollups por nivel DPA y día: hectáreas, duración máxima e IDs de eventos activos.
+
+    Cada ejecución reemplaza solo los días que cubre; los anteriores se conservan.
+    El índice vive en memoria y se persiste en JSON; otros workers lo recargan por mtime.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or os.getenv('FIRE_STATS_PATH', os.path.join('cache', 'fires', 'resumen.json'))
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        self._lock = threading.Lock()
+        self._cargado = None
+        # nivel → fecha → zona → [hectareas, duracion_max, {evento_id}]
+        self.indice = {nivel: {} for nivel in NIVELES_RESUMEN}
+        self.fechas = []
+
+    def version(self):
+        try:
+            return os.path.getmtime(self.ruta)
+        except FileNotFoundError:
+            return None
+
+    def _cargar(self):
+        version = self.version()
+        if version is None or version == self._cargado:
+            return
+        with open(self.ruta, encoding='utf-8') as f:
+            datos = json.load(f)
+
+        indice = {nivel: {} for nivel in NIVELES_RESUMEN}
+        for nivel, zona, fecha, hectareas, duracion, eventos in datos["celdas"]:
+            indice[nivel].setdefault(fecha, {})[zona] = [hectareas, duracion, set(eventos)]
+        self.indice = indice
+        self.fechas = sorted({fecha for por_fecha in indice.values() for fecha in por_fecha})
+        self._cargado = version
+
+    def _guardar(self):
+        celdas = [
+            [nivel, zona, fecha, round(hectareas, 3), duracion, sorted(eventos)]
+            for nivel, por_fecha in self.indice.items()
+            for fecha, zonas in por_fecha.items()
+            for zona, (hectareas, duracion, eventos) in zonas.items()
+        ]
+        temporal = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({"celdas": celdas}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temporal, self.ruta)
+        self._cargado = self.version()
+
+    def actualizar(self, eventos, min_ha=10):
+        """Recalcula los días cubiertos por la ejecución (mismo criterio ≥10 ha que Supabase)"""
+        eventos = eventos[eventos['superficie_ha_total'] >= min_ha]
+        if eventos.empty:
+            return 0
+
+        fechas = eventos['fecha'].dt.strftime('%Y-%m-%d')
+        desde, hasta = fechas.min(), fechas.max()
+
+        with self._lock:
+            self._cargar()
+            for nivel, columnas in NIVELES_RESUMEN.items():
+                por_fecha = self.indice[nivel]
+                for fecha in [f for f in por_fecha if desde <= f <= hasta]:
+                    del por_fecha[fecha]
+
+                zonas = eventos[columnas].fillna('').astype(str).agg(' / '.join, axis=1)
+                agrupado = eventos.assign(_zona=zonas, _fecha=fechas).groupby(['_fecha', '_zona']).agg(
+                    hectareas=('superficie_ha_individual', 'sum'),
+                    duracion=('duracion_dias', 'max'),
+                    eventos=('evento_id', lambda ids: {int(i) for i in ids})
+                )
+                for (fecha, zona), fila in agrupado.iterrows():
+                    por_fecha.setdefault(fecha, {})[zona] = [float(fila.hectareas), int(fila.duracion), fila.eventos]
+
+            self.fechas = sorted({fecha for por_fecha in self.indice.values() for fecha in por_fecha})
+            self._guardar()
+            print(f"📊 Resumen de incendios actualizado: {desde} a {hasta}")
+            return len(fechas.unique())
+
+    def consultar(self, nivel="provincia", desde=None, hasta=None, zona=None, por="zona"):
+        """Agrega el rango [desde, hasta] por zona o por día; `zona` filtra por prefijo de nombre"""
+        if nivel not in NIVELES_RESUMEN:
+            raise ValueError(f"Nivel inválido. Usa: {list(NIVELES_RESUMEN)}")
+        if por not in ("zona", "dia"):
+            raise ValueError("'por' debe ser 'zona' o 'dia'")
+
+        with self._lock:
+            self._cargar()
+            fechas = self.fechas[
+                bisect.bisect_left(self.fechas, desde) if desde else 0:
+                bisect.bisect_right(self.fechas, hasta) if hasta else len(self.fechas)
+            ]
+            zona = zona.upper() if zona else None
+
+            grupos = {}
+            for fecha in fechas:
+                for nombre, (hectareas, duracion, eventos) in self.indice[nivel].get(fecha, {}).items():
+                    if zona and not nombre.upper().startswith(zona):
+                        continue
+                    clave = nombre if por == "zona" else fecha
+                    grupo = grupos.setdefault(clave, [0.0, 0, set()])
+                    grupo[0] += hectareas
+                    grupo[1] = max(grupo[1], duracion)
+                    grupo[2] |= eventos
+
+        filas = [
+            {por: clave, "eventos": len(eventos), "hectareas": round(hectareas, 2), "duracion_max_dias": duracion}
+            for clave, (hectareas, duracion, eventos) in grupos.items()
+        ]
+        if por == "zona":
+            filas.sort(key=lambda f: f["hectareas"], reverse=True)
+        else:
+            filas.sort(key=lambda f: f["dia"])
+        return {
+            "desde": fechas[0] if fechas else None,
+            "hasta": fechas[-1] if fechas else None,
+            "filas": filas
+        }
+
+
+resumen_incendios = ResumenIncendios()
+_resumenes = {REGION_DEFECTO: resumen_incendios}
+_resumenes_lock = threading.Lock()
+
+
+def resumen_region(region=None):
+    """Rollups de la región (cache/fires/<region>/resumen.json; la región por defecto usa el original)"""
+    region = (region or REGION_DEFECTO).lower()
+    with _resumenes_lock:
+        if region not in _resumenes:
+            directorio = directorio_region(os.path.dirname(resumen_incendios.ruta), region)
+            _resumenes[region] = ResumenIncendios(os.path.join(directorio, os.path.basename(resumen_incendios.ruta)))
+        return _resumenes[region]
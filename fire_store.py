@@ -0,0 +1,282 @@
+import math
+import os
+import struct
+import threading
+
+import numpy as np
+
+from cache_store import LRUCache
+from regiones import REGION_DEFECTO, directorio_region
+from raster_cache import ORIGEN_MERCATOR, TAMANO_TILE, limites_tile
+
+# Atributos de cada polígono que se sirven en GeoJSON y MVT
+COLUMNAS_PROPIEDADES = [
+    'evento_id', 'fecha', 'dia_del_incendio', 'superficie_ha_individual',
+    'superficie_ha_total', 'duracion_dias', 'dpa_despro', 'dpa_descan', 'dpa_despar'
+]
+EXTENT_MVT = 4096
+BUFFER_MVT = 64
+CAPA_MVT = "incendios"
+
+
+def tolerancia_zoom(z, fraccion_pixel=0.5):
+    """Tolerancia de simplificación (m, EPSG:3857) equivalente a una fracción de píxel en el zoom z"""
+    return 2 * ORIGEN_MERCATOR / 2 ** z / TAMANO_TILE * fraccion_pixel
+
+
+def _varint(valor):
+    salida = bytearray()
+    while True:
+        byte = valor & 0x7f
+        valor >>= 7
+        if valor:
+            salida.append(byte | 0x80)
+        else:
+            salida.append(byte)
+            return bytes(salida)
+
+
+def _campo(numero, tipo, datos):
+    """Campo protobuf: tipo 0 (varint) o 2 (bytes con longitud)"""
+    if tipo == 0:
+        return _varint(numero << 3) + _varint(datos)
+    return _varint(numero << 3 | 2) + _varint(len(datos)) + datos
+
+
+def _zigzag(valor):
+    return (valor << 1) ^ (valor >> 31)
+
+
+def _valor_mvt(valor):
+    if isinstance(valor, bool):
+        return _campo(7, 0, int(valor))
+    if isinstance(valor, int):
+        return _campo(6, 0, (valor << 1) ^ (valor >> 63))
+    if isinstance(valor, float):
+        return _varint(3 << 3 | 1) + struct.pack('<d', valor)
+    return _campo(1, 2, str(valor).encode('utf-8'))
+
+
+def _geometria_mvt(anillos):
+    """Comandos MoveTo/LineTo/ClosePath con deltas zigzag (anillos ya en coordenadas de tile)"""
+    comandos = []
+    cx = cy = 0
+    for anillo in anillos:
+        puntos = anillo[:-1]
+        for i, (x, y) in enumerate(puntos):
+            if i == 0:
+                comandos.append(1 | (1 << 3))
+            elif i == 1:
+                comandos.append(2 | ((len(puntos) - 1) << 3))
+            comandos.extend([_zigzag(x - cx), _zigzag(y - cy)])
+            cx, cy = x, y
+        comandos.append(7 | (1 << 3))
+    return b''.join(_varint(c) for c in comandos)
+
+
+def codificar_mvt(nombre, features, extent=EXTENT_MVT):
+    """Mapbox Vector Tile mínimo (sin dependencias): una capa de polígonos.
+
+    `features` es una lista de (anillos, propiedades); los anillos vienen en coordenadas
+    enteras del tile, exteriores en sentido horario en pantalla e interiores al revés.
+    """
+    claves, valores = {}, {}
+    cuerpo = _campo(15, 0, 2) + _campo(1, 2, nombre.encode('utf-8'))
+
+    for i, (anillos, propiedades) in enumerate(features):
+        etiquetas = []
+        for clave, valor in propiedades.items():
+            if valor is None:
+                continue
+            etiquetas.append(claves.setdefault(clave, len(claves)))
+            etiquetas.append(valores.setdefault((type(valor), valor), len(valores)))
+
+        feature = (
+            _campo(1, 0, i + 1)
+            + _campo(2, 2, b''.join(_varint(e) for e in etiquetas))
+            + _campo(3, 0, 3)
+            + _campo(4, 2, _geometria_mvt(anillos))
+        )
+        cuerpo += _campo(2, 2, feature)
+
+    for clave in claves:
+        cuerpo += _campo(3, 2, clave.encode('utf-8'))
+    for (_, valor) in valores:
+        cuerpo += _campo(4, 2, _valor_mvt(valor))
+    cuerpo += _campo(5, 0, extent)
+
+    return _campo(3, 2, cuerpo)
+
+
+class PoligonosIncendios:
+    """Polígonos de eventos procesados en un almacén local con índice espacial (STRtree, EPSG:3857)"""
+
+    def __init__(self, directorio=None, max_tiles=None):
+        self.directorio = directorio or os.getenv('FIRE_STORE_DIR', os.path.join('cache', 'fires'))
+        os.makedirs(self.directorio, exist_ok=True)
+        self.tiles = LRUCache(maxsize=max_tiles or int(os.getenv('FIRE_TILE_CACHE_SIZE', 5000)))
+        self._lock = threading.Lock()
+        self._cargado = None
+        self._gdf = None
+        self._arbol = None
+
+    def ruta(self):
+        return os.path.join(self.directorio, "poligonos.pkl")
+
+    def version(self):
+        """mtime del almacén; cambia con cada ejecución completada"""
+        try:
+            return os.path.getmtime(self.ruta())
+        except FileNotFoundError:
+            return None
+
+    def actualizar(self, eventos, min_ha=10):
+        """Guarda los polígonos de eventos grandes de una ejecución (reemplaza la anterior)"""
+        eventos = eventos[
+            (eventos['superficie_ha_total'] >= min_ha)
+            & eventos.geometry.geom_type.isin(['Polygon', 'MultiPolygon'])
+        ]
+        columnas = [c for c in COLUMNAS_PROPIEDADES if c in eventos.columns]
+        gdf = eventos[columnas + ['geometry']].to_crs('EPSG:3857').reset_index(drop=True)
+        gdf['fecha'] = gdf['fecha'].dt.strftime('%Y-%m-%d')
+        gdf['evento_id'] = gdf['evento_id'].astype(int)
+
+        temporal = f"{self.ruta()}.{os.getpid()}.tmp"
+        gdf.to_pickle(temporal)
+        os.replace(temporal, self.ruta())
+        # Las claves de tile llevan la versión: las entradas anteriores ya no se consultan
+        self.tiles = LRUCache(maxsize=self.tiles.maxsize)
+        print(f"🔥 Almacén de polígonos actualizado: {len(gdf)} polígonos")
+        return self.version()
+
+    def _cargar(self):
+        """GeoDataFrame e índice vigentes; se recargan si otro worker publicó una versión nueva"""
+        import pandas as pd
+        from shapely import STRtree
+
+        version = self.version()
+        with self._lock:
+            if version is not None and version != self._cargado:
+                self._gdf = pd.read_pickle(self.ruta())
+                self._arbol = STRtree(self._gdf.geometry.values)
+                self._cargado = version
+            return self._gdf, self._arbol
+
+    def _consultar(self, minx, miny, maxx, maxy):
+        from shapely.geometry import box
+
+        gdf, arbol = self._cargar()
+        if gdf is None or gdf.empty:
+            return None, []
+        return gdf, arbol.query(box(minx, miny, maxx, maxy), predicate='intersects')
+
+    def geojson(self, bbox, zoom=None, fecha_desde=None, fecha_hasta=None):
+        """FeatureCollection (EPSG:4326) de los polígonos que intersectan el bbox lon/lat"""
+        import geopandas as gpd
+        from raster_cache import lonlat_a_mercator
+
+        (minx, maxx), (miny, maxy) = lonlat_a_mercator([bbox[0], bbox[2]], [bbox[1], bbox[3]])
+        gdf, indices = self._consultar(minx, miny, maxx, maxy)
+        if gdf is None or not len(indices):
+            return {"type": "FeatureCollection", "features": []}
+
+        seleccion = gdf.iloc[sorted(indices)]
+        if fecha_desde:
+            seleccion = seleccion[seleccion['fecha'] >= fecha_desde]
+        if fecha_hasta:
+            seleccion = seleccion[seleccion['fecha'] <= fecha_hasta]
+
+        geometrias = seleccion.geometry
+        if zoom is not None:
+            geometrias = geometrias.simplify(tolerancia_zoom(zoom, 1.0), preserve_topology=True)
+        salida = gpd.GeoDataFrame(seleccion.drop(columns='geometry'), geometry=geometrias, crs='EPSG:3857')
+        return salida.to_crs('EPSG:4326').__geo_interface__
+
+    def tile_mvt(self, z, x, y):
+        """Tile MVT con recorte al tile (+buffer) y simplificación por zoom; cacheado por versión"""
+        version = self.version()
+        clave = (version, z, x, y)
+        contenido = self.tiles.get(clave)
+        if contenido is not None:
+            return contenido
+
+        contenido = self._generar_tile(z, x, y)
+        self.tiles.set(clave, contenido)
+        return contenido
+
+    def _generar_tile(self, z, x, y):
+        import shapely
+        from shapely.geometry.polygon import orient
+
+        minx, miny, maxx, maxy = limites_tile(z, x, y)
+        margen = (maxx - minx) * BUFFER_MVT / EXTENT_MVT
+        gdf, indices = self._consultar(minx - margen, miny - margen, maxx + margen, maxy + margen)
+        if gdf is None or not len(indices):
+            return codificar_mvt(CAPA_MVT, [])
+
+        escala = EXTENT_MVT / (maxx - minx)
+        tolerancia = tolerancia_zoom(z)
+        columnas = [c for c in COLUMNAS_PROPIEDADES if c in gdf.columns]
+        features = []
+
+        for i in sorted(indices):
+            fila = gdf.iloc[i]
+            geometria = shapely.clip_by_rect(
+                fila.geometry.simplify(tolerancia, preserve_topology=True),
+                minx - margen, miny - margen, maxx + margen, maxy + margen
+            )
+            if geometria.is_empty:
+                continue
+
+            # Coordenadas de tile: origen arriba a la izquierda, y hacia abajo
+            geometria = shapely.transform(
+                geometria, lambda c: np.column_stack([np.round((c[:, 0] - minx) * escala), np.round((maxy - c[:, 1]) * escala)])
+            )
+            anillos = []
+            for poligono in getattr(geometria, 'geoms', [geometria]):
+                if poligono.geom_type != 'Polygon' or poligono.is_empty or poligono.area == 0:
+                    continue
+                # En y hacia abajo, el área positiva (exterior CCW numérico) se ve horaria en pantalla
+                poligono = orient(poligono, sign=1.0)
+                anillos.append([(int(px), int(py)) for px, py in poligono.exterior.coords])
+                anillos.extend(
+                    [(int(px), int(py)) for px, py in interior.coords]
+                    for interior in poligono.interiors if shapely.Polygon(interior).area > 0
+                )
+            if anillos:
+                propiedades = {c: _nativo(fila[c]) for c in columnas}
+                features.append((anillos, propiedades))
+
+        return codificar_mvt(CAPA_MVT, features)
+
+    def estado(self):
+        gdf, _ = self._cargar()
+        return {
+            "disponible": gdf is not None,
+            "version": self.version(),
+            "poligonos": 0 if gdf is None else len(gdf),
+            "tiles": self.tiles.estado()
+        }
+
+
+_poligonos = {}
+_poligonos_lock = threading.Lock()
+
+
+def poligonos_region(region=None):
+    """Almacén de polígonos de la región (FIRE_STORE_DIR/<region>; la región por defecto usa la raíz)"""
+    region = (region or REGION_DEFECTO).lower()
+    with _poligonos_lock:
+        if region not in _poligonos:
+            base = os.getenv('FIRE_STORE_DIR', os.path.join('cache', 'fires'))
+            _poligonos[region] = PoligonosIncendios(directorio_region(base, region))
+        return _poligonos[region]
+
+
+def _nativo(valor):
+    """Escalares de numpy/pandas → tipos de Python (NaN → None)"""
+    if hasattr(valor, 'item'):
+        valor = valor.item()
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from io import StringIO
+
+import requests
+
+from cache_store import cache_store
+from metricas import medir_upstream
+from regiones import clave_region
+
+
+class FirmsPoller:
+    """Dispara el procesamiento de incendios cuando FIRMS publica pasadas nuevas.
+
+    Sondea cada fuente con una petición pequeña (último día, condicional por ETag/Last-Modified)
+    y compara la detección más reciente con la marca de agua de la última ejecución.
+    Espera `debounce` segundos sin novedades antes de disparar (las pasadas de los
+    tres satélites llegan juntas) y dispara igualmente si pasa `max_staleness` sin ejecutar.
+    La marca de agua solo avanza cuando el job disparado termina bien: si falla, las
+    pasadas siguen pendientes y se reintentan con espera exponencial (hasta `backoff_max`).
+
+    Cada worker tiene su propio poller: antes de decidir se relee la marca de agua
+    persistida y no se dispara mientras otro worker tenga el lease de la región.
+    Un job "skipped" significa que otro worker ya procesa la región, no un fallo.
+    """
+
+    def __init__(self, procesador, disparar, intervalo=None, debounce=None, max_staleness=None, session=None,
+                 backoff_max=None):
+        self.url = procesador.main_url
+        self.map_key = procesador.map_key
+        self.fuentes = list(procesador.sources)
+        self.area = ",".join(map(str, procesador.area_coords))
+        self.disparar = disparar
+        self.intervalo = intervalo or int(os.getenv('FIRMS_POLL_INTERVAL', 10 * 60))
+        self.debounce = debounce if debounce is not None else int(os.getenv('FIRMS_DEBOUNCE', 15 * 60))
+        self.max_staleness = max_staleness or int(os.getenv('FIRMS_MAX_STALENESS', 12 * 3600))
+        self.backoff_max = backoff_max or int(os.getenv('FIRMS_BACKOFF_MAX', 6 * 3600))
+        self.session = session or getattr(procesador, "session", None) or requests.Session()
+        self.region = getattr(procesador, "region", None)
+        self.clave_cache = clave_region("firms_watermark", self.region)
+        # Mismo lease que toma fire_jobs.procesar_incendios
+        self.clave_lease = clave_region("incendios", self.region)
+
+        guardado = cache_store.obtener(self.clave_cache)
+        estado = guardado["valor"] if guardado else {}
+        self.watermarks = estado.get("watermarks", {})
+        self.ultimo_disparo = estado.get("ultimo_disparo") or time.time()
+        self.observados = dict(self.watermarks)
+        self.validadores = {}
+        # (job, observados al disparar, instante): la marca de agua avanza solo si el job termina bien
+        self.en_curso = None
+        self.ultimo_cambio = None
+        self.fallos_seguidos = 0
+        self.reintentar_desde = 0
+        self.stats = {"sondeos": 0, "no_modificados": 0, "errores": 0, "disparos": 0, "fallidos": 0, "por_staleness": 0}
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def sondear(self, fuente):
+        """Detección más reciente de la fuente ('YYYY-MM-DD HHMM'); None si no cambió o falló"""
+        cabeceras = {}
+        etag, modificado = self.validadores.get(fuente, (None, None))
+        if etag:
+            cabeceras["If-None-Match"] = etag
+        if modificado:
+            cabeceras["If-Modified-Since"] = modificado
+
+        self.stats["sondeos"] += 1
+        try:
+            with medir_upstream("firms", "sondeo"):
+                response = self.session.get(f"{self.url}/{self.map_key}/{fuente}/{self.area}/1", headers=cabeceras, timeout=30)
+                if response.status_code != 304:
+                    response.raise_for_status()
+            if response.status_code == 304:
+                self.stats["no_modificados"] += 1
+                return None
+        except Exception as e:
+            self.stats["errores"] += 1
+            print(f"Error sondeando {fuente}: {e}")
+            return None
+
+        self.validadores[fuente] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+        import pandas as pd
+
+        if not response.text.strip():
+            return None
+        df = pd.read_csv(StringIO(response.text), usecols=["acq_date", "acq_time"], dtype=str)
+        if df.empty:
+            return None
+        return (df["acq_date"] + " " + df["acq_time"].str.zfill(4)).max()
+
+    def _tick(self, ahora):
+        for fuente in self.fuentes:
+            reciente = self.sondear(fuente)
+            if reciente and reciente > self.observados.get(fuente, ""):
+                self.observados[fuente] = reciente
+                self.ultimo_cambio = ahora
+                print(f"🛰️ Nuevas detecciones en {fuente} hasta {reciente}")
+
+        if self.en_curso is not None:
+            if self.en_curso[0].activo:
+                return
+            self._confirmar(*self.en_curso, ahora)
+            self.en_curso = None
+
+        if ahora < self.reintentar_desde:
+            return
+        if cache_store.lock_activo(self.clave_lease):
+            # Otro worker (u otro job de este) procesa la región; su marca de agua se lee después
+            return
+        self._sincronizar()
+
+        pendiente = self.observados != self.watermarks
+        if pendiente and ahora - self.ultimo_cambio >= self.debounce:
+            self._disparar(ahora, "datos_nuevos")
+        elif ahora - self.ultimo_disparo >= self.max_staleness:
+            self.stats["por_staleness"] += 1
+            self._disparar(ahora, "max_staleness")
+
+    def _disparar(self, ahora, motivo):
+        job, nuevo = self.disparar()
+        if not nuevo:
+            # Ya hay una ejecución en curso que no incluye estas pasadas: se reintenta luego
+            return
+
+        self.stats["disparos"] += 1
+        self.en_curso = (job, dict(self.observados), ahora)
+        print(f"🔥 Procesamiento de {self.region} disparado por {motivo} (job {job.id})")
+
+    def _sincronizar(self):
+        """Adopta la marca de agua persistida si otro worker la avanzó"""
+        guardado = cache_store.obtener(self.clave_cache)
+        if not guardado:
+            return
+        estado = guardado["valor"]
+        for fuente, marca in estado.get("watermarks", {}).items():
+            if marca > self.watermarks.get(fuente, ""):
+                self.watermarks[fuente] = marca
+            if marca > self.observados.get(fuente, ""):
+                self.observados[fuente] = marca
+        self.ultimo_disparo = max(self.ultimo_disparo, estado.get("ultimo_disparo") or 0)
+        if self.observados == self.watermarks:
+            self.ultimo_cambio = None
+
+    def _confirmar(self, job, observados, disparado, ahora):
+        """Avanza y persiste la marca de agua si el job procesó las pasadas; si falló, espera antes de reintentar"""
+        if job.estado == "done" and (job.result or {}).get("skipped"):
+            print(f"⏭️ Otro worker procesa incendios ({self.region}); se usará su marca de agua")
+            return
+
+        if job.estado != "done":
+            self.stats["fallidos"] += 1
+            self.fallos_seguidos += 1
+            espera = min(self.intervalo * 2 ** self.fallos_seguidos, self.backoff_max)
+            self.reintentar_desde = ahora + espera
+            print(f"⚠️ El job {job.id} ({self.region}) no procesó las pasadas nuevas; se reintentará en {espera}s")
+            return
+
+        self.fallos_seguidos = 0
+        self.reintentar_desde = 0
+        self._sincronizar()
+        for fuente, marca in observados.items():
+            if marca > self.watermarks.get(fuente, ""):
+                self.watermarks[fuente] = marca
+        self.ultimo_disparo = max(self.ultimo_disparo, disparado)
+        if self.observados == self.watermarks:
+            self.ultimo_cambio = None
+        cache_store.guardar(self.clave_cache, {"watermarks": self.watermarks, "ultimo_disparo": self.ultimo_disparo})
+
+    def start_in_background(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+
+        def bucle():
+            while not self._detener.is_set():
+                try:
+                    self._tick(time.time())
+                except Exception as e:
+                    print(f"❌ Error en el sondeo de FIRMS: {e}")
+                self._detener.wait(self.intervalo)
+
+        self._detener.clear()
+        self._hilo = threading.Thread(target=bucle, daemon=True, name=f"firms-poller-{self.region}")
+        self._hilo.start()
+        print(f"🛰️ Sondeo de FIRMS ({self.region}) cada {self.intervalo}s (debounce {self.debounce}s, máx. {self.max_staleness}s sin procesar)")
+
+    def stop(self):
+        self._detener.set()
+
+    def estado(self):
+        return {
+            "activo": self._hilo is not None and self._hilo.is_alive(),
+            "region": self.region,
+            "watermarks": self.watermarks,
+            "observados": self.observados,
+            "pendiente": self.observados != self.watermarks,
+            "job_en_curso": self.en_curso[0].id if self.en_curso else None,
+            "fallos_seguidos": self.fallos_seguidos,
+            "segundos_para_reintento": max(0, round(self.reintentar_desde - time.time())),
+            "segundos_desde_ultimo_disparo": round(time.time() - self.ultimo_disparo),
+            **self.stats
+        }
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_store import cache_store
+
+# Instantáneas en cache_store para que cualquier worker responda /jobs/{id}
+JOBS_TTL = int(os.getenv('JOBS_TTL', 24 * 3600))
+# El progreso se persiste como mucho cada tantos segundos; etapas y estados, siempre
+JOBS_PERSIST_INTERVAL = float(os.getenv('JOBS_PERSIST_INTERVAL', 2))
+
+
+class Job:
+    """Trabajo en segundo plano con estado, progreso y tiempos por etapa"""
+
+    def __init__(self, tipo, clave, params=None):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.clave = clave
+        self.params = params or {}
+        self.estado = "pending"
+        self.progreso = {}
+        self.etapas = []
+        self.result = None
+        self.error = None
+        self.creado = time.time()
+        self.iniciado = None
+        self.finalizado = None
+        # Se incrementa con cada cambio de etapa, progreso o estado (para streaming)
+        self.revision = 0
+        self._lock = threading.Lock()
+        # Lo fija JobManager: publica la instantánea para los demás workers
+        self._publicar = None
+        self._publicado = 0
+
+    @property
+    def activo(self):
+        return self.estado in ("pending", "running")
+
+    def etapa(self, nombre):
+        """Cierra la etapa en curso y abre una nueva"""
+        ahora = time.time()
+        with self._lock:
+            if self.etapas and self.etapas[-1]["fin"] is None:
+                self.etapas[-1]["fin"] = ahora
+            self.etapas.append({"nombre": nombre, "inicio": ahora, "fin": None})
+            self.revision += 1
+        self._persistir()
+
+    def actualizar_progreso(self, **contadores):
+        with self._lock:
+            self.progreso.update(contadores)
+            self.revision += 1
+        self._persistir(forzar=False)
+
+    def progress_hook(self, etapa, contadores):
+        """Adaptador para FireProcessor(progress_hook=job.progress_hook)"""
+        if not self.etapas or self.etapas[-1]["nombre"] != etapa:
+            self.etapa(etapa)
+        if contadores:
+            self.actualizar_progreso(**contadores)
+
+    def _iniciar(self):
+        with self._lock:
+            self.estado = "running"
+            self.iniciado = time.time()
+            self.revision += 1
+        self._persistir()
+
+    def _terminar(self, estado, result=None, error=None):
+        """Estado final: resultado, finalizado y etapas cerradas antes de publicar el estado y la revisión"""
+        ahora = time.time()
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.finalizado = ahora
+            if self.etapas and self.etapas[-1]["fin"] is None:
+                self.etapas[-1]["fin"] = ahora
+            self.estado = estado
+            self.revision += 1
+        self._persistir()
+
+    def _persistir(self, forzar=True):
+        if self._publicar is None:
+            return
+        ahora = time.time()
+        if not forzar and ahora - self._publicado < JOBS_PERSIST_INTERVAL:
+            return
+        self._publicado = ahora
+        try:
+            self._publicar(self)
+        except Exception as e:
+            print(f"⚠️ No se pudo persistir el job {self.id}: {e}")
+
+    def to_dict(self, incluir_resultado=True):
+        with self._lock:
+            ahora = time.time()
+            etapas = [
+                {
+                    "nombre": e["nombre"],
+                    "duracion_s": round((e["fin"] or ahora) - e["inicio"], 2),
+                    "en_curso": e["fin"] is None
+                }
+                for e in self.etapas
+            ]
+            # Todo bajo el lock: una instantánea coherente (estado final ⇒ finalizado fijado)
+            data = {
+                "job_id": self.id,
+                "tipo": self.tipo,
+                "estado": self.estado,
+                "params": self.params,
+                "etapa_actual": etapas[-1]["nombre"] if etapas and self.activo else None,
+                "progreso": dict(self.progreso),
+                "etapas": etapas,
+                "creado": self.creado,
+                "iniciado": self.iniciado,
+                "finalizado": self.finalizado,
+                "duracion_s": round((self.finalizado or ahora) - self.iniciado, 2) if self.iniciado else None,
+                "error": self.error
+            }
+            if incluir_resultado and self.estado == "done":
+                data["result"] = self.result
+        return data
+
+
+class JobPersistido:
+    """Job lanzado por otro worker: se lee de cache_store con la misma interfaz de lectura que Job"""
+
+    def __init__(self, store, job_id, valor):
+        self.store = store
+        self.id = job_id
+        self._valor = valor
+
+    def _refrescar(self):
+        entrada = self.store.obtener("job", {"id": self.id})
+        if entrada:
+            self._valor = entrada["valor"]
+
+    @property
+    def revision(self):
+        self._refrescar()
+        return self._valor["revision"]
+
+    @property
+    def estado(self):
+        return self._valor["datos"]["estado"]
+
+    @property
+    def activo(self):
+        return self.estado in ("pending", "running")
+
+    def to_dict(self, incluir_resultado=True):
+        datos = dict(self._valor["datos"])
+        if not incluir_resultado:
+            datos.pop("result", None)
+        return datos
+
+
+class JobManager:
+    """Ejecuta trabajos largos en un pool limitado y deduplica los idénticos pendientes.
+
+    Los trabajos corren en este proceso, pero su estado se publica en cache_store
+    (SQLite compartido): get() encuentra también los de otros workers.
+    """
+
+    def __init__(self, max_workers=None, max_history=100, store=None):
+        self.max_workers = max_workers or int(os.getenv('JOBS_MAX_WORKERS', 2))
+        self.max_history = max_history
+        self.store = store or cache_store
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(tipo, params=None):
+        return f"{tipo}:{json.dumps(params or {}, sort_keys=True, default=str)}"
+
+    def submit(self, tipo, func, params=None):
+        """Encola func(job); devuelve (job, nuevo). Si hay uno idéntico activo, lo reutiliza"""
+        clave = self.clave(tipo, params)
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job.clave == clave and job.activo:
+                    return job, False
+
+            job = Job(tipo, clave, params)
+            job._publicar = self._publicar
+            self._jobs[job.id] = job
+            self._purgar()
+
+        job._persistir()
+        self._executor.submit(self._ejecutar, job, func)
+        return job, True
+
+    def _ejecutar(self, job, func):
+        job._iniciar()
+        try:
+            result = func(job)
+        except Exception as e:
+            print(f"❌ Job {job.tipo} ({job.id}) falló: {e}")
+            traceback.print_exc()
+            job._terminar("failed", error=str(e))
+        else:
+            job._terminar("done", result=result)
+
+    def _publicar(self, job):
+        revision = job.revision
+        self.store.guardar("job", {"revision": revision, "datos": job.to_dict()}, params={"id": job.id}, ttl=JOBS_TTL)
+
+    def _purgar(self):
+        """Descarta los trabajos terminados más antiguos por encima del historial"""
+        terminados = [job_id for job_id, job in self._jobs.items() if not job.activo]
+        while len(self._jobs) > self.max_history and terminados:
+            del self._jobs[terminados.pop(0)]
+
+    def get(self, job_id):
+        """Job de este worker o, si lo lanzó otro, su última instantánea persistida"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        entrada = self.store.obtener("job", {"id": job_id})
+        return JobPersistido(self.store, job_id, entrada["valor"]) if entrada else None
+
+    def activo(self, tipo, params=None):
+        """Trabajo activo (pendiente o en curso) con esa clave, si existe"""
+        clave = self.clave(tipo, params)
+        with self._lock:
+            for job in self._jobs.values():
+                if job.clave == clave and job.activo:
+                    return job
+        return None
+
+    def listar(self, limite=20):
+        """Trabajos recientes de este worker"""
+        with self._lock:
+            jobs = list(self._jobs.values())[-limite:]
+        return [job.to_dict(incluir_resultado=False) for job in reversed(jobs)]
+
+
+async def eventos_job(job, intervalo=0.5, heartbeat=15):
+    """Server-Sent Events del job: 'progreso' en cada cambio y 'fin' al terminar.
+
+    Consulta la revisión del job (en memoria, o en cache_store si lo lanzó otro worker)
+    en vez de que el cliente sondee /jobs/{id}; envía un comentario cada `heartbeat` s
+    para mantener viva la conexión.
+    """
+    revision = -1
+    ultimo_envio = time.time()
+    while True:
+        if job.revision != revision:
+            revision = job.revision
+            # El evento sale de la misma instantánea que los datos (el resultado solo va en "fin")
+            datos = job.to_dict()
+            evento = "fin" if datos["estado"] in ("done", "failed") else "progreso"
+            datos = json.dumps(datos, default=str)
+            yield f"id: {revision}\nevent: {evento}\ndata: {datos}\n\n"
+            ultimo_envio = time.time()
+            if evento == "fin":
+                return
+        elif time.time() - ultimo_envio > heartbeat:
+            yield ": keepalive\n\n"
+            ultimo_envio = time.time()
+        await asyncio.sleep(intervalo)
+
+
+job_manager = JobManager()
@@ -1,11 +1,72 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 import ee
 import os
 import json
+import asyncio
+from cache_store import cache_store, LRUCache
+from jobs import job_manager, eventos_job
+from scheduler import scheduler_instance
+from singleflight import SingleFlight
+from tile_cache import TileCache
+from raster_cache import RasterCache, CAPAS_RASTER
+from muestreo import Muestreador
+from series import SeriesTemporales, SERIES
+from parametros import normalizar_parametros, geometria_dpa, REGION_PAIS
+from regiones import REGIONES, obtener_region
+from respuestas import respuesta_json
+from zonal_stats import EstadisticasZonales, ETIQUETAS_CLASES, NIVELES_DPA
+from metricas import MiddlewareMetricas, instrumentar_ee, edad_caches, caches_lru, consultas_cache, respuesta_metricas
+import numpy as np
 
 app = FastAPI()
 
+# Los mapid/token de Earth Engine caducan: vida útil y margen de refresco (segundos)
+EE_MAP_TTL = int(os.getenv('EE_MAP_TTL', 4 * 3600))
+EE_MAP_REFRESH_MARGIN = int(os.getenv('EE_MAP_REFRESH_MARGIN', 30 * 60))
+
+# Stale-while-revalidate de /sequedad-cache (segundos)
+SEQUEDAD_MAX_AGE = int(os.getenv('SEQUEDAD_MAX_AGE', 3 * 3600))
+SEQUEDAD_STALE_WINDOW = int(os.getenv('SEQUEDAD_STALE_WINDOW', 24 * 3600))
+SEQUEDAD_RETRY_AFTER = int(os.getenv('SEQUEDAD_RETRY_AFTER', 5 * 60))
+
+# Coalescencia de peticiones idénticas a Earth Engine
+single_flight = SingleFlight(ttl=int(os.getenv('SINGLEFLIGHT_TTL', 30)))
+
+# Proxy de tiles: caché del navegador y presembrado de zooms bajos sobre Ecuador
+TILE_MAX_AGE = int(os.getenv('TILE_MAX_AGE', 3600))
+TILE_PRESEED_MIN_ZOOM = int(os.getenv('TILE_PRESEED_MIN_ZOOM', 5))
+TILE_PRESEED_MAX_ZOOM = int(os.getenv('TILE_PRESEED_MAX_ZOOM', 0))
+ECUADOR_BBOX = obtener_region(REGION_PAIS)["bbox"]
+tile_cache = TileCache()
+
+# Capas materializadas como COG locales (independientes de EE para servir tiles)
+RASTER_MATERIALIZAR = os.getenv('RASTER_MATERIALIZAR', '1') == '1'
+RASTER_ESCALA = int(os.getenv('RASTER_ESCALA', 1000))
+raster_cache = RasterCache()
+estadisticas_zonales = EstadisticasZonales()
+
+# Muestreo masivo en puntos (POST /sample)
+SAMPLE_MAX_POINTS = int(os.getenv('SAMPLE_MAX_POINTS', 50000))
+muestreador = Muestreador(raster_cache)
+
+# Series temporales por punto (/series)
+SERIES_MAX_DIAS = int(os.getenv('SERIES_MAX_DIAS', 3660))
+series_temporales = SeriesTemporales()
+
+# Parámetros por defecto (capas cacheadas) y cache de resultados por parámetros
+NDVI_PARAMS_DEFECTO = normalizar_parametros('2024-01-01', '2024-12-31')
+ISC_PARAMS_DEFECTO = normalizar_parametros('2024-01-01', '2025-12-31')
+resultados_cache = LRUCache(
+    maxsize=int(os.getenv('RESULT_CACHE_SIZE', 128)),
+    ttl=max(EE_MAP_TTL - EE_MAP_REFRESH_MARGIN, 60)
+)
+geometrias_dpa = LRUCache(maxsize=256)
+
+# Lease entre workers para los procesamientos largos (se renueva mientras corre)
+PROCESSING_LEASE_TTL = int(os.getenv('PROCESSING_LEASE_TTL', 10 * 60))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -14,11 +75,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas de Prometheus (/metrics): latencia por ruta y llamadas a Earth Engine
+app.add_middleware(MiddlewareMetricas)
+instrumentar_ee(ee)
+caches_lru(lambda: {
+    "resultados": resultados_cache,
+    "geometrias_dpa": geometrias_dpa,
+    "muestreo": muestreador.cache,
+    "series": series_temporales.cache
+})
+
+# Estado de la inicialización de Earth Engine (corre en segundo plano al arrancar)
+ee_estado = {"listo": False, "error": None, "duracion_s": None}
+
 def init_ee():
     """Inicializar Earth Engine"""
     try:
         creds = os.getenv('GOOGLE_CREDENTIALS')
         if not creds:
+            ee_estado["error"] = "GOOGLE_CREDENTIALS no configurado"
             return False
             
         creds_dict = json.loads(creds)
@@ -27,20 +102,49 @@ def init_ee():
             key_data=creds
         )
         ee.Initialize(credentials)
+        ee_estado["listo"] = True
+        ee_estado["error"] = None
         return True
     except Exception as e:
+        ee_estado["error"] = str(e)
         print(f"Error inicializando EE: {e}")
         return False
 
+async def inicializar_ee_en_segundo_plano():
+    inicio = time.time()
+    success = await asyncio.to_thread(init_ee)
+    ee_estado["duracion_s"] = round(time.time() - inicio, 2)
+    print(f"EE Initialization: {'Success' if success else 'Failed'} ({ee_estado['duracion_s']} s)")
+
 @app.on_event("startup")
 async def startup_event():
-    success = init_ee()
-    print(f"EE Initialization: {'Success' if success else 'Failed'}")
+    # El worker atiende (cache, /ready) mientras EE se inicializa en segundo plano
+    asyncio.create_task(inicializar_ee_en_segundo_plano())
+    cargar_cache_desde_disco()
+    asyncio.create_task(refrescar_tokens_periodicamente())
+
+    # Recálculo programado del ISC (ISC_CRON vacío = solo bajo demanda)
+    if scheduler_instance.registrar(
+        "sequedad",
+        os.getenv('ISC_CRON', ''),
+        ejecutar_sequedad,
+        politica=os.getenv('ISC_OVERLAP_POLICY', 'skip')
+    ):
+        scheduler_instance.start_in_background()
 
 @app.get("/")
 async def root():
     return {"message": "API NDVI Ecuador", "status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 cuando Earth Engine está inicializado, 503 mientras tanto"""
+    return JSONResponse(status_code=200 if ee_estado["listo"] else 503, content={
+        "ready": ee_estado["listo"],
+        "ee": ee_estado,
+        "cache_available": bool(cache_data["sequedad"])
+    })
+
 @app.get("/test-ee")
 async def test_ee():
     """Test básico de Earth Engine"""
@@ -51,68 +155,134 @@ async def test_ee():
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def region_ee(params):
+    """FeatureCollection de la región pedida: región registrada (GAUL o su bbox), código DPA o bbox"""
+    if params["bbox"]:
+        return ee.FeatureCollection([ee.Feature(ee.Geometry.Rectangle(params["bbox"]))])
+
+    if params["region"] not in REGIONES:
+        geometria = geometrias_dpa.get(params["region"])
+        if geometria is None:
+            geometria = geometria_dpa(estadisticas_zonales.parroquias(), params["region"])
+            geometrias_dpa.set(params["region"], geometria)
+        return ee.FeatureCollection([ee.Feature(ee.Geometry(geometria))])
+
+    # Usar límite administrativo exacto del país (más preciso que rectángulo)
+    config = obtener_region(params["region"])
+    if not config["adm0"]:
+        return ee.FeatureCollection([ee.Feature(ee.Geometry.Rectangle(config["bbox"]))])
+    return ee.FeatureCollection("FAO/GAUL/2015/level0").filter(ee.Filter.eq("ADM0_NAME", config["adm0"]))
+
+def construir_imagen_ndvi(params=NDVI_PARAMS_DEFECTO):
+    """Grafo EE del NDVI más reciente recortado a la región"""
+    ecuador = region_ee(params).geometry()
+    
+    # Obtener NDVI más reciente de MODIS
+    ndvi_collection = ee.ImageCollection('MODIS/061/MOD13A2') \
+        .select('NDVI') \
+        .filterBounds(ecuador) \
+        .filterDate(params["desde"], params["hasta"]) \
+        .sort('system:time_start', False)
+    
+    # Tomar la imagen más reciente
+    ndvi_latest = ndvi_collection.first().multiply(0.0001)
+    
+    # Recortar EXACTAMENTE a los límites de Ecuador
+    ndvi_ecuador = ndvi_latest.clip(ecuador)
+    
+    # Aplicar máscara para mostrar solo Ecuador
+    ndvi_masked = ndvi_ecuador.updateMask(ndvi_ecuador.gte(-1))
+    
+    return ndvi_masked
+
+def calcular_ndvi(params=NDVI_PARAMS_DEFECTO):
+    """Genera la capa NDVI de la región y devuelve sus datos de tiles"""
+    ndvi_masked = construir_imagen_ndvi(params)
+    
+    # Generar visualización mejorada
+    vis_params = {
+        'min': 0,
+        'max': 1,
+        'palette': [
+            '#8B0000',  # Rojo oscuro (sin vegetación)
+            '#CD5C5C',  # Rojo claro
+            '#F0E68C',  # Amarillo (vegetación baja)
+            '#9ACD32',  # Verde amarillento
+            '#32CD32',  # Verde lima
+            '#228B22',  # Verde bosque
+            '#006400'   # Verde oscuro (vegetación densa)
+        ]
+    }
+    
+    # Obtener URL de tiles
+    map_id = ndvi_masked.getMapId(vis_params)
+    
+    return {
+        "tile_url": map_id['tile_fetcher'].url_format,
+        "mapid": map_id['mapid'],
+        "token": map_id['token'],
+        "message": "NDVI recortado exactamente para Ecuador",
+        "date_range": f"{params['desde']} a {params['hasta']}",
+        "region": params["region"],
+        "bbox": params["bbox"],
+        "description": "NDVI más reciente de MODIS recortado con límites administrativos de Ecuador",
+        "boundary_source": "FAO GAUL 2015"
+    }
+
+async def resultado_por_parametros(endpoint, funcion, params):
+    """Cache LRU+TTL por parámetros normalizados; peticiones iguales comparten un cálculo"""
+    clave = SingleFlight.clave(endpoint, params)
+    resultado = resultados_cache.get(clave)
+    if resultado is not None:
+        return {"from_cache": True, **resultado}
+
+    resultado = await single_flight.do(clave, funcion, params)
+    resultados_cache.set(clave, resultado)
+    return resultado
+
 @app.get("/ndvi")
-async def get_ndvi():
-    """Obtener capa NDVI de Ecuador (recortado exacto)"""
+async def get_ndvi(request: Request, desde: str = None, hasta: str = None, region: str = None, bbox: str = None):
+    """Obtener capa NDVI de Ecuador (recortado exacto) o de una región/ventana de fechas"""
     try:
-        # Usar límite administrativo exacto de Ecuador (más preciso que rectángulo)
-        ecuador = ee.FeatureCollection("FAO/GAUL/2015/level0") \
-            .filter(ee.Filter.eq("ADM0_NAME", "Ecuador")) \
-            .geometry()
-        
-        # Obtener NDVI más reciente de MODIS
-        ndvi_collection = ee.ImageCollection('MODIS/061/MOD13A2') \
-            .select('NDVI') \
-            .filterBounds(ecuador) \
-            .filterDate('2024-01-01', '2024-12-31') \
-            .sort('system:time_start', False)
-        
-        # Tomar la imagen más reciente
-        ndvi_latest = ndvi_collection.first().multiply(0.0001)
-        
-        # Recortar EXACTAMENTE a los límites de Ecuador
-        ndvi_ecuador = ndvi_latest.clip(ecuador)
-        
-        # Aplicar máscara para mostrar solo Ecuador
-        ndvi_masked = ndvi_ecuador.updateMask(ndvi_ecuador.gte(-1))
-        
-        # Generar visualización mejorada
-        vis_params = {
-            'min': 0,
-            'max': 1,
-            'palette': [
-                '#8B0000',  # Rojo oscuro (sin vegetación)
-                '#CD5C5C',  # Rojo claro
-                '#F0E68C',  # Amarillo (vegetación baja)
-                '#9ACD32',  # Verde amarillento
-                '#32CD32',  # Verde lima
-                '#228B22',  # Verde bosque
-                '#006400'   # Verde oscuro (vegetación densa)
-            ]
-        }
-        
-        # Obtener URL de tiles
-        map_id = ndvi_masked.getMapId(vis_params)
-        
-        return {
-            "success": True,
-            "tile_url": map_id['tile_fetcher'].url_format,
-            "mapid": map_id['mapid'],
-            "token": map_id['token'],
-            "message": "NDVI recortado exactamente para Ecuador",
-            "date_range": "2024-01-01 a 2024-12-31",
-            "description": "NDVI más reciente de MODIS recortado con límites administrativos de Ecuador",
-            "boundary_source": "FAO GAUL 2015"
-        }
+        params = normalizar_parametros(
+            desde or NDVI_PARAMS_DEFECTO["desde"], hasta or NDVI_PARAMS_DEFECTO["hasta"], region, bbox
+        )
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+
+    try:
+        if params != NDVI_PARAMS_DEFECTO:
+            return {"success": True, **await resultado_por_parametros("/ndvi", calcular_ndvi, params)}
+
+        # Reutilizar el mapid persistido mientras su token siga vigente
+        entrada = cache_store.obtener("ndvi")
+        if entrada:
+            return respuesta_json(
+                request, {"success": True, "from_cache": True, **entrada["valor"]},
+                version=("ndvi", entrada["timestamp"]), modificado=entrada["timestamp"]
+            )
+
+        result_data = await single_flight.do(SingleFlight.clave("/ndvi"), calcular_ndvi)
+        entrada = cache_store.guardar("ndvi", result_data, ttl=EE_MAP_TTL)
+
+        return respuesta_json(
+            request, {"success": True, **result_data},
+            version=("ndvi", entrada["timestamp"]), modificado=entrada["timestamp"]
+        )
         
     except Exception as e:
         # Si falla, intentar reinicializar
         if "not initialized" in str(e).lower():
             if init_ee():
-                return await get_ndvi()  # Reintentar
+                return await get_ndvi(request, desde, hasta, region, bbox)  # Reintentar
         
         return {"success": False, "error": str(e)}
 
+@app.get("/singleflight-stats")
+async def singleflight_stats():
+    """Contadores de aciertos, fallos y peticiones agrupadas"""
+    return single_flight.estado()
+
 @app.get("/ndvi-info")
 async def get_ndvi_info():
     """Información sobre el dataset NDVI"""
@@ -146,233 +316,417 @@ async def get_ndvi_info():
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-@app.get("/indice-sequedad")
-async def get_indice_sequedad():
-    """Índice de Sequedad Combinado (ISC) - Tu algoritmo completo"""
-    try:
-        # ROI de Ecuador usando límites administrativos
-        roi = ee.FeatureCollection("FAO/GAUL/2015/level0").filter(ee.Filter.eq("ADM0_NAME","Ecuador"))
-
-        # Fechas
-        fechaInicio = '2024-01-01'
-        fechaFin = '2025-12-31'
-        fecha = fechaFin
-
-        # Máscara de recorte
-        mascaracut = ee.Image(1).clip(roi)
-
-        def cortarcoleccion(imagen):
-            mascara = mascaracut.mask()
-            return imagen.updateMask(mascara)
-
-        # 1. PRECIPITACIÓN GPM
-        gpmColeccion = ee.ImageCollection('NASA/GPM_L3/IMERG_V06') \
-            .select('precipitationCal') \
-            .filterBounds(roi) \
-            .filterDate(fechaInicio, fechaFin) \
-            .sort('system:time_end', False) \
-            .limit(48) \
-            .map(cortarcoleccion)
-
-        # Duración de precipitación
-        umbral = 0.1
-        conprecipitacion = gpmColeccion.map(lambda image: image.gt(umbral))
-        duracionPrecipitacion = gpmColeccion.sum().divide(2).rename('duracion')
-
-        # 2. TEMPERATURA ERA5
-        templast = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR') \
-            .select('temperature_2m') \
-            .filterBounds(roi) \
-            .map(cortarcoleccion) \
-            .filterDate(fechaInicio, fechaFin) \
-            .sort('system:time_end', False) \
-            .first()
-
-        # 3. PUNTO DE ROCÍO
-        dewpoint = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR') \
-            .select('dewpoint_temperature_2m') \
-            .filterBounds(roi) \
-            .map(cortarcoleccion) \
-            .filterDate(fechaInicio, fechaFin) \
-            .sort('system:time_end', False) \
-            .first()
-
-        # 4. CÁLCULO HUMEDAD RELATIVA
-        temperaK = templast.subtract(273.15)
-        dewpointK = dewpoint.subtract(273.15)
-        pvse = dewpointK.multiply(17.27).divide(dewpointK.add(237.3)).exp().multiply(6.1078)
-        pvses = temperaK.multiply(17.27).divide(temperaK.add(237.3)).exp().multiply(6.1078)
-        relativehumidity = pvse.divide(pvses).multiply(100).rename('relahumi')
-
-        datos = relativehumidity.addBands(templast).clip(roi)
-
-        # 5. NDVI MODIS
-        coleccionNDVI = ee.ImageCollection("MODIS/061/MOD13A2") \
-            .select('NDVI') \
-            .filterDate(fechaInicio, fechaFin) \
-            .filterBounds(roi) \
-            .map(cortarcoleccion)
+def calcular_indice_sequedad(params=ISC_PARAMS_DEFECTO):
+    """Índice de Sequedad Combinado (ISC) con MR dinámico; devuelve los datos de tiles"""
+    # ROI: límites administrativos de Ecuador, unidad DPA o bbox
+    roi = region_ee(params)
+
+    # Fechas
+    fechaInicio = params["desde"]
+    fechaFin = params["hasta"]
+    fecha = fechaFin
+
+    # Máscara de recorte
+    mascaracut = ee.Image(1).clip(roi)
+
+    def cortarcoleccion(imagen):
+        mascara = mascaracut.mask()
+        return imagen.updateMask(mascara)
+
+    # 1. PRECIPITACIÓN GPM
+    gpmColeccion = ee.ImageCollection('NASA/GPM_L3/IMERG_V06') \
+        .select('precipitationCal') \
+        .filterBounds(roi) \
+        .filterDate(fechaInicio, fechaFin) \
+        .sort('system:time_end', False) \
+        .limit(48) \
+        .map(cortarcoleccion)
+
+    # Duración de precipitación
+    umbral = 0.1
+    conprecipitacion = gpmColeccion.map(lambda image: image.gt(umbral))
+    duracionPrecipitacion = gpmColeccion.sum().divide(2).rename('duracion')
+
+    # 2. TEMPERATURA ERA5
+    templast = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR') \
+        .select('temperature_2m') \
+        .filterBounds(roi) \
+        .map(cortarcoleccion) \
+        .filterDate(fechaInicio, fechaFin) \
+        .sort('system:time_end', False) \
+        .first()
+
+    # 3. PUNTO DE ROCÍO
+    dewpoint = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR') \
+        .select('dewpoint_temperature_2m') \
+        .filterBounds(roi) \
+        .map(cortarcoleccion) \
+        .filterDate(fechaInicio, fechaFin) \
+        .sort('system:time_end', False) \
+        .first()
+
+    # 4. CÁLCULO HUMEDAD RELATIVA
+    temperaK = templast.subtract(273.15)
+    dewpointK = dewpoint.subtract(273.15)
+    pvse = dewpointK.multiply(17.27).divide(dewpointK.add(237.3)).exp().multiply(6.1078)
+    pvses = temperaK.multiply(17.27).divide(temperaK.add(237.3)).exp().multiply(6.1078)
+    relativehumidity = pvse.divide(pvses).multiply(100).rename('relahumi')
+
+    datos = relativehumidity.addBands(templast).clip(roi)
+
+    # 5. NDVI MODIS
+    coleccionNDVI = ee.ImageCollection("MODIS/061/MOD13A2") \
+        .select('NDVI') \
+        .filterDate(fechaInicio, fechaFin) \
+        .filterBounds(roi) \
+        .map(cortarcoleccion)
+
+    ndvilast = coleccionNDVI.sort('system:time_end', False).first().multiply(0.0001)
+
+    # 6. NDVI MIN/MAX - Usar datos históricos públicos en lugar de assets privados
+    # Calcular min/max de la colección histórica
+    ndviHistorico = ee.ImageCollection("MODIS/061/MOD13A2") \
+        .select('NDVI') \
+        .filterDate('2020-01-01', '2024-12-31') \
+        .filterBounds(roi) \
+        .map(cortarcoleccion)
+
+    ndviStats = ndviHistorico.reduce(ee.Reducer.minMax())
+    minNDVI = ndviStats.select('NDVI_min').multiply(0.0001)
+    maxNDVI = ndviStats.select('NDVI_max').multiply(0.0001)
+
+    # 7. EMC (Equilibrium Moisture Content)
+    EMC = datos.expression(
+        "(b('relahumi') < 10) ? 0.032229+0.281073*b('relahumi')-0.000578*b('relahumi')*b('temperature_2m')" +
+        ": (b('relahumi') < 50) ? 2.22749+0.160107*b('relahumi')-0.014784*b('temperature_2m')" +
+        ": 21.0606+0.005565*(b('relahumi')**2)-0.00035*b('relahumi')*b('temperature_2m')-0.483199*b('relahumi')"
+    ).rename('EMC')
+
+    # 8. H100
+    h100inputs = EMC.addBands(duracionPrecipitacion).clip(roi)
+    h100 = h100inputs.expression(
+        "(24 - b('duracion')) * b('EMC') + b('duracion') * (0.5 * b('duracion') + 41)"
+    ).divide(24).rename('H100')
+
+    # 9. LRmax
+    imagenLRmax = maxNDVI.expression(
+        '0.30 + 0.30 * ((NDVImax + 0.19) / (0.95 + 0.19))', {
+            'NDVImax': maxNDVI
+        }
+    ).rename('LRmax')
+
+    # 10. RG (Relative Greenness)
+    imagenRG = ndvilast.expression(
+        '((NDVI - NDVImin) / (NDVImax - NDVImin)) * 100', {
+            'NDVI': ndvilast.select('NDVI'),
+            'NDVImin': minNDVI,
+            'NDVImax': maxNDVI
+        }
+    ).rename('RG')
 
-        ndvilast = coleccionNDVI.sort('system:time_end', False).first().multiply(0.0001)
+    # 11. LR (Live Fuel Moisture)
+    imagenLR = imagenRG.expression(
+        'RG * LRmax / 100', {
+            'RG': imagenRG,
+            'LRmax': imagenLRmax
+        }
+    ).rename('LR')
+
+    # 12. MR - Usar estadísticas de H100 en lugar de assets privados
+    h100Stats = h100.reduceRegion(
+        reducer=ee.Reducer.minMax(),
+        geometry=roi,
+        scale=1000,
+        maxPixels=1e9
+    )
+    
+    # Valores aproximados para Ecuador (puedes ajustar)
+    H100min = ee.Image.constant(h100Stats.getNumber('H100_min').getInfo() if h100Stats.getNumber('H100_min').getInfo() else 10)
+    H100max = ee.Image.constant(h100Stats.getNumber('H100_max').getInfo() if h100Stats.getNumber('H100_max').getInfo() else 50)
+
+    imagenMR = h100.expression(
+        '((H100 - H100min) / (H100max - H100min))', {
+            'H100': h100,
+            'H100min': H100min,
+            'H100max': H100max
+        }
+    ).rename('MR')
 
-        # 6. NDVI MIN/MAX - Usar datos históricos públicos en lugar de assets privados
-        # Calcular min/max de la colección histórica
-        ndviHistorico = ee.ImageCollection("MODIS/061/MOD13A2") \
-            .select('NDVI') \
-            .filterDate('2020-01-01', '2024-12-31') \
-            .filterBounds(roi) \
-            .map(cortarcoleccion)
-
-        ndviStats = ndviHistorico.reduce(ee.Reducer.minMax())
-        minNDVI = ndviStats.select('NDVI_min').multiply(0.0001)
-        maxNDVI = ndviStats.select('NDVI_max').multiply(0.0001)
-
-        # 7. EMC (Equilibrium Moisture Content)
-        EMC = datos.expression(
-            "(b('relahumi') < 10) ? 0.032229+0.281073*b('relahumi')-0.000578*b('relahumi')*b('temperature_2m')" +
-            ": (b('relahumi') < 50) ? 2.22749+0.160107*b('relahumi')-0.014784*b('temperature_2m')" +
-            ": 21.0606+0.005565*(b('relahumi')**2)-0.00035*b('relahumi')*b('temperature_2m')-0.483199*b('relahumi')"
-        ).rename('EMC')
-
-        # 8. H100
-        h100inputs = EMC.addBands(duracionPrecipitacion).clip(roi)
-        h100 = h100inputs.expression(
-            "(24 - b('duracion')) * b('EMC') + b('duracion') * (0.5 * b('duracion') + 41)"
-        ).divide(24).rename('H100')
-
-        # 9. LRmax
-        imagenLRmax = maxNDVI.expression(
-            '0.30 + 0.30 * ((NDVImax + 0.19) / (0.95 + 0.19))', {
-                'NDVImax': maxNDVI
-            }
-        ).rename('LRmax')
-
-        # 10. RG (Relative Greenness)
-        imagenRG = ndvilast.expression(
-            '((NDVI - NDVImin) / (NDVImax - NDVImin)) * 100', {
-                'NDVI': ndvilast.select('NDVI'),
-                'NDVImin': minNDVI,
-                'NDVImax': maxNDVI
-            }
-        ).rename('RG')
+    # 13. FDI (Fire Danger Index)
+    imagenFDIsc = imagenLR.expression(
+        '((1 - LR) * (1 - MR)) * 100', {
+            'LR': imagenLR,
+            'MR': imagenMR
+        }
+    ).rename('FDI')
+
+    # 14. CLASIFICACIÓN FINAL
+    imagenFDI = ee.Image(0) \
+        .where(imagenFDIsc.lt(50), 1) \
+        .where(imagenFDIsc.gte(50).And(imagenFDIsc.lt(60)), 2) \
+        .where(imagenFDIsc.gte(60).And(imagenFDIsc.lt(70)), 3) \
+        .where(imagenFDIsc.gte(70).And(imagenFDIsc.lt(80)), 4) \
+        .where(imagenFDIsc.gte(80).And(imagenFDIsc.lt(91)), 5) \
+        .where(imagenFDIsc.gte(91), 6).clip(roi)
+
+    # Paleta de colores (tu simbología original)
+    Simbologia = ['267E00','56E200','FFFC00','FE7400','FF0000','9E00FF']
+    
+    # Etiquetas originales
+    Etiquetas = [
+        'Muy baja (<50)',
+        'Baja (50-60)',
+        'Media (60-70)',
+        'Alta (70-80)',
+        'Muy alta (80-91)',
+        'Extrema (>91)'
+    ]
+
+    # Parámetros de visualización
+    imagenFDIVis = {'min': 1, 'max': 6, 'palette': Simbologia, 'opacity': 0.70}
+
+    # Generar tiles
+    map_id = imagenFDI.getMapId(imagenFDIVis)
+
+    return {
+        "tile_url": map_id['tile_fetcher'].url_format,
+        "mapid": map_id['mapid'],
+        "token": map_id['token'],
+        "message": "Índice de Sequedad Combinado (ISC) generado exitosamente",
+        "algorithm": "Tu algoritmo original completo",
+        "date_range": f"{fechaInicio} a {fechaFin}",
+        "region": params["region"],
+        "bbox": params["bbox"],
+        "legend": {
+            "title": "Nivel de Sequedad",
+            "labels": Etiquetas,
+            "colors": Simbologia
+        },
+        "data_sources": {
+            "precipitation": "NASA GPM_L3/IMERG_V06",
+            "temperature": "ECMWF ERA5_LAND/DAILY_AGGR",
+            "ndvi": "MODIS/061/MOD13A2",
+            "boundaries": "FAO/GAUL/2015/level0"
+        }
+    }
 
-        # 11. LR (Live Fuel Moisture)
-        imagenLR = imagenRG.expression(
-            'RG * LRmax / 100', {
-                'RG': imagenRG,
-                'LRmax': imagenLRmax
-            }
-        ).rename('LR')
-
-        # 12. MR - Usar estadísticas de H100 en lugar de assets privados
-        h100Stats = h100.reduceRegion(
-            reducer=ee.Reducer.minMax(),
-            geometry=roi,
-            scale=1000,
-            maxPixels=1e9
+@app.get("/indice-sequedad")
+async def get_indice_sequedad(desde: str = None, hasta: str = None, region: str = None, bbox: str = None):
+    """Índice de Sequedad Combinado (ISC) - Tu algoritmo completo"""
+    try:
+        params = normalizar_parametros(
+            desde or ISC_PARAMS_DEFECTO["desde"], hasta or ISC_PARAMS_DEFECTO["hasta"], region, bbox
         )
-        
-        # Valores aproximados para Ecuador (puedes ajustar)
-        H100min = ee.Image.constant(h100Stats.getNumber('H100_min').getInfo() if h100Stats.getNumber('H100_min').getInfo() else 10)
-        H100max = ee.Image.constant(h100Stats.getNumber('H100_max').getInfo() if h100Stats.getNumber('H100_max').getInfo() else 50)
-
-        imagenMR = h100.expression(
-            '((H100 - H100min) / (H100max - H100min))', {
-                'H100': h100,
-                'H100min': H100min,
-                'H100max': H100max
-            }
-        ).rename('MR')
-
-        # 13. FDI (Fire Danger Index)
-        imagenFDIsc = imagenLR.expression(
-            '((1 - LR) * (1 - MR)) * 100', {
-                'LR': imagenLR,
-                'MR': imagenMR
-            }
-        ).rename('FDI')
-
-        # 14. CLASIFICACIÓN FINAL
-        imagenFDI = ee.Image(0) \
-            .where(imagenFDIsc.lt(50), 1) \
-            .where(imagenFDIsc.gte(50).And(imagenFDIsc.lt(60)), 2) \
-            .where(imagenFDIsc.gte(60).And(imagenFDIsc.lt(70)), 3) \
-            .where(imagenFDIsc.gte(70).And(imagenFDIsc.lt(80)), 4) \
-            .where(imagenFDIsc.gte(80).And(imagenFDIsc.lt(91)), 5) \
-            .where(imagenFDIsc.gte(91), 6).clip(roi)
-
-        # Paleta de colores (tu simbología original)
-        Simbologia = ['267E00','56E200','FFFC00','FE7400','FF0000','9E00FF']
-        
-        # Etiquetas originales
-        Etiquetas = [
-            'Muy baja (<50)',
-            'Baja (50-60)',
-            'Media (60-70)',
-            'Alta (70-80)',
-            'Muy alta (80-91)',
-            'Extrema (>91)'
-        ]
-
-        # Parámetros de visualización
-        imagenFDIVis = {'min': 1, 'max': 6, 'palette': Simbologia, 'opacity': 0.70}
-
-        # Generar tiles
-        map_id = imagenFDI.getMapId(imagenFDIVis)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
 
-        return {
-            "success": True,
-            "tile_url": map_id['tile_fetcher'].url_format,
-            "mapid": map_id['mapid'],
-            "token": map_id['token'],
-            "message": "Índice de Sequedad Combinado (ISC) generado exitosamente",
-            "algorithm": "Tu algoritmo original completo",
-            "date_range": f"{fechaInicio} a {fechaFin}",
-            "legend": {
-                "title": "Nivel de Sequedad",
-                "labels": Etiquetas,
-                "colors": Simbologia
-            },
-            "data_sources": {
-                "precipitation": "NASA GPM_L3/IMERG_V06",
-                "temperature": "ECMWF ERA5_LAND/DAILY_AGGR",
-                "ndvi": "MODIS/061/MOD13A2",
-                "boundaries": "FAO/GAUL/2015/level0"
-            }
-        }
+    try:
+        # Peticiones simultáneas comparten un único cálculo en Earth Engine
+        result_data = await resultado_por_parametros("/indice-sequedad", calcular_indice_sequedad, params)
+        return {"success": True, **result_data}
 
     except Exception as e:
         if "not initialized" in str(e).lower():
             if init_ee():
-                return await get_indice_sequedad()
+                return await get_indice_sequedad(desde, hasta, region, bbox)
         
         return {"success": False, "error": str(e), "message": "Error procesando índice de sequedad"}
 
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Variable global para cache
 cache_data = {
     "sequedad": None,
     "timestamp": None,
-    "processing": False
+    "processing": False,
+    "last_error": None,
+    "last_attempt": None
 }
 
+def guardar_sequedad(result_data):
+    """Actualiza el cache en memoria y lo persiste en disco"""
+    entrada = cache_store.guardar("sequedad", result_data, ttl=EE_MAP_TTL)
+    cache_data["sequedad"] = result_data
+    cache_data["timestamp"] = entrada["timestamp"]
+
+def cargar_cache_desde_disco():
+    """Precarga los caches en memoria desde el almacenamiento persistente.
+
+    Incluye las entradas expiradas: tras una caída larga se sirven como stale
+    (stale-while-revalidate) mientras el refresco de tokens las regenera.
+    """
+    sequedad = cache_store.obtener("sequedad", incluir_expirados=True)
+    if sequedad:
+        cache_data["sequedad"] = sequedad["valor"]
+        cache_data["timestamp"] = sequedad["timestamp"]
+        print("♻️ Cache de sequedad restaurado desde disco")
+
+    incendios = cache_store.obtener("incendios", incluir_expirados=True)
+    if incendios:
+        fire_cache["data"] = incendios["valor"]
+        fire_cache["timestamp"] = incendios["timestamp"]
+        print("♻️ Cache de incendios restaurado desde disco")
+
+def ejecutar_sequedad(job):
+    """Trabajo: recalcula la capa de sequedad sin desalojar el cache vigente"""
+    with cache_store.lease("sequedad", ttl=PROCESSING_LEASE_TTL) as adquirido:
+        if not adquirido:
+            # Otro worker ya está calculando; su resultado llegará por el cache compartido
+            return {"skipped": True, "message": "Otro worker ya está procesando la sequedad"}
+
+        cache_data["processing"] = True
+        cache_data["last_attempt"] = time.time()
+
+        try:
+            job.etapa("calculo_isc")
+            result_data = calcular_sequedad()
+            job.etapa("guardar_cache")
+            guardar_sequedad(result_data)
+            cache_data["last_error"] = None
+
+            if TILE_PRESEED_MAX_ZOOM:
+                job.etapa("presembrado_tiles")
+                presembrar_tiles("sequedad", result_data)
+
+            if RASTER_MATERIALIZAR:
+                job.etapa("materializar_cog")
+                materializar_capa("sequedad", construir_imagen_sequedad())
+
+            job.etapa("zonas")
+            try:
+                calcular_zonas()
+            except Exception as e:
+                print(f"Error calculando estadísticas zonales: {e}")
+            return result_data
+        except Exception as e:
+            # Un refresco fallido conserva la entrada anterior
+            cache_data["last_error"] = str(e)
+            raise
+        finally:
+            cache_data["processing"] = False
+
+# Último intento de refresco del NDVI (limita los reintentos como cache_data para la sequedad)
+ndvi_estado = {"last_attempt": None, "last_error": None}
+
+def ejecutar_ndvi(job):
+    """Trabajo: regenera la capa NDVI y su token"""
+    with cache_store.lease("ndvi", ttl=PROCESSING_LEASE_TTL) as adquirido:
+        if not adquirido:
+            return {"skipped": True, "message": "Otro worker ya está procesando el NDVI"}
+
+        ndvi_estado["last_attempt"] = time.time()
+        job.etapa("calculo_ndvi")
+        try:
+            result_data = calcular_ndvi()
+        except Exception as e:
+            ndvi_estado["last_error"] = str(e)
+            raise
+        ndvi_estado["last_error"] = None
+        cache_store.guardar("ndvi", result_data, ttl=EE_MAP_TTL)
+
+        if RASTER_MATERIALIZAR:
+            job.etapa("materializar_cog")
+            materializar_capa("ndvi", construir_imagen_ndvi())
+        return result_data
+
+def materializar_capa(capa, imagen):
+    """Guarda la capa como COG local; un fallo no invalida la capa de EE ya cacheada"""
+    try:
+        raster_cache.materializar_desde_ee(capa, imagen, ECUADOR_BBOX, RASTER_ESCALA)
+    except Exception as e:
+        print(f"Error materializando COG de {capa}: {e}")
+
+def calcular_zonas():
+    """Histograma de clases por parroquia para la versión vigente de la capa; devuelve la versión"""
+    if raster_cache.disponible("sequedad"):
+        version = f"cog:{raster_cache.version('sequedad')}"
+    else:
+        cache_store.sincronizar(cache_data, "sequedad", "sequedad")
+        if not cache_data["sequedad"]:
+            raise RuntimeError("No hay capa de sequedad. Ejecuta /actualizar-sequedad primero")
+        version = f"ee:{cache_data['sequedad']['mapid']}"
+
+    if estadisticas_zonales.version == version:
+        return version
+
+    guardado = cache_store.obtener("zonas", {"version": version})
+    if guardado:
+        histograma = np.array(guardado["valor"])
+    else:
+        if version.startswith("cog:"):
+            histograma = estadisticas_zonales.calcular_local(raster_cache)
+        else:
+            histograma = estadisticas_zonales.calcular_ee(construir_imagen_sequedad())
+        cache_store.guardar("zonas", histograma.tolist(), params={"version": version})
+
+    estadisticas_zonales.indexar(histograma, version)
+    return version
+
+def refrescar_sequedad():
+    """Encola el recálculo de sequedad (deduplicado si ya hay uno activo)"""
+    job, _ = job_manager.submit("sequedad", ejecutar_sequedad)
+    return job
+
+def reintento_permitido(estado):
+    """Sin intento previo o el último hace más de SEQUEDAD_RETRY_AFTER (no insistir si EE falla)"""
+    return not estado["last_attempt"] or time.time() - estado["last_attempt"] > SEQUEDAD_RETRY_AFTER
+
+async def refrescar_tokens_periodicamente():
+    """Regenera las capas cuyo token de EE está por expirar (o ya expiró)"""
+    refrescos = {
+        "sequedad": (cache_data, refrescar_sequedad),
+        "ndvi": (ndvi_estado, lambda: job_manager.submit("ndvi", ejecutar_ndvi))
+    }
+    while True:
+        for producto in {entrada["producto"] for entrada in cache_store.por_expirar(EE_MAP_REFRESH_MARGIN)}:
+            if producto not in refrescos:
+                continue
+            estado, refrescar = refrescos[producto]
+            if estado.get("processing") or not reintento_permitido(estado):
+                continue
+
+            print(f"🔄 Refrescando token de {producto} antes de su expiración")
+            # Marca el intento al encolar: el siguiente ciclo no reencola aunque el job aún no haya empezado
+            estado["last_attempt"] = time.time()
+            refrescar()
+
+        await asyncio.sleep(60)
+
 @app.get("/sequedad-cache")
-async def get_sequedad_cache():
-    """Cargar índice de sequedad desde cache (rápido)"""
+async def get_sequedad_cache(request: Request):
+    """Cargar índice de sequedad desde cache (rápido, stale-while-revalidate)"""
     try:
-        # Si hay cache válido, devolverlo
+        cache_store.sincronizar(cache_data, "sequedad", "sequedad")
+
+        # Si hay cache, devolverlo siempre de inmediato
         if cache_data["sequedad"] and cache_data["timestamp"]:
-            age_minutes = (time.time() - cache_data["timestamp"]) / 60
-            
-            return {
+            age_seconds = time.time() - cache_data["timestamp"]
+            stale = age_seconds > SEQUEDAD_MAX_AGE
+
+            # Pasado el TTL blando, lanzar un único refresco en segundo plano
+            refreshing = cache_data["processing"]
+            if stale and not refreshing and reintento_permitido(cache_data):
+                refrescar_sequedad()
+                refreshing = True
+
+            expired = age_seconds > SEQUEDAD_MAX_AGE + SEQUEDAD_STALE_WINDOW
+            consultas_cache.inc("sequedad", "stale" if stale else "hit")
+            return respuesta_json(request, {
                 "success": True,
                 "from_cache": True,
-                "cache_age_minutes": round(age_minutes, 1),
+                "stale": stale,
+                "expired": expired,
+                "refreshing": refreshing,
+                "cache_age_seconds": round(age_seconds),
+                "cache_age_minutes": round(age_seconds / 60, 1),
+                "last_refresh_error": cache_data["last_error"],
                 **cache_data["sequedad"]
-            }
+            }, version=(
+                "sequedad", cache_data["timestamp"], stale, expired, refreshing, cache_data["last_error"]
+            ), modificado=cache_data["timestamp"])
         else:
+            consultas_cache.inc("sequedad", "miss")
             return {
                 "success": False, 
                 "error": "No hay cache disponible", 
@@ -382,204 +736,422 @@ async def get_sequedad_cache():
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-@app.get("/actualizar-sequedad")
+def construir_imagen_sequedad(params=ISC_PARAMS_DEFECTO):
+    """Grafo EE del algoritmo ISC completo; devuelve la imagen clasificada (1-6)"""
+    roi = region_ee(params)
+    fechaInicio = params["desde"]
+    fechaFin = params["hasta"]
+    
+    mascaracut = ee.Image(1).clip(roi)
+    def cortarcoleccion(imagen):
+        mascara = mascaracut.mask()
+        return imagen.updateMask(mascara)
+
+    # GPM Precipitación
+    gpmColeccion = ee.ImageCollection('NASA/GPM_L3/IMERG_V06') \
+        .select('precipitationCal') \
+        .filterBounds(roi) \
+        .filterDate(fechaInicio, fechaFin) \
+        .sort('system:time_end', False) \
+        .limit(48) \
+        .map(cortarcoleccion)
+
+    duracionPrecipitacion = gpmColeccion.sum().divide(2).rename('duracion')
+
+    # ERA5 Temperatura y punto de rocío
+    templast = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR') \
+        .select('temperature_2m') \
+        .filterBounds(roi) \
+        .map(cortarcoleccion) \
+        .filterDate(fechaInicio, fechaFin) \
+        .sort('system:time_end', False) \
+        .first()
+
+    dewpoint = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR') \
+        .select('dewpoint_temperature_2m') \
+        .filterBounds(roi) \
+        .map(cortarcoleccion) \
+        .filterDate(fechaInicio, fechaFin) \
+        .sort('system:time_end', False) \
+        .first()
+
+    # Humedad relativa
+    temperaK = templast.subtract(273.15)
+    dewpointK = dewpoint.subtract(273.15)
+    pvse = dewpointK.multiply(17.27).divide(dewpointK.add(237.3)).exp().multiply(6.1078)
+    pvses = temperaK.multiply(17.27).divide(temperaK.add(237.3)).exp().multiply(6.1078)
+    relativehumidity = pvse.divide(pvses).multiply(100).rename('relahumi')
+    datos = relativehumidity.addBands(templast).clip(roi)
+
+    # NDVI
+    coleccionNDVI = ee.ImageCollection("MODIS/061/MOD13A2") \
+        .select('NDVI') \
+        .filterDate(fechaInicio, fechaFin) \
+        .filterBounds(roi) \
+        .map(cortarcoleccion)
+    ndvilast = coleccionNDVI.sort('system:time_end', False).first().multiply(0.0001)
+
+    # NDVI min/max histórico
+    ndviHistorico = ee.ImageCollection("MODIS/061/MOD13A2") \
+        .select('NDVI') \
+        .filterDate('2020-01-01', '2024-12-31') \
+        .filterBounds(roi) \
+        .map(cortarcoleccion)
+    ndviStats = ndviHistorico.reduce(ee.Reducer.minMax())
+    minNDVI = ndviStats.select('NDVI_min').multiply(0.0001)
+    maxNDVI = ndviStats.select('NDVI_max').multiply(0.0001)
+
+    # EMC
+    EMC = datos.expression(
+        "(b('relahumi') < 10) ? 0.032229+0.281073*b('relahumi')-0.000578*b('relahumi')*b('temperature_2m')" +
+        ": (b('relahumi') < 50) ? 2.22749+0.160107*b('relahumi')-0.014784*b('temperature_2m')" +
+        ": 21.0606+0.005565*(b('relahumi')**2)-0.00035*b('relahumi')*b('temperature_2m')-0.483199*b('relahumi')"
+    ).rename('EMC')
+
+    # H100
+    h100inputs = EMC.addBands(duracionPrecipitacion).clip(roi)
+    h100 = h100inputs.expression(
+        "(24 - b('duracion')) * b('EMC') + b('duracion') * (0.5 * b('duracion') + 41)"
+    ).divide(24).rename('H100')
+
+    # LRmax
+    imagenLRmax = maxNDVI.expression(
+        '0.30 + 0.30 * ((NDVImax + 0.19) / (0.95 + 0.19))', {
+            'NDVImax': maxNDVI
+        }
+    ).rename('LRmax')
+
+    # RG
+    imagenRG = ndvilast.expression(
+        '((NDVI - NDVImin) / (NDVImax - NDVImin)) * 100', {
+            'NDVI': ndvilast.select('NDVI'),
+            'NDVImin': minNDVI,
+            'NDVImax': maxNDVI
+        }
+    ).rename('RG')
+
+    # LR
+    imagenLR = imagenRG.expression(
+        'RG * LRmax / 100', {
+            'RG': imagenRG,
+            'LRmax': imagenLRmax
+        }
+    ).rename('LR')
+
+    # MR (simplificado para cache)
+    h100Stats = h100.reduceRegion(
+        reducer=ee.Reducer.minMax(),
+        geometry=roi,
+        scale=5000,  # Escala más grande para ser más rápido
+        maxPixels=1e8
+    )
+    
+    H100min = ee.Image.constant(10)  # Valores fijos para ser más rápido
+    H100max = ee.Image.constant(50)
+
+    imagenMR = h100.expression(
+        '((H100 - H100min) / (H100max - H100min))', {
+            'H100': h100,
+            'H100min': H100min,
+            'H100max': H100max
+        }
+    ).rename('MR')
+
+    # FDI
+    imagenFDIsc = imagenLR.expression(
+        '((1 - LR) * (1 - MR)) * 100', {
+            'LR': imagenLR,
+            'MR': imagenMR
+        }
+    ).rename('FDI')
+
+    # Clasificación final
+    imagenFDI = ee.Image(0) \
+        .where(imagenFDIsc.lt(50), 1) \
+        .where(imagenFDIsc.gte(50).And(imagenFDIsc.lt(60)), 2) \
+        .where(imagenFDIsc.gte(60).And(imagenFDIsc.lt(70)), 3) \
+        .where(imagenFDIsc.gte(70).And(imagenFDIsc.lt(80)), 4) \
+        .where(imagenFDIsc.gte(80).And(imagenFDIsc.lt(91)), 5) \
+        .where(imagenFDIsc.gte(91), 6).clip(roi)
+
+    return imagenFDI
+
+def calcular_sequedad(params=ISC_PARAMS_DEFECTO):
+    """Ejecuta el algoritmo ISC completo y devuelve los datos de tiles para el cache"""
+    imagenFDI = construir_imagen_sequedad(params)
+
+    Simbologia = ['267E00','56E200','FFFC00','FE7400','FF0000','9E00FF']
+    Etiquetas = ['Muy baja (<50)', 'Baja (50-60)', 'Media (60-70)', 'Alta (70-80)', 'Muy alta (80-91)', 'Extrema (>91)']
+    imagenFDIVis = {'min': 1, 'max': 6, 'palette': Simbologia, 'opacity': 0.70}
+
+    # Generar tiles
+    map_id = imagenFDI.getMapId(imagenFDIVis)
+
+    return {
+        "tile_url": map_id['tile_fetcher'].url_format,
+        "mapid": map_id['mapid'],
+        "token": map_id['token'],
+        "message": "Índice de Sequedad actualizado y almacenado en cache",
+        "legend": {
+            "title": "Nivel de Sequedad",
+            "labels": Etiquetas,
+            "colors": Simbologia
+        },
+        "processed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
+    }
+
+@app.api_route("/actualizar-sequedad", methods=["GET", "POST"])
 async def actualizar_sequedad():
-    """Procesar y actualizar cache del índice de sequedad"""
+    """Encolar el procesamiento del índice de sequedad (responde 202 con el job)"""
+    job, nuevo = job_manager.submit("sequedad", ejecutar_sequedad)
+
+    return JSONResponse(status_code=202, content={
+        "success": True,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+        "deduplicated": not nuevo,
+        "message": "Procesamiento encolado. Consulta status_url para ver el avance."
+    })
+
+def capa_para_tiles(layer):
+    """Datos (mapid/tile_url) de la capa cacheada que sirve el proxy de tiles"""
+    if layer == "sequedad":
+        cache_store.sincronizar(cache_data, "sequedad", "sequedad")
+        return cache_data["sequedad"]
+    if layer == "ndvi":
+        entrada = cache_store.obtener("ndvi", incluir_expirados=True)
+        return entrada["valor"] if entrada else None
+    return None
+
+def presembrar_tiles(layer, capa):
+    descargados = tile_cache.presembrar(
+        layer, capa["mapid"], capa["tile_url"], ECUADOR_BBOX,
+        TILE_PRESEED_MIN_ZOOM, TILE_PRESEED_MAX_ZOOM
+    )
+    print(f"🗺️ Presembrados {descargados} tiles de {layer}")
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.png")
+async def get_tile(layer: str, z: int, x: int, y: int, request: Request):
+    """Proxy de tiles con cache en disco: cada tile se pide a EE una sola vez por versión"""
+    capa = capa_para_tiles(layer)
+    if not capa or not capa.get("tile_url"):
+        return JSONResponse(status_code=404, content={"success": False, "error": f"Capa '{layer}' no disponible"})
+
+    version = capa.get("mapid") or capa["tile_url"]
+    headers = {
+        "ETag": tile_cache.etag(layer, version, z, x, y),
+        "Cache-Control": f"public, max-age={TILE_MAX_AGE}"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
     try:
-        # Verificar si ya se está procesando
-        if cache_data["processing"]:
-            return {
-                "success": False, 
-                "message": "Ya se está procesando. Espera unos minutos.",
-                "processing": True
-            }
-        
-        # Marcar como procesando
-        cache_data["processing"] = True
-        
-        # Tu algoritmo completo (mismo código de antes)
-        roi = ee.FeatureCollection("FAO/GAUL/2015/level0").filter(ee.Filter.eq("ADM0_NAME","Ecuador"))
-        fechaInicio = '2024-01-01'
-        fechaFin = '2025-12-31'
-        
-        mascaracut = ee.Image(1).clip(roi)
-        def cortarcoleccion(imagen):
-            mascara = mascaracut.mask()
-            return imagen.updateMask(mascara)
-
-        # GPM Precipitación
-        gpmColeccion = ee.ImageCollection('NASA/GPM_L3/IMERG_V06') \
-            .select('precipitationCal') \
-            .filterBounds(roi) \
-            .filterDate(fechaInicio, fechaFin) \
-            .sort('system:time_end', False) \
-            .limit(48) \
-            .map(cortarcoleccion)
-
-        duracionPrecipitacion = gpmColeccion.sum().divide(2).rename('duracion')
-
-        # ERA5 Temperatura y punto de rocío
-        templast = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR') \
-            .select('temperature_2m') \
-            .filterBounds(roi) \
-            .map(cortarcoleccion) \
-            .filterDate(fechaInicio, fechaFin) \
-            .sort('system:time_end', False) \
-            .first()
-
-        dewpoint = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR') \
-            .select('dewpoint_temperature_2m') \
-            .filterBounds(roi) \
-            .map(cortarcoleccion) \
-            .filterDate(fechaInicio, fechaFin) \
-            .sort('system:time_end', False) \
-            .first()
-
-        # Humedad relativa
-        temperaK = templast.subtract(273.15)
-        dewpointK = dewpoint.subtract(273.15)
-        pvse = dewpointK.multiply(17.27).divide(dewpointK.add(237.3)).exp().multiply(6.1078)
-        pvses = temperaK.multiply(17.27).divide(temperaK.add(237.3)).exp().multiply(6.1078)
-        relativehumidity = pvse.divide(pvses).multiply(100).rename('relahumi')
-        datos = relativehumidity.addBands(templast).clip(roi)
-
-        # NDVI
-        coleccionNDVI = ee.ImageCollection("MODIS/061/MOD13A2") \
-            .select('NDVI') \
-            .filterDate(fechaInicio, fechaFin) \
-            .filterBounds(roi) \
-            .map(cortarcoleccion)
-        ndvilast = coleccionNDVI.sort('system:time_end', False).first().multiply(0.0001)
+        contenido = await asyncio.to_thread(tile_cache.obtener, layer, version, capa["tile_url"], z, x, y)
+    except Exception as e:
+        return JSONResponse(status_code=502, content={"success": False, "error": str(e)})
+
+    return Response(content=contenido, media_type="image/png", headers=headers)
+
+@app.get("/raster/{layer}/{z}/{x}/{y}.png")
+async def get_raster_tile(layer: str, z: int, x: int, y: int, request: Request):
+    """Tiles renderizados desde el COG local (sin depender de EE)"""
+    version = raster_cache.version(layer) if layer in CAPAS_RASTER else None
+    if version is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"Capa raster '{layer}' no materializada"})
+
+    headers = {
+        "ETag": tile_cache.etag(f"raster-{layer}", version, z, x, y),
+        "Cache-Control": f"public, max-age={TILE_MAX_AGE}"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    contenido = await asyncio.to_thread(raster_cache.tile_png, layer, z, x, y)
+    if contenido is None:
+        # El COG se estaba sustituyendo por una versión nueva
+        return JSONResponse(status_code=503, content={"success": False, "error": f"Capa raster '{layer}' no disponible, reintenta"})
+    return Response(content=contenido, media_type="image/png", headers=headers)
+
+@app.get("/raster/{layer}/punto")
+async def get_raster_punto(layer: str, lat: float, lon: float):
+    """Valor de la capa en un punto, leído del COG local"""
+    if layer not in CAPAS_RASTER or not raster_cache.disponible(layer):
+        return {"success": False, "error": f"Capa raster '{layer}' no materializada"}
+
+    valores = await asyncio.to_thread(raster_cache.muestrear, layer, [lon], [lat])
+    if valores is None:
+        return JSONResponse(status_code=503, content={"success": False, "error": f"Capa raster '{layer}' no disponible, reintenta"})
+    valor = None if np.isnan(valores[0]) else float(valores[0])
+    return {"success": True, "layer": layer, "lat": lat, "lon": lon, "valor": valor}
+
+@app.get("/raster-status")
+async def raster_status():
+    return raster_cache.estado()
+
+@app.get("/tiles-status")
+async def tiles_status():
+    return tile_cache.estado()
+
+@app.get("/sequedad/zonas")
+async def get_sequedad_zonas(request: Request, nivel: str = "parroquia", codigo: str = None):
+    """Hectáreas por clase de sequedad en cada unidad DPA (parroquia, canton o provincia)"""
+    if nivel not in NIVELES_DPA:
+        return {"success": False, "error": f"Nivel inválido. Usa uno de: {', '.join(NIVELES_DPA)}"}
 
-        # NDVI min/max histórico
-        ndviHistorico = ee.ImageCollection("MODIS/061/MOD13A2") \
-            .select('NDVI') \
-            .filterDate('2020-01-01', '2024-12-31') \
-            .filterBounds(roi) \
-            .map(cortarcoleccion)
-        ndviStats = ndviHistorico.reduce(ee.Reducer.minMax())
-        minNDVI = ndviStats.select('NDVI_min').multiply(0.0001)
-        maxNDVI = ndviStats.select('NDVI_max').multiply(0.0001)
-
-        # EMC
-        EMC = datos.expression(
-            "(b('relahumi') < 10) ? 0.032229+0.281073*b('relahumi')-0.000578*b('relahumi')*b('temperature_2m')" +
-            ": (b('relahumi') < 50) ? 2.22749+0.160107*b('relahumi')-0.014784*b('temperature_2m')" +
-            ": 21.0606+0.005565*(b('relahumi')**2)-0.00035*b('relahumi')*b('temperature_2m')-0.483199*b('relahumi')"
-        ).rename('EMC')
-
-        # H100
-        h100inputs = EMC.addBands(duracionPrecipitacion).clip(roi)
-        h100 = h100inputs.expression(
-            "(24 - b('duracion')) * b('EMC') + b('duracion') * (0.5 * b('duracion') + 41)"
-        ).divide(24).rename('H100')
-
-        # LRmax
-        imagenLRmax = maxNDVI.expression(
-            '0.30 + 0.30 * ((NDVImax + 0.19) / (0.95 + 0.19))', {
-                'NDVImax': maxNDVI
-            }
-        ).rename('LRmax')
-
-        # RG
-        imagenRG = ndvilast.expression(
-            '((NDVI - NDVImin) / (NDVImax - NDVImin)) * 100', {
-                'NDVI': ndvilast.select('NDVI'),
-                'NDVImin': minNDVI,
-                'NDVImax': maxNDVI
-            }
-        ).rename('RG')
+    try:
+        version = await single_flight.do(SingleFlight.clave("/sequedad/zonas"), calcular_zonas)
+        zonas = estadisticas_zonales.consultar(nivel, codigo)
+        return respuesta_json(request, {
+            "success": True,
+            "version": version,
+            "nivel": nivel,
+            "clases": ETIQUETAS_CLASES,
+            "unidad": "ha",
+            "total": len(zonas),
+            "zonas": zonas
+        }, version=("zonas", version, nivel, codigo))
+    except Exception as e:
+        return {"success": False, "error": str(e)}
 
-        # LR
-        imagenLR = imagenRG.expression(
-            'RG * LRmax / 100', {
-                'RG': imagenRG,
-                'LRmax': imagenLRmax
-            }
-        ).rename('LR')
-
-        # MR (simplificado para cache)
-        h100Stats = h100.reduceRegion(
-            reducer=ee.Reducer.minMax(),
-            geometry=roi,
-            scale=5000,  # Escala más grande para ser más rápido
-            maxPixels=1e8
+def versiones_muestreo(capas):
+    """Fuente y versión vigentes de cada capa: COG local si existe, si no EE"""
+    versiones = {}
+    for capa in capas:
+        if raster_cache.disponible(capa):
+            versiones[capa] = ("cog", raster_cache.version(capa))
+        else:
+            datos = capa_para_tiles(capa)
+            if not datos:
+                raise RuntimeError(f"Capa '{capa}' no disponible")
+            versiones[capa] = ("ee", datos["mapid"])
+    return versiones
+
+def imagen_para_muestreo(capas):
+    """Una banda por capa para muestrear todas en la misma llamada a EE"""
+    constructores = {"sequedad": construir_imagen_sequedad, "ndvi": construir_imagen_ndvi}
+    bandas = [constructores[capa]().rename(capa) for capa in capas]
+    return ee.Image.cat(bandas)
+
+def a_columna(valores, decimales=4, entero=False):
+    if entero:
+        return [None if np.isnan(v) else int(v) for v in valores]
+    return [None if np.isnan(v) else round(float(v), decimales) for v in valores]
+
+@app.post("/sample")
+async def sample(request: Request):
+    """Muestrea sequedad/NDVI en muchos puntos (lon/lat, points o source=fires); respuesta columnar"""
+    try:
+        body = await request.json()
+        capas = body.get("layers", ["sequedad", "ndvi"])
+        invalidas = [c for c in capas if c not in CAPAS_RASTER]
+        if invalidas:
+            return {"success": False, "error": f"Capas inválidas: {invalidas}"}
+
+        extra = {}
+        if body.get("source") == "fires":
+            detecciones = cache_store.obtener("detecciones")
+            if not detecciones:
+                return {"success": False, "error": "No hay detecciones. Ejecuta /process-fires primero"}
+            lons, lats = detecciones["valor"]["lon"], detecciones["valor"]["lat"]
+            extra["fecha"] = detecciones["valor"]["fecha"]
+        elif "points" in body:
+            lons = [p[0] for p in body["points"]]
+            lats = [p[1] for p in body["points"]]
+        else:
+            lons, lats = body.get("lon", []), body.get("lat", [])
+
+        if len(lons) != len(lats) or not lons:
+            return {"success": False, "error": "Se requieren listas lon/lat no vacías y de igual longitud"}
+        if len(lons) > SAMPLE_MAX_POINTS:
+            return {"success": False, "error": f"Máximo {SAMPLE_MAX_POINTS} puntos por petición"}
+
+        versiones = versiones_muestreo(capas)
+        valores = await asyncio.to_thread(
+            muestreador.muestrear, lons, lats, capas, versiones, imagen_para_muestreo
         )
-        
-        H100min = ee.Image.constant(10)  # Valores fijos para ser más rápido
-        H100max = ee.Image.constant(50)
-
-        imagenMR = h100.expression(
-            '((H100 - H100min) / (H100max - H100min))', {
-                'H100': h100,
-                'H100min': H100min,
-                'H100max': H100max
-            }
-        ).rename('MR')
 
-        # FDI
-        imagenFDIsc = imagenLR.expression(
-            '((1 - LR) * (1 - MR)) * 100', {
-                'LR': imagenLR,
-                'MR': imagenMR
-            }
-        ).rename('FDI')
-
-        # Clasificación final
-        imagenFDI = ee.Image(0) \
-            .where(imagenFDIsc.lt(50), 1) \
-            .where(imagenFDIsc.gte(50).And(imagenFDIsc.lt(60)), 2) \
-            .where(imagenFDIsc.gte(60).And(imagenFDIsc.lt(70)), 3) \
-            .where(imagenFDIsc.gte(70).And(imagenFDIsc.lt(80)), 4) \
-            .where(imagenFDIsc.gte(80).And(imagenFDIsc.lt(91)), 5) \
-            .where(imagenFDIsc.gte(91), 6).clip(roi)
-
-        Simbologia = ['267E00','56E200','FFFC00','FE7400','FF0000','9E00FF']
-        Etiquetas = ['Muy baja (<50)', 'Baja (50-60)', 'Media (60-70)', 'Alta (70-80)', 'Muy alta (80-91)', 'Extrema (>91)']
-        imagenFDIVis = {'min': 1, 'max': 6, 'palette': Simbologia, 'opacity': 0.70}
-
-        # Generar tiles
-        map_id = imagenFDI.getMapId(imagenFDIVis)
-
-        # Guardar en cache
-        result_data = {
-            "tile_url": map_id['tile_fetcher'].url_format,
-            "mapid": map_id['mapid'],
-            "token": map_id['token'],
-            "message": "Índice de Sequedad actualizado y almacenado en cache",
-            "legend": {
-                "title": "Nivel de Sequedad",
-                "labels": Etiquetas,
-                "colors": Simbologia
-            },
-            "processed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
+        return {
+            "success": True,
+            "count": len(lons),
+            "layers": capas,
+            "sources": {capa: versiones[capa][0] for capa in capas},
+            "lon": lons,
+            "lat": lats,
+            **extra,
+            **{capa: a_columna(valores[capa], entero=(capa == "sequedad")) for capa in capas}
         }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
 
-        cache_data["sequedad"] = result_data
-        cache_data["timestamp"] = time.time()
-        cache_data["processing"] = False
+@app.get("/series")
+async def get_series(
+    lat: float,
+    lon: float,
+    desde: str = Query(None, alias="from"),
+    hasta: str = Query(None, alias="to"),
+    series: str = None
+):
+    """Historial de NDVI, precipitación y temperatura en un punto; arrays compactos t (ms) / v"""
+    try:
+        hasta = hasta or datetime.now().strftime("%Y-%m-%d")
+        desde = desde or (datetime.strptime(hasta, "%Y-%m-%d") - timedelta(days=365)).strftime("%Y-%m-%d")
+        params = normalizar_parametros(desde, hasta)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+
+    nombres = series.split(",") if series else list(SERIES)
+    invalidas = [s for s in nombres if s not in SERIES]
+    if invalidas:
+        return {"success": False, "error": f"Series inválidas: {invalidas}"}
+    if (datetime.strptime(params["hasta"], "%Y-%m-%d") - datetime.strptime(params["desde"], "%Y-%m-%d")).days > SERIES_MAX_DIAS:
+        return {"success": False, "error": f"Periodo máximo de {SERIES_MAX_DIAS} días"}
+
+    try:
+        decimales = series_temporales.decimales
+        clave = SingleFlight.clave("/series", {
+            "lon": round(lon, decimales), "lat": round(lat, decimales), "series": nombres, **params
+        })
+        resultado = await single_flight.do(
+            clave, series_temporales.obtener, lon, lat, params["desde"], params["hasta"], nombres
+        )
 
         return {
             "success": True,
-            "processing_completed": True,
-            **result_data
+            "lon": round(lon, decimales),
+            "lat": round(lat, decimales),
+            "from": params["desde"],
+            "to": params["hasta"],
+            "series": {
+                serie: {"t": t.tolist(), "v": a_columna(v)}
+                for serie, (t, v) in resultado.items()
+            }
         }
-
     except Exception as e:
-        cache_data["processing"] = False
         return {"success": False, "error": str(e)}
 
+@app.get("/metrics")
+async def metrics():
+    """Métricas de Prometheus de este worker"""
+    return respuesta_metricas()
+
 @app.get("/cache-status")
-async def cache_status():
+async def cache_status(request: Request):
     """Ver estado del cache"""
+    cache_store.sincronizar(cache_data, "sequedad", "sequedad")
     if cache_data["timestamp"]:
         age_minutes = (time.time() - cache_data["timestamp"]) / 60
-        return {
+        stale = age_minutes * 60 > SEQUEDAD_MAX_AGE
+        return respuesta_json(request, {
             "cache_available": bool(cache_data["sequedad"]),
             "cache_age_minutes": round(age_minutes, 1),
+            "stale": stale,
             "processing": cache_data["processing"],
+            "last_refresh_error": cache_data["last_error"],
             "last_update": datetime.fromtimestamp(cache_data["timestamp"]).strftime("%Y-%m-%d %H:%M:%S") if cache_data["timestamp"] else None
-        }
+        }, version=(
+            "cache-status", cache_data["timestamp"], stale, cache_data["processing"], cache_data["last_error"]
+        ), modificado=cache_data["timestamp"])
     else:
         return {
             "cache_available": False,
@@ -588,36 +1160,77 @@ async def cache_status():
         }
 
 # Agregar estas líneas AL FINAL de tu main.py (antes del if __name__)
-from fire_processor import FireProcessor
+from fire_jobs import procesar_incendios
 
 fire_cache = {"data": None, "timestamp": None, "processing": False}
 
-@app.get("/process-fires")
-async def process_fires():
-    if fire_cache["processing"]:
-        return {"success": False, "message": "Ya procesando incendios..."}
-    
-    fire_cache["processing"] = True
+edad_caches(lambda: {"sequedad": (cache_data, "sequedad"), "incendios": (fire_cache, "data")})
+
+def ejecutar_incendios(job):
+    """Trabajo: procesa incendios (región del job) y deja el resultado en el cache"""
+    region = job.params.get("region", REGION_PAIS)
+    # El estado en memoria de esta app es solo el de la región por defecto
+    return procesar_incendios(job, region, fire_cache if region == REGION_PAIS else None)
+
+@app.api_route("/process-fires", methods=["GET", "POST"])
+async def process_fires(region: str = None):
+    region = (region or REGION_PAIS).lower()
     try:
-        processor = FireProcessor()
-        result = processor.process_all()
-        fire_cache["data"] = result
-        fire_cache["timestamp"] = time.time()
-        fire_cache["processing"] = False
-        return result
-    except Exception as e:
-        fire_cache["processing"] = False
-        return {"success": False, "error": str(e)}
+        obtener_region(region)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    job, nuevo = job_manager.submit("incendios", ejecutar_incendios, {"region": region})
+
+    return JSONResponse(status_code=202, content={
+        "success": True,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+        "deduplicated": not nuevo,
+        "region": region,
+        "message": "Procesamiento de incendios encolado"
+    })
+
+@app.get("/scheduler")
+async def scheduler_status():
+    """Tareas programadas, próxima ejecución e historial (duración, resultado)"""
+    return scheduler_instance.estado()
+
+@app.get("/jobs")
+async def list_jobs():
+    """Trabajos recientes"""
+    return {"jobs": job_manager.listar()}
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    """Progreso del job en vivo (Server-Sent Events): etapas y contadores hasta que termine"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Job no encontrado"})
+    return StreamingResponse(eventos_job(job), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Estado, progreso y tiempos por etapa de un trabajo"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Job no encontrado"})
+    return job.to_dict()
 
 @app.get("/fires-status") 
-async def fires_status():
+async def fires_status(request: Request):
+    cache_store.sincronizar(fire_cache, "incendios", "data")
     if fire_cache["timestamp"]:
         age_minutes = (time.time() - fire_cache["timestamp"]) / 60
-        return {
+        return respuesta_json(request, {
             "cache_available": bool(fire_cache["data"]),
             "cache_age_minutes": round(age_minutes, 1),
             "processing": fire_cache["processing"]
-        }
+        }, version=("fires-status", fire_cache["timestamp"], fire_cache["processing"]), modificado=fire_cache["timestamp"])
     return {"cache_available": False, "processing": fire_cache["processing"]}
 
 if __name__ == "__main__":
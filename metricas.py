@@ -0,0 +1,276 @@
+"""
+Métricas en formato de exposición de Prometheus (texto 0.0.4), sin dependencias.
+
+Cada proceso tiene su propio registro: con varios workers de uvicorn, Prometheus
+debe raspar cada uno (o agregar por instancia). Registrar una observación cuesta
+un bisect y un lock, así que puede quedar activado en producción.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Segundos: desde peticiones servidas de cache hasta cálculos de EE de minutos
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_ETAPAS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4"
+
+
+def _etiquetas(nombres, valores, extra=""):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def cabecera(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+    def lineas(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(v)}" for clave, v in valores]
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def inc(self, *etiquetas, valor=1):
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + valor
+
+
+class Medidor(Metrica):
+    """Gauge; con `funciones` se calcula al raspar ({tupla de etiquetas: valor}), sin coste por petición"""
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funciones = []
+
+    def set(self, valor, *etiquetas):
+        with self._lock:
+            self._valores[etiquetas] = valor
+
+    def lineas(self):
+        if self.funciones:
+            valores = {}
+            for funcion in self.funciones:
+                try:
+                    valores.update(funcion())
+                except Exception as e:
+                    print(f"⚠️ Métrica {self.nombre} no disponible: {e}")
+            with self._lock:
+                self._valores = {tuple(k): v for k, v in valores.items() if v is not None}
+        return super().lineas()
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, *etiquetas):
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._valores.get(etiquetas)
+            if serie is None:
+                # [conteo por bucket (no acumulado)..., +Inf], suma
+                serie = self._valores[etiquetas] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    def lineas(self):
+        with self._lock:
+            valores = sorted((clave, (list(conteos), suma)) for clave, (conteos, suma) in self._valores.items())
+        lineas = []
+        for clave, (conteos, suma) in valores:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += conteo
+                le = 'le="' + _numero(float(limite)) + '"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {acumulado}")
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, clase, nombre, *args, **kwargs):
+        """Idempotente: ambas apps (o recargas del módulo) comparten la misma métrica"""
+        with self._lock:
+            if nombre not in self._metricas:
+                self._metricas[nombre] = clase(nombre, *args, **kwargs)
+            return self._metricas[nombre]
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador, nombre, ayuda, etiquetas)
+
+    def medidor(self, nombre, ayuda, etiquetas=(), funcion=None):
+        """Con `funcion`, se añade a las del gauge: cada app aporta sus propias series"""
+        medidor = self._registrar(Medidor, nombre, ayuda, etiquetas)
+        if funcion is not None:
+            medidor.funciones.append(funcion)
+        return medidor
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self._registrar(Histograma, nombre, ayuda, etiquetas, buckets=buckets)
+
+    def exponer(self):
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for metrica in metricas:
+            lineas += metrica.cabecera() + metrica.lineas()
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+peticiones_http = registro.histograma(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP por ruta", ("metodo", "ruta", "status")
+)
+llamadas_upstream = registro.histograma(
+    "upstream_request_duration_seconds", "Duración de las llamadas a servicios externos",
+    ("servicio", "operacion", "resultado")
+)
+consultas_cache = registro.contador(
+    "cache_requests_total", "Consultas a los caches de resultados (hit, stale, miss)", ("cache", "resultado")
+)
+duracion_etapas = registro.histograma(
+    "fire_stage_duration_seconds", "Duración de las etapas de FireProcessor", ("region", "etapa"),
+    buckets=BUCKETS_ETAPAS
+)
+filas_etapas = registro.medidor(
+    "fire_stage_rows", "Filas de salida de cada etapa en la última ejecución", ("region", "etapa")
+)
+
+
+@contextmanager
+def medir_upstream(servicio, operacion):
+    """Cronometra una llamada saliente; "error" si el bloque lanza o si marca llamada["resultado"]"""
+    inicio = time.perf_counter()
+    llamada = {"resultado": "ok"}
+    try:
+        yield llamada
+    except BaseException:
+        llamada["resultado"] = "error"
+        raise
+    finally:
+        llamadas_upstream.observar(time.perf_counter() - inicio, servicio, operacion, llamada["resultado"])
+
+
+def instrumentar_ee(ee):
+    """Envuelve las llamadas de ee.data que usan getInfo(), getMapId() y computePixels.
+
+    ComputedObject.getInfo e Image.getMapId resuelven ee.data en cada llamada, así que
+    basta con sustituir las funciones del módulo (una sola vez por proceso).
+    """
+    operaciones = {"computeValue": "getInfo", "getMapId": "getMapId", "computePixels": "computePixels"}
+    for funcion, operacion in operaciones.items():
+        original = getattr(ee.data, funcion, None)
+        if original is None or getattr(original, "_medida", False):
+            continue
+
+        def medida(*args, _original=original, _operacion=operacion, **kwargs):
+            with medir_upstream("earthengine", _operacion):
+                return _original(*args, **kwargs)
+        medida._medida = True
+        setattr(ee.data, funcion, medida)
+
+
+def edad_caches(caches):
+    """Funciones de gauge para caches {nombre: (dict, campo_valor)} con "timestamp" en segundos epoch"""
+    def disponible():
+        return {(nombre,): int(bool(cache.get(campo))) for nombre, (cache, campo) in caches().items()}
+
+    def edad():
+        ahora = time.time()
+        return {
+            (nombre,): round(ahora - cache["timestamp"], 1)
+            for nombre, (cache, _) in caches().items() if cache.get("timestamp")
+        }
+
+    def procesando():
+        return {(nombre,): int(bool(cache.get("processing"))) for nombre, (cache, _) in caches().items()}
+
+    registro.medidor("cache_available", "1 si el cache tiene datos", ("cache",), funcion=disponible)
+    registro.medidor("cache_age_seconds", "Antigüedad del contenido del cache", ("cache",), funcion=edad)
+    registro.medidor("cache_processing", "1 mientras se recalcula el cache", ("cache",), funcion=procesando)
+
+
+def caches_lru(caches):
+    """Hits, misses y tamaño de los LRUCache que devuelve caches() ({nombre: cache}), leídos al raspar"""
+    def valor(campo):
+        return lambda: {(nombre,): campo(cache) for nombre, cache in caches().items()}
+
+    registro.medidor("lru_cache_hits", "Aciertos de los LRUCache desde su creación", ("cache",),
+                     funcion=valor(lambda cache: cache.hits))
+    registro.medidor("lru_cache_misses", "Fallos de los LRUCache desde su creación", ("cache",),
+                     funcion=valor(lambda cache: cache.misses))
+    registro.medidor("lru_cache_size", "Entradas actuales de los LRUCache", ("cache",), funcion=valor(len))
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro: histograma por plantilla de ruta (/jobs/{job_id}, no el id concreto).
+
+    Las peticiones que no casan con ninguna ruta se agrupan en "sin_ruta" para no
+    crear una serie por URL. Se mide hasta el último fragmento del cuerpo.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        estado = {"status": 500}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["status"] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            ruta = scope.get("route")
+            peticiones_http.observar(
+                time.perf_counter() - inicio, scope["method"],
+                getattr(ruta, "path", "sin_ruta"), str(estado["status"])
+            )
+
+
+def respuesta_metricas():
+    from fastapi.responses import Response
+
+    return Response(registro.exponer(), media_type=TIPO_CONTENIDO)
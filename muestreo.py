@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+
+from cache_store import LRUCache
+
+
+class Muestreador:
+    """Muestreo masivo de capas (sequedad/NDVI) en puntos, con cache LRU por coordenada redondeada"""
+
+    def __init__(self, raster_cache, decimales=None, maxsize=None):
+        self.raster_cache = raster_cache
+        self.decimales = decimales if decimales is not None else int(os.getenv('SAMPLE_DECIMALS', 4))
+        self.cache = LRUCache(maxsize=maxsize or int(os.getenv('SAMPLE_CACHE_SIZE', 200000)))
+
+    def muestrear(self, lons, lats, capas, versiones, construir_imagen=None, escala=1000):
+        """Devuelve {capa: np.ndarray} alineado con los puntos de entrada.
+
+        `versiones` es {capa: (fuente, version)} con fuente "cog" o "ee"; para "ee",
+        `construir_imagen(capas)` debe devolver una ee.Image con una banda por capa.
+        """
+        factor = 10 ** self.decimales
+        ilon = np.rint(np.asarray(lons, dtype=np.float64) * factor).astype(np.int64)
+        ilat = np.rint(np.asarray(lats, dtype=np.float64) * factor).astype(np.int64)
+
+        # Una clave entera por coordenada redondeada (lon en los 32 bits altos): un solo np.unique
+        codigos, primeros, inverso = np.unique((ilon << 32) | (ilat & 0xFFFFFFFF), return_index=True, return_inverse=True)
+        inverso = inverso.reshape(-1)
+        coords = np.column_stack([ilon[primeros], ilat[primeros]]) / factor
+        claves = codigos.tolist()
+
+        resultados, pendientes = {}, {}
+        for capa in capas:
+            version = versiones[capa]
+            valores = self.cache.get_varios([(capa, version, codigo) for codigo in claves])
+            faltan = np.fromiter((v is None for v in valores), dtype=bool, count=len(valores))
+            resultados[capa] = np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+            pendientes[capa] = np.flatnonzero(faltan)
+
+        capas_ee = [c for c in capas if len(pendientes[c]) and versiones[c][0] == "ee"]
+        for capa in capas:
+            if len(pendientes[capa]) and versiones[capa][0] == "cog":
+                idx = pendientes[capa]
+                resultados[capa][idx] = self.raster_cache.muestrear(capa, coords[idx, 0], coords[idx, 1])
+
+        if capas_ee:
+            idx = np.unique(np.concatenate([pendientes[c] for c in capas_ee]))
+            muestras = self._muestrear_ee(construir_imagen(capas_ee), capas_ee, coords[idx], escala)
+            for capa in capas_ee:
+                resultados[capa][idx] = muestras[capa]
+
+        for capa in capas:
+            version = versiones[capa]
+            idx = pendientes[capa]
+            self.cache.set_varios(zip(
+                [(capa, version, claves[i]) for i in idx.tolist()], resultados[capa][idx].tolist()
+            ))
+
+        return {capa: resultados[capa][inverso] for capa in capas}
+
+    def _muestrear_ee(self, imagen, capas, coords, escala):
+        """Una sola petición: la colección se arma en el servidor a partir de dos listas de números.
+
+        Enviar los puntos como ee.List (y no un ee.Feature por punto) mantiene la petición
+        pequeña; reduceColumns devuelve filas [i, valor] y evita el límite de 5000
+        elementos de getInfo sobre colecciones.
+        """
+        import ee
+
+        lons = ee.List(coords[:, 0].tolist())
+        lats = ee.List(coords[:, 1].tolist())
+        coleccion = ee.FeatureCollection(ee.List.sequence(0, len(coords) - 1).map(
+            lambda i: ee.Feature(ee.Geometry.Point(ee.List([lons.get(i), lats.get(i)])), {"i": i})
+        ))
+        muestras = imagen.sampleRegions(collection=coleccion, properties=["i"], scale=escala, geometries=False)
+        respuesta = ee.Dictionary({
+            capa: muestras.reduceColumns(ee.Reducer.toList(2), ["i", capa]) for capa in capas
+        }).getInfo()
+
+        # Los píxeles enmascarados no devuelven fila: quedan como NaN
+        valores = {capa: np.full(len(coords), np.nan) for capa in capas}
+        for capa in capas:
+            filas = respuesta[capa]["list"]
+            if filas:
+                filas = np.array(filas, dtype=np.float64)
+                valores[capa][filas[:, 0].astype(np.int64)] = filas[:, 1]
+        return valores
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from regiones import REGIONES, REGION_DEFECTO
+
+REGION_PAIS = REGION_DEFECTO
+
+
+def normalizar_bbox(bbox):
+    """"minlon,minlat,maxlon,maxlat" → lista redondeada a 4 decimales; lanza ValueError si es inválido"""
+    try:
+        coords = [round(float(v), 4) for v in bbox.split(",")]
+    except ValueError:
+        raise ValueError("bbox inválido: usa minlon,minlat,maxlon,maxlat")
+    if len(coords) != 4 or coords[0] >= coords[2] or coords[1] >= coords[3]:
+        raise ValueError("bbox inválido: usa minlon,minlat,maxlon,maxlat")
+    return coords
+
+
+def normalizar_parametros(desde, hasta, region=None, bbox=None):
+    """Valida y normaliza ventana de fechas y región; lanza ValueError si son inválidos.
+
+    region: "ecuador", otra región registrada o un código DPA (2 dígitos provincia, 4 cantón, 6 parroquia).
+    bbox: "minlon,minlat,maxlon,maxlat" (tiene prioridad sobre region).
+    """
+    try:
+        fecha_desde = datetime.strptime(desde, "%Y-%m-%d")
+        fecha_hasta = datetime.strptime(hasta, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValueError("Fechas inválidas: usa el formato YYYY-MM-DD")
+
+    if fecha_desde >= fecha_hasta:
+        raise ValueError("'desde' debe ser anterior a 'hasta'")
+
+    params = {"desde": desde, "hasta": hasta, "region": REGION_PAIS, "bbox": None}
+
+    if bbox:
+        params["region"] = None
+        params["bbox"] = normalizar_bbox(bbox)
+    elif region and region.lower() in REGIONES:
+        params["region"] = region.lower()
+    elif region:
+        if not region.isdigit() or len(region) not in (2, 4, 6):
+            raise ValueError(f"region inválida: {', '.join(REGIONES)} o código DPA de 2, 4 o 6 dígitos")
+        params["region"] = region
+
+    return params
+
+
+def geometria_dpa(parroquias, codigo, tolerancia=0.001):
+    """Geometría (EPSG:4326, GeoJSON) de una provincia/cantón/parroquia por código DPA"""
+    columna = {2: "DPA_PROVIN", 4: "DPA_CANTON", 6: "DPA_PARROQ"}[len(codigo)]
+    seleccion = parroquias[parroquias[columna].astype(str) == codigo]
+    if seleccion.empty:
+        raise ValueError(f"Código DPA no encontrado: {codigo}")
+
+    geometria = seleccion.to_crs("EPSG:4326").geometry.unary_union.simplify(tolerancia)
+    return geometria.__geo_interface__
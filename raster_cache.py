@@ -0,0 +1,260 @@
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+ORIGEN_MERCATOR = 20037508.342789244
+RADIO_TIERRA = 6378137.0
+TAMANO_TILE = 256
+
+# Paletas de main.py (sequedad: clases 1..6, NDVI: rampa 0..1)
+SIMBOLOGIA_SEQUEDAD = ['267E00', '56E200', 'FFFC00', 'FE7400', 'FF0000', '9E00FF']
+PALETA_NDVI = ['8B0000', 'CD5C5C', 'F0E68C', '9ACD32', '32CD32', '228B22', '006400']
+
+CAPAS_RASTER = {
+    "sequedad": {"dtype": "uint8", "nodata": 0, "resampling": "NEAREST", "opacidad": 0.70},
+    "ndvi": {"dtype": "float32", "nodata": -9999.0, "resampling": "AVERAGE", "opacidad": 1.0}
+}
+
+
+def _hex_a_rgb(color):
+    color = color.lstrip('#')
+    return [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def lonlat_a_mercator(lon, lat):
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.0511, 85.0511)
+    x = lon * ORIGEN_MERCATOR / 180.0
+    y = np.log(np.tan((90.0 + lat) * math.pi / 360.0)) * RADIO_TIERRA
+    return x, y
+
+
+def limites_tile(z, x, y):
+    """Límites (minx, miny, maxx, maxy) en EPSG:3857 de un tile XYZ"""
+    tamano = 2 * ORIGEN_MERCATOR / 2 ** z
+    minx = -ORIGEN_MERCATOR + x * tamano
+    maxy = ORIGEN_MERCATOR - y * tamano
+    return minx, maxy - tamano, minx + tamano, maxy
+
+
+def codificar_png(rgba):
+    """PNG RGBA mínimo (sin dependencias) a partir de un array HxWx4 uint8"""
+    alto, ancho, _ = rgba.shape
+    filas = np.zeros((alto, ancho * 4 + 1), dtype=np.uint8)
+    filas[:, 1:] = rgba.reshape(alto, ancho * 4)
+
+    def chunk(tipo, datos):
+        return struct.pack('>I', len(datos)) + tipo + datos + struct.pack('>I', zlib.crc32(tipo + datos) & 0xffffffff)
+
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', ancho, alto, 8, 6, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(filas.tobytes(), 6))
+        + chunk(b'IEND', b'')
+    )
+
+
+def colorear(capa, valores):
+    """Aplica la simbología de la capa; nodata → transparente"""
+    config = CAPAS_RASTER[capa]
+    rgba = np.zeros(valores.shape + (4,), dtype=np.uint8)
+    alfa = int(255 * config["opacidad"])
+
+    if capa == "sequedad":
+        paleta = np.array([[0, 0, 0]] + [_hex_a_rgb(c) for c in SIMBOLOGIA_SEQUEDAD], dtype=np.uint8)
+        clases = np.clip(valores, 0, len(SIMBOLOGIA_SEQUEDAD)).astype(np.intp)
+        rgba[..., :3] = paleta[clases]
+        rgba[..., 3] = np.where(clases > 0, alfa, 0)
+    else:
+        paleta = np.array([_hex_a_rgb(c) for c in PALETA_NDVI], dtype=np.float64)
+        validos = np.isfinite(valores) & (valores != config["nodata"])
+        posicion = np.clip(np.where(validos, valores, 0), 0, 1) * (len(PALETA_NDVI) - 1)
+        base = np.floor(posicion).astype(np.intp)
+        siguiente = np.minimum(base + 1, len(PALETA_NDVI) - 1)
+        fraccion = (posicion - base)[..., None]
+        rgba[..., :3] = (paleta[base] * (1 - fraccion) + paleta[siguiente] * fraccion).astype(np.uint8)
+        rgba[..., 3] = np.where(validos, alfa, 0)
+
+    return rgba
+
+
+class RasterCache:
+    """Capas materializadas como Cloud-Optimized GeoTIFF locales (EPSG:3857, tiles + overviews)"""
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or os.getenv('RASTER_CACHE_DIR', os.path.join('cache', 'raster'))
+        os.makedirs(self.directorio, exist_ok=True)
+        self._local = threading.local()
+
+    def ruta(self, capa):
+        return os.path.join(self.directorio, f"{capa}.tif")
+
+    def version(self, capa):
+        """mtime del COG; cambia con cada materialización"""
+        try:
+            return os.path.getmtime(self.ruta(capa))
+        except FileNotFoundError:
+            return None
+
+    def disponible(self, capa):
+        return self.version(capa) is not None
+
+    def materializar(self, capa, array, transform):
+        """Escribe `array` (2D, EPSG:3857) como COG con overviews internos, de forma atómica"""
+        from rasterio.io import MemoryFile
+        from rasterio.shutil import copy as rio_copy
+
+        config = CAPAS_RASTER[capa]
+        perfil = {
+            "driver": "GTiff",
+            "width": array.shape[1],
+            "height": array.shape[0],
+            "count": 1,
+            "dtype": config["dtype"],
+            "nodata": config["nodata"],
+            "crs": "EPSG:3857",
+            "transform": transform
+        }
+
+        temporal = f"{self.ruta(capa)}.{os.getpid()}.tmp"
+        with MemoryFile() as memoria:
+            with memoria.open(**perfil) as dst:
+                dst.write(array.astype(config["dtype"]), 1)
+            with memoria.open() as src:
+                rio_copy(
+                    src, temporal, driver="COG",
+                    blocksize=TAMANO_TILE, compress="DEFLATE",
+                    overview_resampling=config["resampling"]
+                )
+        os.replace(temporal, self.ruta(capa))
+        print(f"🗺️ COG de {capa} materializado: {array.shape[1]}x{array.shape[0]} px")
+        return self.version(capa)
+
+    def materializar_desde_ee(self, capa, imagen, bbox, escala, bloque=1024):
+        """Descarga la imagen de EE por bloques (computePixels) y la guarda como COG"""
+        import ee
+        from rasterio.transform import from_origin
+
+        config = CAPAS_RASTER[capa]
+        (minx, maxx), (miny, maxy) = lonlat_a_mercator([bbox[0], bbox[2]], [bbox[1], bbox[3]])
+        ancho = int(math.ceil((maxx - minx) / escala))
+        alto = int(math.ceil((maxy - miny) / escala))
+        imagen = ee.Image(imagen).unmask(config["nodata"]).toFloat()
+        array = np.full((alto, ancho), config["nodata"], dtype=config["dtype"])
+
+        for fila in range(0, alto, bloque):
+            for columna in range(0, ancho, bloque):
+                h = min(bloque, alto - fila)
+                w = min(bloque, ancho - columna)
+                pixeles = ee.data.computePixels({
+                    "expression": imagen,
+                    "fileFormat": "NUMPY_NDARRAY",
+                    "grid": {
+                        "dimensions": {"width": w, "height": h},
+                        "affineTransform": {
+                            "scaleX": escala, "shearX": 0, "translateX": minx + columna * escala,
+                            "shearY": 0, "scaleY": -escala, "translateY": maxy - fila * escala
+                        },
+                        "crsCode": "EPSG:3857"
+                    }
+                })
+                banda = pixeles[pixeles.dtype.names[0]]
+                array[fila:fila + h, columna:columna + w] = banda
+
+        return self.materializar(capa, array, from_origin(minx, maxy, escala, escala))
+
+    def _abrir(self, capa):
+        """Dataset abierto por hilo (rasterio no es thread-safe); se reabre si cambia la versión"""
+        import rasterio
+
+        version = self.version(capa)
+        if version is None:
+            return None
+
+        abiertos = getattr(self._local, "abiertos", None)
+        if abiertos is None:
+            abiertos = self._local.abiertos = {}
+
+        actual = abiertos.get(capa)
+        if actual and actual[0] == version:
+            return actual[1]
+        if actual:
+            actual[1].close()
+
+        dataset = rasterio.open(self.ruta(capa))
+        abiertos[capa] = (version, dataset)
+        return dataset
+
+    def leer_tile(self, capa, z, x, y):
+        """Valores del tile XYZ; GDAL elige el overview adecuado para el zoom"""
+        from rasterio.enums import Resampling
+        from rasterio.windows import from_bounds
+
+        dataset = self._abrir(capa)
+        if dataset is None:
+            return None
+
+        minx, miny, maxx, maxy = limites_tile(z, x, y)
+        izq, abajo, der, arriba = dataset.bounds
+        if minx >= der or maxx <= izq or miny >= arriba or maxy <= abajo:
+            return np.full((TAMANO_TILE, TAMANO_TILE), dataset.nodata, dtype=dataset.dtypes[0])
+
+        dentro = minx >= izq and maxx <= der and miny >= abajo and maxy <= arriba
+        resampling = Resampling.nearest if capa == "sequedad" else Resampling.bilinear
+        return dataset.read(
+            1,
+            window=from_bounds(minx, miny, maxx, maxy, dataset.transform),
+            out_shape=(TAMANO_TILE, TAMANO_TILE),
+            boundless=not dentro,
+            fill_value=dataset.nodata,
+            resampling=resampling
+        )
+
+    def tile_png(self, capa, z, x, y):
+        valores = self.leer_tile(capa, z, x, y)
+        if valores is None:
+            return None
+        return codificar_png(colorear(capa, valores))
+
+    def muestrear(self, capa, lons, lats):
+        """Valores en muchos puntos con una sola lectura por ventana; NaN fuera o sin dato"""
+        from rasterio.windows import Window
+
+        dataset = self._abrir(capa)
+        if dataset is None:
+            return None
+
+        xs, ys = lonlat_a_mercator(lons, lats)
+        inversa = ~dataset.transform
+        columnas, filas = inversa * (xs, ys)
+        columnas = np.floor(columnas).astype(np.int64)
+        filas = np.floor(filas).astype(np.int64)
+        validos = (columnas >= 0) & (columnas < dataset.width) & (filas >= 0) & (filas < dataset.height)
+
+        valores = np.full(len(xs), np.nan)
+        if not validos.any():
+            return valores
+
+        # Ventana mínima que cubre todos los puntos: una lectura de bloques del COG
+        c0, c1 = columnas[validos].min(), columnas[validos].max()
+        f0, f1 = filas[validos].min(), filas[validos].max()
+        ventana = dataset.read(1, window=Window(c0, f0, c1 - c0 + 1, f1 - f0 + 1))
+        leidos = ventana[filas[validos] - f0, columnas[validos] - c0].astype(np.float64)
+        leidos[leidos == dataset.nodata] = np.nan
+        valores[validos] = leidos
+        return valores
+
+    def estado(self):
+        return {
+            capa: {
+                "disponible": self.disponible(capa),
+                "version": self.version(capa),
+                "age_minutes": round((time.time() - self.version(capa)) / 60, 1) if self.disponible(capa) else None
+            }
+            for capa in CAPAS_RASTER
+        }
@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+
+# Región por defecto: conserva las claves de cache y rutas anteriores (sin sufijo)
+REGION_DEFECTO = "ecuador"
+
+# Columnas de la capa de límites → niveles de los eventos (provincia, cantón, parroquia)
+COLUMNAS_DPA = {"dpa_despro": "DPA_DESPRO", "dpa_descan": "DPA_DESCAN", "dpa_despar": "DPA_DESPAR"}
+
+# Umbrales del pipeline de incendios (heredados por las regiones que no los definan)
+UMBRALES_DEFECTO = {
+    "distancia_m": 1000,
+    "dias_lag": 3,
+    "min_puntos": 5,
+    "min_ha": 10
+}
+
+REGIONES = {
+    "ecuador": {
+        "nombre": "Ecuador",
+        "bbox": [-92.0, -5.0, -75.2, 1.7],
+        "crs": "EPSG:32717",
+        "limites": os.path.join("data", "ORGANIZACION_TERRITORIAL_PARROQUIAL.shp"),
+        "columnas": COLUMNAS_DPA,
+        "adm0": "Ecuador",
+        **UMBRALES_DEFECTO
+    }
+}
+
+
+def crs_utm(bbox):
+    """EPSG de la zona UTM (WGS84) del centro del bbox lon/lat"""
+    lon = (bbox[0] + bbox[2]) / 2
+    lat = (bbox[1] + bbox[3]) / 2
+    zona = min(int((lon + 180) // 6) + 1, 60)
+    return f"EPSG:{32700 + zona if lat < 0 else 32600 + zona}"
+
+
+def cargar_regiones(ruta=None):
+    """Añade al registro las regiones de REGIONES_PATH (JSON {nombre: config}).
+
+    Obligatorios: bbox y limites; crs se deduce de la zona UTM del bbox y los
+    umbrales, columnas y nombre toman los valores por defecto si faltan.
+    """
+    ruta = ruta or os.getenv('REGIONES_PATH')
+    if not ruta:
+        return REGIONES
+
+    with open(ruta, encoding='utf-8') as f:
+        definidas = json.load(f)
+
+    for nombre, config in definidas.items():
+        bbox = config.get("bbox")
+        if not bbox or len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+            raise ValueError(f"Región {nombre}: bbox inválido (minlon, minlat, maxlon, maxlat)")
+        if not config.get("limites"):
+            raise ValueError(f"Región {nombre}: falta la capa de límites")
+
+        REGIONES[nombre.lower()] = {
+            "nombre": nombre,
+            "crs": crs_utm(bbox),
+            "columnas": COLUMNAS_DPA,
+            "adm0": None,
+            **UMBRALES_DEFECTO,
+            **config
+        }
+    return REGIONES
+
+
+def obtener_region(nombre=None):
+    """Configuración de la región; lanza ValueError si no está registrada"""
+    nombre = (nombre or REGION_DEFECTO).lower()
+    if nombre not in REGIONES:
+        raise ValueError(f"Región desconocida: {nombre} (disponibles: {', '.join(REGIONES)})")
+    return REGIONES[nombre]
+
+
+def regiones_activas():
+    """Regiones que procesan los disparadores automáticos (FIRE_REGIONES, separadas por comas)"""
+    nombres = [r.strip().lower() for r in os.getenv('FIRE_REGIONES', REGION_DEFECTO).split(",") if r.strip()]
+    for nombre in nombres:
+        obtener_region(nombre)
+    return nombres
+
+
+def clave_region(clave, region):
+    """Clave de cache/lease aislada por región; la región por defecto conserva la original"""
+    region = (region or REGION_DEFECTO).lower()
+    return clave if region == REGION_DEFECTO else f"{clave}:{region}"
+
+
+def directorio_region(base, region):
+    region = (region or REGION_DEFECTO).lower()
+    return base if region == REGION_DEFECTO else os.path.join(base, region)
+
+
+class CapasLimites:
+    """Capas de límites leídas una sola vez y reproyectadas por CRS, compartidas entre ejecuciones.
+
+    Varias regiones pueden procesarse a la vez: cada (ruta, crs) se carga bajo su propio
+    lock para que dos hilos no lean el mismo shapefile en paralelo.
+    """
+
+    def __init__(self):
+        self._capas = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, ruta, crs=None):
+        clave = (ruta, crs)
+        with self._lock:
+            if clave in self._capas:
+                return self._capas[clave]
+            lock = self._locks.setdefault(clave, threading.Lock())
+
+        with lock:
+            if clave not in self._capas:
+                if crs is None:
+                    import geopandas as gpd
+                    capa = gpd.read_file(ruta)
+                else:
+                    capa = self.obtener(ruta).to_crs(crs)
+                with self._lock:
+                    self._capas[clave] = capa
+        return self._capas[clave]
+
+    def estado(self):
+        with self._lock:
+            return [{"ruta": ruta, "crs": crs, "filas": len(capa)} for (ruta, crs), capa in self._capas.items()]
+
+
+cargar_regiones()
+capas_limites = CapasLimites()
@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import json
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Por debajo de este tamaño la compresión no compensa
+COMPRESION_MIN_BYTES = int(os.getenv('COMPRESION_MIN_BYTES', 1024))
+
+
+def _a_nativo(valor):
+    """Escalares y arrays de NumPy (p. ej. stats de process_all) → tipos JSON"""
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def serializar(contenido):
+    """JSON en bytes; orjson si está instalado (NumPy nativo), si no json con conversión"""
+    if orjson is not None:
+        return orjson.dumps(contenido, default=_a_nativo, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(contenido, default=_a_nativo, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def codificaciones_aceptadas(cabecera):
+    """{codificación: q} de una cabecera Accept-Encoding (q=0 significa "no aceptable")"""
+    aceptadas = {}
+    for parte in cabecera.split(","):
+        nombre, _, parametros = parte.partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.partition("=")
+            if clave.strip().lower() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        aceptadas[nombre] = q
+    return aceptadas
+
+
+def comprimir(request, cuerpo):
+    """(cuerpo, content-encoding) según Accept-Encoding: la de mayor q; br si empata y hay brotli"""
+    if len(cuerpo) < COMPRESION_MIN_BYTES:
+        return cuerpo, None
+    aceptadas = codificaciones_aceptadas(request.headers.get("accept-encoding", ""))
+    disponibles = ("br", "gzip") if brotli is not None else ("gzip",)
+    calidades = {c: aceptadas.get(c, aceptadas.get("*", 0.0)) for c in disponibles}
+    candidatas = [c for c in disponibles if calidades[c] > 0]
+    if not candidatas:
+        return cuerpo, None
+    elegida = max(candidatas, key=calidades.get)
+    if elegida == "br":
+        return brotli.compress(cuerpo, quality=5), "br"
+    return gzip.compress(cuerpo, compresslevel=6), "gzip"
+
+
+def etag_version(*version):
+    return '"' + hashlib.sha1(repr(version).encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def no_modificado(request, etag, modificado=None):
+    if "if-none-match" in request.headers:
+        return etag in [v.strip() for v in request.headers["if-none-match"].split(",")]
+    if modificado and "if-modified-since" in request.headers:
+        try:
+            return int(modificado) <= parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def respuesta_json(request, contenido, version=None, modificado=None, status_code=200, max_age=0):
+    """Respuesta JSON serializada rápido, comprimida y, con `version`, con ETag/Last-Modified y 304.
+
+    `version` debe cambiar siempre que cambie el contenido relevante; los campos derivados
+    del reloj (p. ej. edad del cache) no entran en ella: se recalculan con Last-Modified.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if version is not None:
+        headers["ETag"] = etag_version(*version)
+        headers["Cache-Control"] = f"no-cache, max-age={max_age}" if max_age else "no-cache"
+        if modificado:
+            headers["Last-Modified"] = formatdate(modificado, usegmt=True)
+        if status_code == 200 and no_modificado(request, headers["ETag"], modificado):
+            return Response(status_code=304, headers=headers)
+
+    cuerpo, codificacion = comprimir(request, serializar(contenido))
+    if codificacion:
+        headers["Content-Encoding"] = codificacion
+    return Response(content=cuerpo, status_code=status_code, media_type="application/json", headers=headers)
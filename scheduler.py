@@ -1,66 +1,218 @@
-import schedule
-import time
-import requests
-import threading
-from datetime import datetime
 import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
 
-class FireScheduler:
-    def __init__(self):
-        self.api_base = os.getenv('RAILWAY_API_BASE', 'http://localhost:8000')
-        self.running = False
-        
-    def process_fires_job(self):
-        print(f"[{datetime.now()}] Iniciando procesamiento programado de incendios...")
-        
-        try:
-            response = requests.post(f"{self.api_base}/process-fires", timeout=3600)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    stats = result.get('stats', {})
-                    print(f"✅ Procesamiento exitoso:")
-                    print(f"   - Polígonos: {stats.get('total_poligonos', 'N/A')}")
-                    print(f"   - Eventos: {stats.get('eventos_unicos', 'N/A')}")
-                    print(f"   - Eventos grandes: {stats.get('eventos_grandes', 'N/A')}")
-                else:
-                    print(f"❌ Error en procesamiento: {result.get('error')}")
+from jobs import job_manager
+
+# Rangos de los cinco campos cron: minuto, hora, día del mes, mes, día de la semana (0 = domingo)
+RANGOS_CRON = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+
+def _campo_cron(texto, minimo, maximo):
+    """Valores de un campo cron: *, */n, a-b, a-b/n y listas separadas por comas"""
+    valores = set()
+    for parte in texto.split(","):
+        rango, _, paso = parte.partition("/")
+        paso = int(paso) if paso else 1
+        if rango == "*":
+            inicio, fin = minimo, maximo
+        elif "-" in rango:
+            inicio, fin = (int(v) for v in rango.split("-"))
+        else:
+            inicio = fin = int(rango)
+            if paso > 1:
+                fin = maximo
+        if paso < 1 or inicio < minimo or fin > maximo + (1 if maximo == 6 else 0) or inicio > fin:
+            raise ValueError(f"Campo cron fuera de rango: {parte}")
+        valores.update(range(inicio, fin + 1, paso))
+
+    # 7 también es domingo en el día de la semana
+    if maximo == 6 and 7 in valores:
+        valores.discard(7)
+        valores.add(0)
+    return valores
+
+
+class Cron:
+    """Expresión cron de cinco campos evaluada en UTC"""
+
+    def __init__(self, expresion):
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ValueError(f"Expresión cron inválida (se esperan 5 campos): {expresion!r}")
+        self.expresion = expresion
+        self.minutos, self.horas, self.dias, self.meses, self.dias_semana = (
+            _campo_cron(campo, *rango) for campo, rango in zip(campos, RANGOS_CRON)
+        )
+        # Como en cron: si ambos días están restringidos basta con que coincida uno
+        self._dia_o = campos[2] != "*" and campos[4] != "*"
+
+    def _dia_valido(self, momento):
+        dia = momento.day in self.dias
+        dia_semana = (momento.weekday() + 1) % 7 in self.dias_semana
+        return (dia or dia_semana) if self._dia_o else (dia and dia_semana)
+
+    def siguiente(self, desde):
+        """Primer instante (al minuto) estrictamente posterior a `desde`"""
+        momento = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = momento + timedelta(days=366 * 4)
+
+        while momento < limite:
+            if momento.month not in self.meses or not self._dia_valido(momento):
+                momento = momento.replace(hour=0, minute=0) + timedelta(days=1)
+            elif momento.hour not in self.horas:
+                momento = momento.replace(minute=0) + timedelta(hours=1)
+            elif momento.minute not in self.minutos:
+                momento += timedelta(minutes=1)
             else:
-                print(f"❌ Error HTTP: {response.status_code}")
-                
-        except requests.exceptions.Timeout:
-            print("⏰ Timeout - El procesamiento está tomando más tiempo del esperado")
-        except Exception as e:
-            print(f"❌ Error en job programado: {e}")
-    
-    def start_scheduler(self):
-        print("🚀 Iniciando scheduler de incendios...")
-        print("📅 Programado cada 12 horas: 06:00 y 18:00 UTC")
-        
-        schedule.every().day.at("06:00").do(self.process_fires_job)
-        schedule.every().day.at("12:00").do(self.process_fires_job)
-        schedule.every().day.at("18:00").do(self.process_fires_job)
-        
-        self.running = True
-        
-        while self.running:
-            schedule.run_pending()
-            time.sleep(60)
-    
+                return momento
+        raise ValueError(f"La expresión cron nunca se cumple: {self.expresion!r}")
+
+
+class Tarea:
+    """Trabajo programado con su política de solapamiento e historial de ejecuciones"""
+
+    def __init__(self, nombre, cron, func, politica="skip", contar_filas=None, max_historial=50, tipo=None, params=None):
+        if politica not in ("skip", "queue"):
+            raise ValueError("La política de solapamiento debe ser 'skip' o 'queue'")
+        self.nombre = nombre
+        self.cron = Cron(cron)
+        self.func = func
+        self.politica = politica
+        self.contar_filas = contar_filas
+        # Tipo y parámetros del job (p. ej. una tarea por región del mismo tipo "incendios")
+        self.tipo = tipo or nombre
+        self.params = params
+        self.siguiente = self.cron.siguiente(datetime.now(timezone.utc))
+        self.job = None
+        self.en_cola = False
+        self.historial = deque(maxlen=max_historial)
+
+    def to_dict(self):
+        return {
+            "nombre": self.nombre,
+            "cron": self.cron.expresion,
+            "politica": self.politica,
+            "params": self.params,
+            "siguiente": self.siguiente.strftime("%Y-%m-%d %H:%M UTC"),
+            "en_curso": self.job.id if self.job else None,
+            "en_cola": self.en_cola,
+            "historial": list(reversed(self.historial))
+        }
+
+
+class JobScheduler:
+    """Dispara los pipelines en proceso (vía JobManager) según expresiones cron.
+
+    Nunca hay dos ejecuciones de la misma tarea a la vez: si al llegar la hora
+    sigue una en curso, se omite (skip) o se deja una sola pendiente (queue).
+    """
+
+    def __init__(self, intervalo=None, jobs=None):
+        self.intervalo = intervalo or int(os.getenv('SCHEDULER_TICK', 15))
+        self.jobs = jobs or job_manager
+        self.tareas = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def registrar(self, nombre, cron, func, politica="skip", contar_filas=None, tipo=None, params=None):
+        """Programa func(job) con la expresión cron; cron vacío deja la tarea desactivada"""
+        if not cron:
+            print(f"⏸️ Tarea programada '{nombre}' desactivada (sin expresión cron)")
+            return None
+
+        tarea = Tarea(nombre, cron, func, politica, contar_filas, tipo=tipo, params=params)
+        with self._lock:
+            self.tareas[nombre] = tarea
+        print(f"📅 Tarea '{nombre}' programada: '{cron}' (UTC), próxima {tarea.siguiente:%Y-%m-%d %H:%M}")
+        return tarea
+
+    def _lanzar(self, tarea):
+        tarea.job, _ = self.jobs.submit(tarea.tipo, tarea.func, tarea.params)
+        tarea.en_cola = False
+        print(f"[{datetime.now()}] ▶️ Ejecución programada de '{tarea.nombre}' (job {tarea.job.id})")
+
+    def _registrar_fin(self, tarea):
+        job = tarea.job
+        resultado = job.result if isinstance(job.result, dict) else {}
+        estado = "skipped" if resultado.get("skipped") else job.estado
+
+        filas = None
+        if estado == "done" and tarea.contar_filas:
+            try:
+                filas = tarea.contar_filas(resultado)
+            except Exception:
+                pass
+
+        tarea.historial.append({
+            "job_id": job.id,
+            "inicio": datetime.fromtimestamp(job.iniciado).strftime("%Y-%m-%d %H:%M:%S") if job.iniciado else None,
+            "duracion_s": round(job.finalizado - job.iniciado, 1) if job.iniciado and job.finalizado else None,
+            "estado": estado,
+            "filas": filas,
+            "error": job.error
+        })
+        tarea.job = None
+
+    def _tick(self, ahora):
+        with self._lock:
+            tareas = list(self.tareas.values())
+
+        for tarea in tareas:
+            if tarea.job is not None and not tarea.job.activo:
+                self._registrar_fin(tarea)
+
+            en_curso = tarea.job or self.jobs.activo(tarea.tipo, tarea.params)
+
+            if ahora >= tarea.siguiente:
+                tarea.siguiente = tarea.cron.siguiente(ahora)
+                if en_curso is None:
+                    self._lanzar(tarea)
+                    continue
+                if tarea.politica == "queue":
+                    tarea.en_cola = True
+                else:
+                    tarea.historial.append({
+                        "job_id": None,
+                        "inicio": ahora.strftime("%Y-%m-%d %H:%M:%S"),
+                        "duracion_s": 0,
+                        "estado": "skipped",
+                        "filas": None,
+                        "error": f"Ejecución anterior en curso ({en_curso.id})"
+                    })
+                    print(f"⏭️ '{tarea.nombre}' omitida: la ejecución anterior sigue en curso")
+            elif tarea.en_cola and en_curso is None:
+                self._lanzar(tarea)
+
     def start_in_background(self):
-        def run_scheduler():
-            self.start_scheduler()
-        
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+
+        def bucle():
+            while not self._detener.is_set():
+                try:
+                    self._tick(datetime.now(timezone.utc))
+                except Exception as e:
+                    print(f"❌ Error en el scheduler: {e}")
+                self._detener.wait(self.intervalo)
+
+        self._detener.clear()
+        self._hilo = threading.Thread(target=bucle, daemon=True, name="scheduler")
+        self._hilo.start()
         print("🔄 Scheduler ejecutándose en background")
-        
+
     def stop(self):
-        self.running = False
+        self._detener.set()
         print("🛑 Scheduler detenido")
 
-scheduler_instance = FireScheduler()
+    def estado(self):
+        with self._lock:
+            return {
+                "activo": self._hilo is not None and self._hilo.is_alive(),
+                "tareas": [tarea.to_dict() for tarea in self.tareas.values()]
+            }
+
 
-if __name__ == "__main__":
-    scheduler_instance.start_scheduler()
+scheduler_instance = JobScheduler()
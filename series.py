@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from cache_store import LRUCache
+
+# Serie → (colección, banda, escala en m, factor, desplazamiento); mismas fuentes que el ISC
+SERIES = {
+    "ndvi": ('MODIS/061/MOD13A2', 'NDVI', 1000, 0.0001, 0.0),
+    "precipitacion": ('NASA/GPM_L3/IMERG_V06', 'precipitationCal', 11132, 1.0, 0.0),
+    "temperatura": ('ECMWF/ERA5_LAND/DAILY_AGGR', 'temperature_2m', 11132, 1.0, -273.15),
+    "punto_rocio": ('ECMWF/ERA5_LAND/DAILY_AGGR', 'dewpoint_temperature_2m', 11132, 1.0, -273.15)
+}
+
+# Días de retraso con que publica cada fuente: lo más reciente no se marca como cubierto
+# y se vuelve a pedir (compuestos de 16 días de MODIS, IMERG final, ERA5-Land)
+LATENCIA_DIAS = {"ndvi": 32, "precipitacion": 120, "temperatura": 10, "punto_rocio": 10}
+
+
+def fecha_a_ms(fecha):
+    return int(datetime.strptime(fecha, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class SeriesTemporales:
+    """Series temporales por punto con cache por (ubicación redondeada, serie) que se extiende por tramos.
+
+    Cada entrada cubre un intervalo contiguo [desde, hasta); si se pide un periodo mayor,
+    solo se descargan los tramos que faltan y se fusionan con lo ya cacheado. Un periodo
+    que no toca el cacheado lo sustituye. `hasta` nunca pasa de hoy menos la latencia
+    de la serie. Lectura, descarga y fusión van bajo el lock del punto (uno de N por hash).
+    """
+
+    def __init__(self, decimales=None, maxsize=None):
+        self.decimales = decimales if decimales is not None else int(os.getenv('SERIES_DECIMALS', 3))
+        self.cache = LRUCache(maxsize=maxsize or int(os.getenv('SERIES_CACHE_SIZE', 2000)))
+        self._locks = [threading.Lock() for _ in range(64)]
+        self.peticiones_ee = 0
+
+    def obtener(self, lon, lat, desde, hasta, series=None):
+        """Devuelve {serie: (t_ms, valores)} para el punto y periodo [desde, hasta)"""
+        series = series or list(SERIES)
+        lon, lat = round(float(lon), self.decimales), round(float(lat), self.decimales)
+        inicio, fin = fecha_a_ms(desde), fecha_a_ms(hasta)
+
+        ahora_ms = int(time.time() * 1000)
+
+        with self._locks[hash((lon, lat)) % len(self._locks)]:
+            # Tramos que faltan por serie respecto a lo cacheado
+            entradas, pendientes = {}, []
+            for serie in series:
+                entrada = self.cache.get((lon, lat, serie))
+                if entrada is not None and (fin < entrada["desde"] or inicio > entrada["hasta"]):
+                    entrada = None
+                entradas[serie] = entrada
+                if entrada is None:
+                    pendientes.append((serie, inicio, fin))
+                    continue
+                if inicio < entrada["desde"]:
+                    pendientes.append((serie, inicio, entrada["desde"]))
+                if fin > entrada["hasta"]:
+                    pendientes.append((serie, entrada["hasta"], fin))
+
+            descargados = self._descargar(lon, lat, pendientes) if pendientes else {}
+
+            resultado = {}
+            for serie in series:
+                entrada = entradas[serie]
+                tramos = [(p[1], p[2], *descargados[p]) for p in pendientes if p[0] == serie]
+                if tramos:
+                    entrada = self._fusionar(entrada, tramos)
+                    cacheable = self._recortar(entrada, ahora_ms - LATENCIA_DIAS[serie] * 86400000)
+                    if cacheable is not None:
+                        self.cache.set((lon, lat, serie), cacheable)
+
+                dentro = (entrada["t"] >= inicio) & (entrada["t"] < fin)
+                resultado[serie] = (entrada["t"][dentro], entrada["v"][dentro])
+        return resultado
+
+    def _fusionar(self, entrada, tramos):
+        """Une la entrada con los tramos contiguos descargados; en fechas repetidas gana lo descargado"""
+        t = [t_tramo for _, _, t_tramo, _ in tramos]
+        v = [v_tramo for _, _, _, v_tramo in tramos]
+        desde = [inicio for inicio, _, _, _ in tramos]
+        hasta = [fin for _, fin, _, _ in tramos]
+        if entrada:
+            t.append(entrada["t"])
+            v.append(entrada["v"])
+            desde.append(entrada["desde"])
+            hasta.append(entrada["hasta"])
+
+        t = np.concatenate(t)
+        v = np.concatenate(v)
+        t, unicos = np.unique(t, return_index=True)
+        return {"desde": min(desde), "hasta": max(hasta), "t": t, "v": v[unicos]}
+
+    @staticmethod
+    def _recortar(entrada, limite):
+        """Entrada a cachear con `hasta` acotado a `limite` (ms); None si no queda nada cubierto"""
+        hasta = min(entrada["hasta"], limite)
+        if hasta <= entrada["desde"]:
+            return None
+        dentro = entrada["t"] < hasta
+        return {"desde": entrada["desde"], "hasta": hasta, "t": entrada["t"][dentro], "v": entrada["v"][dentro]}
+
+    def _descargar(self, lon, lat, pendientes):
+        """Un único getInfo: ee.Dictionary con un getRegion por (serie, tramo)"""
+        import ee
+
+        punto = ee.Geometry.Point([lon, lat])
+        consultas = {}
+        for i, (serie, inicio, fin) in enumerate(pendientes):
+            coleccion, banda, escala, _, _ = SERIES[serie]
+            consultas[str(i)] = ee.ImageCollection(coleccion) \
+                .select(banda) \
+                .filterDate(ee.Date(inicio), ee.Date(fin)) \
+                .getRegion(punto, escala)
+
+        respuesta = ee.Dictionary(consultas).getInfo()
+        self.peticiones_ee += 1
+
+        descargados = {}
+        for i, pendiente in enumerate(pendientes):
+            _, banda, _, factor, desplazamiento = SERIES[pendiente[0]]
+            filas = respuesta[str(i)]
+            cabecera, filas = filas[0], filas[1:]
+            col_t, col_v = cabecera.index('time'), cabecera.index(banda)
+
+            t = np.array([fila[col_t] for fila in filas], dtype=np.int64)
+            v = np.array([np.nan if fila[col_v] is None else fila[col_v] for fila in filas], dtype=np.float64)
+            orden = np.argsort(t, kind='stable')
+            descargados[pendiente] = (t[orden], v[orden] * factor + desplazamiento)
+        return descargados
+
+    def estado(self):
+        return {"decimales": self.decimales, "peticiones_ee": self.peticiones_ee, **self.cache.estado()}
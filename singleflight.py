@@ -0,0 +1,52 @@
+import asyncio
+import json
+import time
+
+
+class SingleFlight:
+    """Agrupa peticiones idénticas concurrentes en una sola computación compartida"""
+
+    def __init__(self, ttl=0):
+        # Segundos que un resultado recién calculado se reutiliza sin recalcular
+        self.ttl = ttl
+        self._en_vuelo = {}
+        self._resultados = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    @staticmethod
+    def clave(endpoint, params=None):
+        return f"{endpoint}:{json.dumps(params or {}, sort_keys=True, default=str)}"
+
+    async def do(self, clave, func, *args):
+        """Ejecuta func(*args) en un hilo, o espera la ejecución idéntica en curso"""
+        if self.ttl and clave in self._resultados:
+            expira, resultado = self._resultados[clave]
+            if expira > time.time():
+                self.stats["hits"] += 1
+                return resultado
+            del self._resultados[clave]
+
+        tarea = self._en_vuelo.get(clave)
+        if tarea is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            # La tarea no pertenece a ninguna petición: si el cliente que la
+            # originó se desconecta, los demás siguen esperando el mismo resultado
+            tarea = asyncio.ensure_future(asyncio.to_thread(func, *args))
+            self._en_vuelo[clave] = tarea
+            tarea.add_done_callback(lambda t: self._terminar(clave, t))
+
+        return await asyncio.shield(tarea)
+
+    def _terminar(self, clave, tarea):
+        self._en_vuelo.pop(clave, None)
+        if tarea.cancelled():
+            return
+        if tarea.exception() is not None:
+            self.stats["errors"] += 1
+        elif self.ttl:
+            self._resultados[clave] = (time.time() + self.ttl, tarea.result())
+
+    def estado(self):
+        return {**self.stats, "in_flight": len(self._en_vuelo), "ttl_seconds": self.ttl}
@@ -0,0 +1,33 @@
+"""
+Caches y almacenes en un directorio temporal: cache_store y main se configuran al importarse.
+
+    pip install -r requirements-dev.txt && python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+_directorio = tempfile.mkdtemp(prefix="tests-")
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(_directorio, "cache.sqlite3"))
+os.environ.setdefault("TILE_CACHE_DIR", os.path.join(_directorio, "tiles"))
+os.environ.setdefault("RASTER_CACHE_DIR", os.path.join(_directorio, "raster"))
+os.environ.setdefault("FIRE_STORE_DIR", os.path.join(_directorio, "fires"))
+os.environ.setdefault("FIRE_STATS_PATH", os.path.join(_directorio, "fires", "resumen.json"))
+
+
+@pytest.fixture
+def main_app():
+    """main importado con el EE simulado de benchmarks/ee_stub.py"""
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    if "main" not in sys.modules:
+        sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+        import ee_stub
+        ee_stub.instalar()
+    import main
+    return main
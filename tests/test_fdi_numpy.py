@@ -0,0 +1,146 @@
+"""
+Paridad de fdi_numpy con las expresiones de Earth Engine de main.py (calcular_sequedad).
+
+La referencia es una transcripción píxel a píxel de las expresiones EE: el
+operador ternario del EMC y la cadena .where(lt/gte) de la clasificación.
+"""
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fdi_numpy  # noqa: E402
+
+
+def clase_ee(fdi):
+    """ee.Image(0).where(lt(50), 1).where(gte(50).And(lt(60)), 2)...where(gte(91), 6)"""
+    clase = 0
+    if fdi < 50:
+        clase = 1
+    if 50 <= fdi < 60:
+        clase = 2
+    if 60 <= fdi < 70:
+        clase = 3
+    if 70 <= fdi < 80:
+        clase = 4
+    if 80 <= fdi < 91:
+        clase = 5
+    if fdi >= 91:
+        clase = 6
+    return clase
+
+
+def emc_ee(relahumi, t):
+    if relahumi < 10:
+        return 0.032229 + 0.281073 * relahumi - 0.000578 * relahumi * t
+    if relahumi < 50:
+        return 2.22749 + 0.160107 * relahumi - 0.014784 * t
+    return 21.0606 + 0.005565 * (relahumi ** 2) - 0.00035 * relahumi * t - 0.483199 * relahumi
+
+
+def fdi_ee(t, td, d, ndvi, nmin, nmax, h100min=fdi_numpy.H100_MIN, h100max=fdi_numpy.H100_MAX):
+    """(fdi, clase) de un píxel; un píxel enmascarado (NaN) queda en la clase 0 de ee.Image(0)"""
+    if any(math.isnan(v) for v in (t, td, d, ndvi, nmin, nmax)):
+        return float('nan'), 0
+    temperaK, dewpointK = t - 273.15, td - 273.15
+    pvse = math.exp(dewpointK * 17.27 / (dewpointK + 237.3)) * 6.1078
+    pvses = math.exp(temperaK * 17.27 / (temperaK + 237.3)) * 6.1078
+    relahumi = pvse / pvses * 100
+    h100 = ((24 - d) * emc_ee(relahumi, t) + d * (0.5 * d + 41)) / 24
+    lrmax = 0.30 + 0.30 * ((nmax + 0.19) / (0.95 + 0.19))
+    rg = ((ndvi - nmin) / (nmax - nmin)) * 100
+    lr = rg * lrmax / 100
+    mr = (h100 - h100min) / (h100max - h100min)
+    fdi = ((1 - lr) * (1 - mr)) * 100
+    return fdi, clase_ee(fdi)
+
+
+def entradas_aleatorias(n, semilla=0, enmascarados=0.2):
+    rng = np.random.default_rng(semilla)
+    t = rng.uniform(275, 305, n)
+    ndvi_min = rng.uniform(-0.1, 0.3, n)
+    ndvi_max = ndvi_min + rng.uniform(0.2, 0.7, n)
+    entradas = {
+        'temperature_2m': t,
+        'dewpoint_temperature_2m': t - rng.uniform(0, 25, n),
+        'duracion': rng.uniform(0, 24, n),
+        'ndvi': rng.uniform(ndvi_min, ndvi_max),
+        'ndvi_min': ndvi_min,
+        'ndvi_max': ndvi_max
+    }
+    mascara = rng.random(n) < enmascarados
+    for banda in entradas.values():
+        banda[mascara] = np.nan
+    return entradas
+
+
+@pytest.mark.parametrize("semilla", [0, 1, 2])
+def test_paridad_arrays_aleatorios(semilla):
+    entradas = entradas_aleatorias(5000, semilla)
+    fdi_vec, clases_vec = fdi_numpy.calcular_fdi(**entradas)
+
+    referencia = [fdi_ee(*valores) for valores in zip(*(entradas[b] for b in fdi_numpy.BANDAS_ENTRADA))]
+    fdi_ref = np.array([fdi for fdi, _ in referencia])
+    clases_ref = np.array([clase for _, clase in referencia], dtype=np.uint8)
+
+    np.testing.assert_allclose(fdi_vec, fdi_ref, rtol=1e-12, atol=1e-9, equal_nan=True)
+    np.testing.assert_array_equal(clases_vec, clases_ref)
+
+
+@pytest.mark.parametrize("umbral", fdi_numpy.UMBRALES_CLASES)
+def test_umbral_exacto_va_a_la_clase_superior(umbral):
+    """gte(umbral) en EE: el valor exacto del umbral pertenece a la clase superior"""
+    justo_debajo = np.nextafter(float(umbral), -np.inf)
+    valores = np.array([justo_debajo, float(umbral), np.nextafter(float(umbral), np.inf)])
+    clases = fdi_numpy.clasificar(valores)
+
+    posicion = fdi_numpy.UMBRALES_CLASES.index(umbral)
+    assert clases.tolist() == [posicion + 1, posicion + 2, posicion + 2]
+    assert clases.tolist() == [clase_ee(v) for v in valores]
+
+
+def test_clases_en_los_extremos():
+    valores = np.array([-1e9, 0.0, 49.99, 90.99, 91.0, 1e9])
+    assert fdi_numpy.clasificar(valores).tolist() == [clase_ee(v) for v in valores] == [1, 1, 1, 5, 6, 6]
+
+
+@pytest.mark.parametrize("relahumi", [10.0, 50.0])
+def test_emc_en_los_cortes_de_humedad(relahumi):
+    """El ternario de EE usa `<`: HR exactamente 10 o 50 toma el tramo siguiente"""
+    t = np.array([290.0])
+    valores = np.array([np.nextafter(relahumi, -np.inf), relahumi])
+    np.testing.assert_allclose(
+        fdi_numpy.emc(valores, np.repeat(t, 2)), [emc_ee(v, t[0]) for v in valores], rtol=1e-12
+    )
+
+
+@pytest.mark.parametrize("banda", fdi_numpy.BANDAS_ENTRADA)
+def test_nan_en_una_banda_enmascara_el_pixel(banda):
+    entradas = entradas_aleatorias(10, semilla=3, enmascarados=0)
+    entradas[banda][[2, 7]] = np.nan
+    fdi_vec, clases_vec = fdi_numpy.calcular_fdi(**entradas)
+
+    assert np.isnan(fdi_vec[[2, 7]]).all()
+    assert clases_vec[[2, 7]].tolist() == [0, 0]
+    assert not np.isnan(np.delete(fdi_vec, [2, 7])).any()
+    assert (np.delete(clases_vec, [2, 7]) > 0).all()
+
+
+def test_clasificar_todo_enmascarado():
+    assert fdi_numpy.clasificar(np.full((2, 3), np.nan)).tolist() == [[0, 0, 0], [0, 0, 0]]
+
+
+def test_bloques_conservan_la_mascara(tmp_path):
+    entradas = {b: v.reshape(40, 50) for b, v in entradas_aleatorias(2000, semilla=4).items()}
+    fdi_completo, clases_completas = fdi_numpy.calcular_fdi(**entradas)
+    fdi_bloques, clases_bloques = fdi_numpy.calcular_fdi_por_bloques(
+        entradas, salida_fdi=str(tmp_path / "fdi.npy"), salida_clases=str(tmp_path / "clases.npy"),
+        filas_por_bloque=7, dtype=np.float64
+    )
+
+    np.testing.assert_array_equal(np.isnan(fdi_bloques), np.isnan(fdi_completo))
+    np.testing.assert_allclose(fdi_bloques, fdi_completo, equal_nan=True)
+    np.testing.assert_array_equal(clases_bloques, clases_completas)
@@ -0,0 +1,77 @@
+"""
+Identidad del agrupamiento teselado de fire_clustering.
+
+El modo secuencial en una sola tesela debe reproducir el bucle original de
+assign_event_ids, y el teselado (con cualquier tamaño de tesela) debe dar los
+mismos evento_id que una sola tesela, en ambos modos.
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+import fire_clustering  # noqa: E402
+from bench_clustering import detecciones_sinteticas, original  # noqa: E402
+
+DISTANCIA = 1000
+LAG = 3
+
+
+def columnas(df):
+    t = df['ACQ_DATE'].to_numpy().astype('datetime64[ns]').view('int64')
+    return df['x'].to_numpy(), df['y'].to_numpy(), t
+
+
+def teselas_por_mascara(x, y, tamano, halo):
+    """Versión directa: una máscara sobre todos los puntos por tesela"""
+    x0, y0 = x.min(), y.min()
+    columna = np.floor((x - x0) / tamano).astype(np.int64)
+    fila = np.floor((y - y0) / tamano).astype(np.int64)
+    resultado = []
+    for c, f in sorted(set(zip(columna.tolist(), fila.tolist()))):
+        minx = x0 + c * tamano - halo
+        miny = y0 + f * tamano - halo
+        dentro = (x >= minx) & (x <= minx + tamano + 2 * halo) & (y >= miny) & (y <= miny + tamano + 2 * halo)
+        resultado.append(np.flatnonzero(dentro))
+    return resultado
+
+
+@pytest.mark.parametrize("semilla", [0, 1])
+def test_secuencial_igual_al_bucle_original(semilla):
+    df = detecciones_sinteticas(400, semilla=semilla)
+    x, y, t = columnas(df)
+    resultado = fire_clustering.asignar_eventos(x, y, t, DISTANCIA, LAG, modo="secuencial", procesos=1)
+    np.testing.assert_array_equal(resultado, original(df, DISTANCIA, LAG))
+
+
+@pytest.mark.parametrize("tamano,halo", [(100_000, 1001), (2000, 1001), (2000, 2000)])
+def test_teselas_igual_a_mascara(tamano, halo):
+    x, y, _ = columnas(detecciones_sinteticas(5000))
+    esperado = teselas_por_mascara(x, y, tamano, halo)
+    obtenido = fire_clustering.teselas(x, y, tamano, halo)
+    assert len(obtenido) == len(esperado)
+    for a, b in zip(obtenido, esperado):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_teselas_rechaza_halo_mayor_que_tesela():
+    x = np.array([0.0, 1.0])
+    with pytest.raises(ValueError):
+        fire_clustering.teselas(x, x, 10, 11)
+
+
+@pytest.mark.parametrize("modo", fire_clustering.MODOS_CLUSTERING)
+@pytest.mark.parametrize("n,tesela", [(1500, 50_000), (1500, 2 * DISTANCIA), (20_000, 100_000)])
+def test_teselado_igual_a_una_tesela(modo, n, tesela):
+    x, y, t = columnas(detecciones_sinteticas(n))
+    unico = fire_clustering.asignar_eventos(x, y, t, DISTANCIA, LAG, modo=modo, procesos=1)
+    with ThreadPoolExecutor(max_workers=4) as ejecutor:
+        teselado = fire_clustering.asignar_eventos(
+            x, y, t, DISTANCIA, LAG, modo=modo, procesos=4, tesela=tesela, ejecutor=ejecutor
+        )
+    np.testing.assert_array_equal(teselado, unico)
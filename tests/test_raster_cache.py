@@ -0,0 +1,139 @@
+"""
+Materialización de capas como COG con rasters sintéticos (sin Earth Engine).
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("rasterio")
+
+import rasterio  # noqa: E402
+from rasterio.transform import from_origin  # noqa: E402
+
+from raster_cache import RasterCache, limites_tile  # noqa: E402
+
+# 1024 px sobre exactamente el tile (7, 36, 64): cada tile de zoom 9 son 256x256 px del raster
+Z, X, Y = 7, 36, 64
+LADO = 1024
+
+
+def transform_tile():
+    minx, _, maxx, maxy = limites_tile(Z, X, Y)
+    return from_origin(minx, maxy, (maxx - minx) / LADO, (maxx - minx) / LADO)
+
+
+def centro_pixel(transform, fila, columna):
+    """lon/lat del centro de un píxel"""
+    from raster_cache import ORIGEN_MERCATOR, RADIO_TIERRA
+
+    x, y = transform * (columna + 0.5, fila + 0.5)
+    lon = x / ORIGEN_MERCATOR * 180.0
+    lat = np.degrees(2 * np.arctan(np.exp(y / RADIO_TIERRA)) - np.pi / 2)
+    return lon, lat
+
+
+@pytest.fixture
+def sequedad():
+    rng = np.random.default_rng(0)
+    array = rng.integers(1, 7, size=(LADO, LADO)).astype(np.uint8)
+    array[:100, :100] = 0  # nodata
+    return array
+
+
+@pytest.fixture
+def raster(tmp_path):
+    return RasterCache(directorio=str(tmp_path))
+
+
+def test_disposicion_cog(raster, sequedad):
+    assert not raster.disponible("sequedad")
+    version = raster.materializar("sequedad", sequedad, transform_tile())
+    assert version == raster.version("sequedad")
+
+    with rasterio.open(raster.ruta("sequedad")) as src:
+        assert src.crs.to_epsg() == 3857
+        assert src.nodata == 0
+        assert src.profile["tiled"]
+        assert (src.profile["blockxsize"], src.profile["blockysize"]) == (256, 256)
+        assert src.overviews(1) == [2, 4]
+        assert src.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") == "COG"
+        assert src.compression.name.lower() == "deflate"
+        np.testing.assert_array_equal(src.read(1), sequedad)
+
+
+def test_leer_tile_coincide_con_el_array(raster, sequedad):
+    raster.materializar("sequedad", sequedad, transform_tile())
+
+    # Zoom 9: resolución nativa, cada tile es un bloque de 256x256 del array
+    for i, j in [(0, 0), (1, 2), (3, 3)]:
+        tile = raster.leer_tile("sequedad", Z + 2, 4 * X + i, 4 * Y + j)
+        np.testing.assert_array_equal(tile, sequedad[256 * j:256 * (j + 1), 256 * i:256 * (i + 1)])
+
+    # Zoom 7: sale del overview, con clases válidas (vecino más cercano)
+    tile = raster.leer_tile("sequedad", Z, X, Y)
+    assert tile.shape == (256, 256)
+    assert set(np.unique(tile)) <= set(range(7))
+
+    # Fuera del raster: todo nodata
+    fuera = raster.leer_tile("sequedad", Z, X + 5, Y)
+    assert (fuera == 0).all()
+
+
+def test_tile_png(raster, sequedad):
+    raster.materializar("sequedad", sequedad, transform_tile())
+    png = raster.tile_png("sequedad", Z + 2, 4 * X, 4 * Y)
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+
+
+def test_muestrear_valores_nodata_y_fuera(raster, sequedad):
+    transform = transform_tile()
+    raster.materializar("sequedad", sequedad, transform)
+
+    celdas = [(500, 700), (1023, 0), (200, 1023), (50, 50)]
+    lons, lats = zip(*(centro_pixel(transform, f, c) for f, c in celdas))
+    lons = list(lons) + [0.0]
+    lats = list(lats) + [0.0]
+
+    valores = raster.muestrear("sequedad", lons, lats)
+    np.testing.assert_array_equal(valores[:3], [sequedad[f, c] for f, c in celdas[:3]])
+    assert np.isnan(valores[3])  # nodata
+    assert np.isnan(valores[4])  # fuera del raster
+
+
+def test_ndvi_nodata_flotante(raster):
+    array = np.linspace(-0.2, 0.9, LADO * LADO, dtype=np.float32).reshape(LADO, LADO)
+    array[10, 20] = -9999.0
+    transform = transform_tile()
+    raster.materializar("ndvi", array, transform)
+
+    lon, lat = zip(centro_pixel(transform, 10, 20), centro_pixel(transform, 10, 21))
+    valores = raster.muestrear("ndvi", lon, lat)
+    assert np.isnan(valores[0])
+    assert valores[1] == pytest.approx(array[10, 21])
+
+
+def test_nueva_version_se_reabre(raster, sequedad):
+    transform = transform_tile()
+    raster.materializar("sequedad", sequedad, transform)
+    lon, lat = centro_pixel(transform, 500, 500)
+    assert raster.muestrear("sequedad", [lon], [lat])[0] == sequedad[500, 500]
+
+    otra = np.full_like(sequedad, 6)
+    version = raster.materializar("sequedad", otra, transform)
+    assert raster.version("sequedad") == version
+    assert raster.muestrear("sequedad", [lon], [lat])[0] == 6
+
+
+def test_punto_503_si_el_cog_no_se_puede_leer(monkeypatch, main_app):
+    from fastapi.testclient import TestClient
+
+    class SinDataset:
+        def disponible(self, capa):
+            return True
+
+        def muestrear(self, capa, lons, lats):
+            return None
+
+    monkeypatch.setattr(main_app, "raster_cache", SinDataset())
+    respuesta = TestClient(main_app.app).get("/raster/sequedad/punto", params={"lat": -1.5, "lon": -78.5})
+    assert respuesta.status_code == 503
+    assert respuesta.json()["success"] is False
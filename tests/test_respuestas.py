@@ -0,0 +1,76 @@
+"""
+Negociación de Content-Encoding y respuestas condicionales (ETag/304).
+"""
+import types
+
+import pytest
+
+import respuestas
+
+CUERPO = b'{"valor":"' + b"x" * 4096 + b'"}'
+
+
+def peticion(accept_encoding=None):
+    headers = {} if accept_encoding is None else {"accept-encoding": accept_encoding}
+    return types.SimpleNamespace(headers=headers)
+
+
+@pytest.mark.parametrize("cabecera,esperado", [
+    ("gzip, deflate, br", {"gzip": 1.0, "deflate": 1.0, "br": 1.0}),
+    ("br;q=0, gzip;q=0.8", {"br": 0.0, "gzip": 0.8}),
+    ("GZIP ; Q=0.5, *;q=0", {"gzip": 0.5, "*": 0.0}),
+    ("gzip;q=abc", {"gzip": 0.0}),
+    ("", {}),
+])
+def test_codificaciones_aceptadas(cabecera, esperado):
+    assert respuestas.codificaciones_aceptadas(cabecera) == esperado
+
+
+@pytest.mark.parametrize("cabecera,esperado", [
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("br;q=0, gzip;q=0", None),
+    ("identity", None),
+    ("*", "gzip"),
+    ("*;q=0.5, gzip;q=0", None),
+    (None, None),
+])
+def test_comprimir_sin_brotli(monkeypatch, cabecera, esperado):
+    monkeypatch.setattr(respuestas, "brotli", None)
+    cuerpo, codificacion = respuestas.comprimir(peticion(cabecera), CUERPO)
+    assert codificacion == esperado
+    assert (cuerpo == CUERPO) == (esperado is None)
+
+
+@pytest.mark.parametrize("cabecera,esperado", [
+    ("gzip, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.9", "gzip"),
+    ("br;q=0.9, gzip;q=0.9", "br"),
+])
+def test_comprimir_con_brotli(cabecera, esperado):
+    pytest.importorskip("brotli")
+    assert respuestas.comprimir(peticion(cabecera), CUERPO)[1] == esperado
+
+
+def test_cuerpos_pequenos_sin_comprimir():
+    assert respuestas.comprimir(peticion("gzip"), b"{}") == (b"{}", None)
+
+
+def test_ndvi_desde_cache_con_etag(main_app):
+    from fastapi.testclient import TestClient
+
+    main_app.cache_store.guardar("ndvi", {"mapid": "m1", "tile_url": "http://tiles/{z}/{x}/{y}"}, ttl=3600)
+    cliente = TestClient(main_app.app)
+
+    respuesta = cliente.get("/ndvi")
+    assert respuesta.status_code == 200
+    assert respuesta.json()["from_cache"] is True
+    etag = respuesta.headers["etag"]
+
+    assert cliente.get("/ndvi", headers={"If-None-Match": etag}).status_code == 304
+
+    main_app.cache_store.guardar("ndvi", {"mapid": "m2", "tile_url": "http://tiles/{z}/{x}/{y}"}, ttl=3600)
+    respuesta = cliente.get("/ndvi", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.json()["mapid"] == "m2"
@@ -0,0 +1,153 @@
+"""
+TileCache con un servidor de tiles simulado (session inyectada).
+"""
+import os
+
+import pytest
+
+from tile_cache import TileCache
+
+URL = "http://upstream/{z}/{x}/{y}.png"
+
+
+class Respuesta:
+    def __init__(self, contenido, status_code=200):
+        self.content = contenido
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class Upstream:
+    """Sesión falsa: cada tile es `tamano` bytes derivados de la URL"""
+
+    def __init__(self, tamano=100, status_code=200):
+        self.tamano = tamano
+        self.status_code = status_code
+        self.peticiones = []
+
+    def get(self, url, timeout=None):
+        self.peticiones.append(url)
+        return Respuesta(url.encode().ljust(self.tamano, b"."), self.status_code)
+
+
+def pngs(directorio):
+    return sorted(
+        os.path.relpath(os.path.join(raiz, n), directorio)
+        for raiz, _, nombres in os.walk(directorio) for n in nombres
+    )
+
+
+@pytest.fixture
+def upstream():
+    return Upstream()
+
+
+@pytest.fixture
+def cache(tmp_path, upstream):
+    return TileCache(directorio=str(tmp_path), max_bytes=250, session=upstream)
+
+
+def test_miss_descarga_y_hit_lee_de_disco(cache, upstream):
+    primero = cache.obtener("sequedad", "v1", URL, 5, 9, 16)
+    segundo = cache.obtener("sequedad", "v1", URL, 5, 9, 16)
+    assert primero == segundo
+    assert upstream.peticiones == ["http://upstream/5/9/16.png"]
+    assert os.path.exists(cache.ruta("sequedad", "v1", 5, 9, 16))
+
+
+def test_desalojo_lru_por_bytes(cache, upstream):
+    cache.obtener("sequedad", "v1", URL, 5, 0, 0)
+    cache.obtener("sequedad", "v1", URL, 5, 0, 1)
+    cache.obtener("sequedad", "v1", URL, 5, 0, 0)  # el (0, 1) pasa a ser el menos reciente
+    cache.obtener("sequedad", "v1", URL, 5, 0, 2)
+
+    assert not os.path.exists(cache.ruta("sequedad", "v1", 5, 0, 1))
+    assert os.path.exists(cache.ruta("sequedad", "v1", 5, 0, 0))
+    assert cache.estado() == {"tiles": 2, "bytes": 200, "max_bytes": 250}
+
+    cache.obtener("sequedad", "v1", URL, 5, 0, 1)
+    assert len(upstream.peticiones) == 4
+
+
+def test_cambio_de_version_elimina_la_anterior(cache):
+    cache.obtener("sequedad", "v1", URL, 5, 0, 0)
+    cache.obtener("ndvi", "v1", URL, 5, 0, 0)
+    viejo = os.path.dirname(os.path.dirname(os.path.dirname(cache.ruta("sequedad", "v1", 5, 0, 0))))
+
+    cache.obtener("sequedad", "v2", URL, 5, 0, 0)
+
+    assert not os.path.exists(viejo)
+    assert os.path.exists(cache.ruta("ndvi", "v1", 5, 0, 0))
+    assert cache.estado()["tiles"] == 2
+
+
+def test_escritura_atomica(cache, monkeypatch):
+    import tile_cache
+
+    reemplazos = []
+    original = tile_cache.os.replace
+
+    def replace(origen, destino):
+        # El tile aparece completo de una vez: el temporal ya tiene todo el contenido
+        with open(origen, "rb") as f:
+            reemplazos.append((os.path.exists(destino), len(f.read())))
+        original(origen, destino)
+
+    monkeypatch.setattr(tile_cache.os, "replace", replace)
+    cache.obtener("sequedad", "v1", URL, 5, 0, 0)
+
+    assert reemplazos == [(False, 100)]
+    assert not [r for r in pngs(cache.directorio) if r.endswith(".tmp")]
+
+
+def test_error_del_upstream_no_deja_nada(tmp_path):
+    cache = TileCache(directorio=str(tmp_path), max_bytes=250, session=Upstream(status_code=503))
+    with pytest.raises(RuntimeError):
+        cache.obtener("sequedad", "v1", URL, 5, 0, 0)
+    assert pngs(cache.directorio) == []
+    assert cache.estado()["tiles"] == 0
+
+
+def test_indice_compartido_entre_workers(tmp_path):
+    a = TileCache(directorio=str(tmp_path), max_bytes=250, session=Upstream(), reescaneo=0)
+    b = TileCache(directorio=str(tmp_path), max_bytes=250, session=Upstream(), reescaneo=0)
+    a.obtener("sequedad", "v1", URL, 5, 0, 0)
+    a.obtener("sequedad", "v1", URL, 5, 0, 1)
+
+    # b ve los tiles de a al escribir y respeta el límite global
+    b.obtener("sequedad", "v1", URL, 5, 0, 2)
+    assert len(pngs(str(tmp_path))) == 2
+    assert b.estado()["bytes"] == 200
+
+    # Un worker nuevo reconstruye el índice desde disco
+    assert TileCache(directorio=str(tmp_path), max_bytes=250, session=Upstream()).estado()["tiles"] == 2
+
+
+def test_etag_por_tile_y_version():
+    etag = TileCache.etag("sequedad", "v1", 5, 0, 0)
+    assert etag == TileCache.etag("sequedad", "v1", 5, 0, 0)
+    assert etag != TileCache.etag("sequedad", "v2", 5, 0, 0)
+    assert etag != TileCache.etag("sequedad", "v1", 5, 0, 1)
+    assert etag.startswith('"') and etag.endswith('"')
+
+
+def test_endpoint_responde_304_sin_pedir_al_upstream(tmp_path, monkeypatch, main_app):
+    from fastapi.testclient import TestClient
+
+    upstream = Upstream()
+    monkeypatch.setattr(main_app, "tile_cache", TileCache(directorio=str(tmp_path), session=upstream))
+    monkeypatch.setattr(main_app, "capa_para_tiles", lambda capa: {"tile_url": URL, "mapid": "m1"})
+    cliente = TestClient(main_app.app)
+
+    respuesta = cliente.get("/tiles/sequedad/5/9/16.png")
+    assert respuesta.status_code == 200
+    assert respuesta.content == upstream.get("http://upstream/5/9/16.png").content
+    etag = respuesta.headers["etag"]
+
+    upstream.peticiones.clear()
+    respuesta = cliente.get("/tiles/sequedad/5/9/16.png", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 304
+    assert upstream.peticiones == []
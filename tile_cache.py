@@ -0,0 +1,159 @@
+import hashlib
+import math
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+
+def lonlat_a_tile(lon, lat, z):
+    """Coordenadas geográficas → índice de tile XYZ (Web Mercator)"""
+    lat = max(min(lat, 85.0511), -85.0511)
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+class TileCache:
+    """Cache en disco de tiles XYZ renderizados por EE, acotado por tamaño (LRU).
+
+    Cada worker lleva su propio índice; el directorio es compartido, así que antes de
+    escribir se vuelve a escanear cada `reescaneo` segundos para que el límite cuente
+    los tiles de todos los workers (con ese retraso como máximo).
+    """
+
+    def __init__(self, directorio=None, max_bytes=None, session=None, reescaneo=None):
+        self.directorio = directorio or os.getenv('TILE_CACHE_DIR', os.path.join('cache', 'tiles'))
+        self.max_bytes = max_bytes or int(os.getenv('TILE_CACHE_MAX_MB', 512)) * 1024 * 1024
+        self.reescaneo = reescaneo if reescaneo is not None else float(os.getenv('TILE_CACHE_RESCAN', 60))
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._indice = OrderedDict()
+        self._bytes = 0
+        self._escaneado = 0
+        self._versiones = {}
+        os.makedirs(self.directorio, exist_ok=True)
+        self._cargar_indice()
+
+    def _cargar_indice(self):
+        """Reconstruye el orden LRU desde disco (mtime = último acceso), con los tiles de todos los workers"""
+        archivos = []
+        for raiz, _, nombres in os.walk(self.directorio):
+            for nombre in nombres:
+                if nombre.endswith('.png'):
+                    ruta = os.path.join(raiz, nombre)
+                    try:
+                        stat = os.stat(ruta)
+                    except FileNotFoundError:
+                        continue
+                    archivos.append((stat.st_mtime, ruta, stat.st_size))
+
+        self._indice = OrderedDict((ruta, tamano) for _, ruta, tamano in sorted(archivos))
+        self._bytes = sum(self._indice.values())
+        self._escaneado = time.time()
+
+    @staticmethod
+    def _version_dir(version):
+        return hashlib.sha1(str(version).encode()).hexdigest()[:16]
+
+    def ruta(self, capa, version, z, x, y):
+        return os.path.join(self.directorio, capa, self._version_dir(version), str(z), str(x), f"{y}.png")
+
+    @staticmethod
+    def etag(capa, version, z, x, y):
+        return '"' + hashlib.sha1(f"{capa}:{version}:{z}:{x}:{y}".encode()).hexdigest() + '"'
+
+    def obtener(self, capa, version, url_template, z, x, y):
+        """Devuelve los bytes del tile; lo descarga del upstream solo la primera vez"""
+        self._cambio_de_version(capa, version)
+        ruta = self.ruta(capa, version, z, x, y)
+
+        with self._lock:
+            if ruta in self._indice:
+                self._indice.move_to_end(ruta)
+                try:
+                    with open(ruta, 'rb') as f:
+                        contenido = f.read()
+                    os.utime(ruta)
+                    return contenido
+                except FileNotFoundError:
+                    self._bytes -= self._indice.pop(ruta)
+
+        url = url_template.replace('{z}', str(z)).replace('{x}', str(x)).replace('{y}', str(y))
+        response = self.session.get(url, timeout=30)
+        response.raise_for_status()
+        contenido = response.content
+
+        # Escritura atómica: otro worker nunca lee un tile a medio escribir
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+        with self._lock:
+            if time.time() - self._escaneado >= self.reescaneo:
+                self._cargar_indice()
+            if ruta not in self._indice:
+                self._bytes += len(contenido)
+            self._indice[ruta] = len(contenido)
+            self._indice.move_to_end(ruta)
+            self._desalojar()
+
+        return contenido
+
+    def _desalojar(self):
+        while self._bytes > self.max_bytes and self._indice:
+            ruta, tamano = self._indice.popitem(last=False)
+            self._bytes -= tamano
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+    def _cambio_de_version(self, capa, version):
+        """Al cambiar la versión de una capa, elimina los tiles de versiones anteriores"""
+        vigente = self._version_dir(version)
+        if self._versiones.get(capa) == vigente:
+            return
+        self._versiones[capa] = vigente
+
+        directorio_capa = os.path.join(self.directorio, capa)
+        if not os.path.isdir(directorio_capa):
+            return
+
+        for nombre in os.listdir(directorio_capa):
+            if nombre == vigente:
+                continue
+            prefijo = os.path.join(directorio_capa, nombre) + os.sep
+            with self._lock:
+                for ruta in [r for r in self._indice if r.startswith(prefijo)]:
+                    self._bytes -= self._indice.pop(ruta)
+            shutil.rmtree(os.path.join(directorio_capa, nombre), ignore_errors=True)
+
+    def presembrar(self, capa, version, url_template, bbox, zoom_min, zoom_max):
+        """Descarga por adelantado los tiles de zooms bajos que cubren el bbox"""
+        descargados = 0
+        for z in range(zoom_min, zoom_max + 1):
+            x_min, y_max = lonlat_a_tile(bbox[0], bbox[1], z)
+            x_max, y_min = lonlat_a_tile(bbox[2], bbox[3], z)
+            for x in range(x_min, x_max + 1):
+                for y in range(y_min, y_max + 1):
+                    try:
+                        self.obtener(capa, version, url_template, z, x, y)
+                        descargados += 1
+                    except Exception as e:
+                        print(f"Error presembrando tile {capa}/{z}/{x}/{y}: {e}")
+        return descargados
+
+    def estado(self):
+        with self._lock:
+            return {
+                "tiles": len(self._indice),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
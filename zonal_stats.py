@@ -0,0 +1,144 @@
+import math
+import os
+import threading
+
+import numpy as np
+
+from raster_cache import RADIO_TIERRA
+
+ETIQUETAS_CLASES = ['Muy baja', 'Baja', 'Media', 'Alta', 'Muy alta', 'Extrema']
+NUM_CLASES = len(ETIQUETAS_CLASES)
+
+# Nivel → (columna de código, columna de nombre) en la capa DPA parroquial
+NIVELES_DPA = {
+    "parroquia": ("DPA_PARROQ", "DPA_DESPAR"),
+    "canton": ("DPA_CANTON", "DPA_DESCAN"),
+    "provincia": ("DPA_PROVIN", "DPA_DESPRO")
+}
+
+
+class EstadisticasZonales:
+    """Hectáreas por clase de sequedad en cada parroquia/cantón/provincia (DPA)"""
+
+    def __init__(self, shapefile_path=None):
+        self.shapefile_path = shapefile_path or os.path.join("data", "ORGANIZACION_TERRITORIAL_PARROQUIAL.shp")
+        self._parroquias = None
+        self._zonas_raster = {}
+        self._lock = threading.Lock()
+        self.version = None
+        self.indice = {}
+
+    def parroquias(self):
+        """Capa parroquial (se lee una sola vez)"""
+        with self._lock:
+            if self._parroquias is None:
+                import geopandas as gpd
+
+                parroquias = gpd.read_file(self.shapefile_path)
+                self._parroquias = parroquias[
+                    [columna for columnas in NIVELES_DPA.values() for columna in columnas] + ['geometry']
+                ].reset_index(drop=True)
+            return self._parroquias
+
+    def _raster_de_zonas(self, dataset):
+        """Índice de parroquia por píxel sobre la grilla del COG (cacheado por grilla)"""
+        from rasterio.features import rasterize
+
+        clave = (dataset.width, dataset.height, tuple(dataset.transform))
+        if clave not in self._zonas_raster:
+            parroquias = self.parroquias().to_crs("EPSG:3857")
+            self._zonas_raster[clave] = rasterize(
+                ((geom, i + 1) for i, geom in enumerate(parroquias.geometry)),
+                out_shape=(dataset.height, dataset.width),
+                transform=dataset.transform,
+                fill=0,
+                dtype="int32"
+            )
+        return self._zonas_raster[clave]
+
+    def calcular_local(self, raster_cache):
+        """Una sola pasada sobre el COG: bincount de (zona, clase) ponderado por área real"""
+        dataset = raster_cache._abrir("sequedad")
+        if dataset is None:
+            raise RuntimeError("La capa de sequedad no está materializada")
+
+        clases = dataset.read(1).astype(np.int64)
+        zonas = self._raster_de_zonas(dataset).astype(np.int64)
+
+        # Área real del píxel Mercator: (escala * cos(lat))² por fila
+        filas_y = dataset.transform.f + (np.arange(dataset.height) + 0.5) * dataset.transform.e
+        latitudes = np.degrees(2 * np.arctan(np.exp(filas_y / RADIO_TIERRA)) - math.pi / 2)
+        area_fila_ha = (abs(dataset.transform.a) * np.cos(np.radians(latitudes))) ** 2 / 10000
+        area_ha = np.broadcast_to(area_fila_ha[:, None], clases.shape)
+
+        validos = (zonas > 0) & (clases >= 1) & (clases <= NUM_CLASES)
+        n_zonas = len(self.parroquias()) + 1
+        histograma = np.bincount(
+            zonas[validos] * NUM_CLASES + (clases[validos] - 1),
+            weights=area_ha[validos],
+            minlength=n_zonas * NUM_CLASES
+        ).reshape(n_zonas, NUM_CLASES)
+
+        return histograma[1:]
+
+    def calcular_ee(self, imagen_clases, escala=1000, tolerancia=0.005):
+        """Una sola reduceRegions agrupada por clase sobre todas las parroquias"""
+        import ee
+
+        parroquias = self.parroquias().to_crs("EPSG:4326")
+        features = [
+            ee.Feature(ee.Geometry(geom.simplify(tolerancia).__geo_interface__), {"zona": i})
+            for i, geom in enumerate(parroquias.geometry)
+        ]
+        coleccion = ee.FeatureCollection(features)
+
+        reducidas = ee.Image.pixelArea().divide(10000).addBands(imagen_clases.rename('clase')).reduceRegions(
+            collection=coleccion,
+            reducer=ee.Reducer.sum().group(groupField=1, groupName='clase'),
+            scale=escala
+        ).getInfo()
+
+        histograma = np.zeros((len(parroquias), NUM_CLASES))
+        for feature in reducidas['features']:
+            zona = feature['properties']['zona']
+            for grupo in feature['properties'].get('groups', []):
+                clase = int(grupo['clase'])
+                if 1 <= clase <= NUM_CLASES:
+                    histograma[zona, clase - 1] = grupo['sum']
+        return histograma
+
+    def indexar(self, histograma, version):
+        """Construye el índice en memoria por código DPA para los tres niveles"""
+        parroquias = self.parroquias()
+        indice = {}
+
+        for nivel, (col_codigo, col_nombre) in NIVELES_DPA.items():
+            agregado = {}
+            for i, fila in enumerate(parroquias[[col_codigo, col_nombre]].itertuples(index=False)):
+                codigo, nombre = str(fila[0]), fila[1]
+                if codigo not in agregado:
+                    agregado[codigo] = {"codigo": codigo, "nombre": nombre, "hectareas": np.zeros(NUM_CLASES)}
+                agregado[codigo]["hectareas"] += histograma[i]
+
+            indice[nivel] = {}
+            for codigo, zona in agregado.items():
+                hectareas = zona["hectareas"]
+                total = float(hectareas.sum())
+                indice[nivel][codigo] = {
+                    "codigo": codigo,
+                    "nombre": zona["nombre"],
+                    "hectareas": [round(float(h), 1) for h in hectareas],
+                    "total_ha": round(total, 1),
+                    # Alta + Muy alta + Extrema
+                    "porcentaje_alta_o_mas": round(float(hectareas[3:].sum()) / total * 100, 2) if total else 0.0
+                }
+
+        self.indice = indice
+        self.version = version
+        return indice
+
+    def consultar(self, nivel, codigo=None):
+        zonas = self.indice.get(nivel, {})
+        if codigo is not None:
+            return [zonas[codigo]] if codigo in zonas else []
+        return list(zonas.values())